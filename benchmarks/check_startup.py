@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# CLI 起動時の import の回帰チェック。python -X importtime でサブコマンドを起動し、
+# 読み込んではいけないモジュールと import 時間の上限を確認する（違反があれば終了コード 1）。
+# benchmarks/run.py と tests/test_startup.py もこれを実行し、違反があれば失敗にする:
+#
+#   python benchmarks/check_startup.py
+#   python benchmarks/check_startup.py --json   # 計測値を JSON で出力
+
+SAMPLE_DSL = os.path.join(ROOT, "examples", "templates", "DeepResearch.yml")
+# dotenv は main が全コマンドで読み込む（オフラインのコマンドも .env の設定を使う）ので含めない
+NETWORK_MODULES = ("requests", "urllib3", "aiohttp", "dify_creator.console_client")
+
+# (名前, argv, 読み込んではいけないモジュール, dify_creator.cli 以下の import 時間の上限 ms)
+CASES: list[tuple[str, list[str], tuple[str, ...], float]] = [
+    ("help", ["--help"], NETWORK_MODULES + ("yaml",), 60.0),
+    ("validate", ["validate", "--dsl", SAMPLE_DSL], NETWORK_MODULES, 120.0),
+    ("profile-offline", ["profile", "--events-file", os.devnull], NETWORK_MODULES + ("yaml",), 60.0),
+]
+
+
+def import_times(argv: list[str]) -> dict[str, int]:
+    """{モジュール名: 累積 import 時間 (us)}"""
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "dify_creator", *argv],
+        env=env,
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=False,
+    )
+    out: dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        # import time:   self [us] |  cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        out[name.strip()] = int(cumulative)
+    return out
+
+
+def check_case(
+    name: str, argv: list[str], forbidden: tuple[str, ...], budget_ms: float, repeat: int
+) -> tuple[dict[str, Any], list[str]]:
+    """1つのコマンドを repeat 回起動し、(計測値, 違反のメッセージ) を返す"""
+    import_times(argv)  # .pyc の生成を計測に含めない
+    samples = [import_times(argv) for _ in range(repeat)]
+    cli_ms = min(s.get("dify_creator.cli", 0) for s in samples) / 1000
+    loaded = sorted(m for m in samples[0] if m.split(".")[0] in forbidden or m in forbidden)
+    failures: list[str] = []
+    if loaded:
+        failures.append(f"{name}: must not import {', '.join(loaded)}")
+    if cli_ms > budget_ms:
+        failures.append(f"{name}: dify_creator.cli import took {cli_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+    return {"command": name, "cli_import_ms": round(cli_ms, 2), "modules": len(samples[0])}, failures
+
+
+def check(repeat: int) -> tuple[list[dict[str, Any]], list[str]]:
+    results: list[dict[str, Any]] = []
+    failures: list[str] = []
+    for case in CASES:
+        result, case_failures = check_case(*case, repeat=repeat)
+        results.append(result)
+        failures.extend(case_failures)
+    return results, failures
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description="Check CLI startup imports with python -X importtime")
+    p.add_argument("--repeat", type=int, default=3, help="Runs per command; the fastest is compared (default: 3)")
+    p.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = p.parse_args(argv)
+
+    results, failures = check(args.repeat)
+    if args.json:
+        print(json.dumps({"results": results, "failures": failures}, ensure_ascii=False, indent=2))
+    else:
+        for r in results:
+            print(f"{r['command']:<16} {r['cli_import_ms']:>8.1f} ms  {r['modules']} modules")
+        for f in failures:
+            print(f"FAIL {f}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from check_startup import check as check_startup  # noqa: E402  (benchmarks/ は sys.path[0])
+from dify_creator import __version__  # noqa: E402
+from dify_creator.console_client import ConsoleConfig, DifyConsoleClient  # noqa: E402
+from dify_creator.stub_server import StubConfig, StubServer  # noqa: E402
+
+# ベンチマーク結果を JSON で出力する。リリースごとに保存して比較する:
+#
+#   python benchmarks/run.py --out bench/0.1.0.json
+#   python benchmarks/run.py --quick          # 回数を減らした動作確認
+#
+# 実際の Dify ではなく dify_creator.stub_server を同じプロセス内で起動して計測するので、
+# 数値はクライアント側（CLI 起動・リクエスト処理・SSE 解析）のコストを表す。
+
+SAMPLE_DSL = os.path.join(ROOT, "examples", "templates", "DeepResearch.yml")
+EMAIL = "bench@example.com"
+PASSWORD = "bench"
+
+
+def _summary(samples_s: list[float]) -> dict[str, float]:
+    ordered = sorted(samples_s)
+    return {
+        "n": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def _timed(fn: Callable[[], Any], repeat: int) -> list[float]:
+    out: list[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        out.append(time.perf_counter() - t0)
+    return out
+
+
+def _client(server: StubServer) -> DifyConsoleClient:
+    # 再試行・サーキットブレーカーは既定値のまま（実運用と同じ経路を通す）
+    return DifyConsoleClient(ConsoleConfig(base_url=server.base_url))
+
+
+def bench_cli_startup(repeat: int) -> dict[str, Any]:
+    """python -m dify_creator のプロセス起動から終了まで（ネットワークなし）"""
+    env = {**os.environ, "PYTHONPATH": ROOT, "DIFY_SESSION_CACHE": "0"}
+    results: dict[str, Any] = {}
+    for name, argv in {"help": ["--help"], "validate": ["validate", "--dsl", SAMPLE_DSL]}.items():
+
+        def run() -> None:
+            subprocess.run(
+                [sys.executable, "-m", "dify_creator", *argv],
+                env=env,
+                cwd=ROOT,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=False,
+            )
+
+        run()  # .pyc の生成を計測に含めない
+        results[name] = _summary(_timed(run, repeat))
+    return results
+
+
+def bench_login(server: StubServer, repeat: int) -> dict[str, Any]:
+    """新しいセッションでの POST /login（ログイン後の CSRF 確認まで）"""
+
+    def run() -> None:
+        _client(server).login(email=EMAIL, password_plain=PASSWORD)
+
+    return _summary(_timed(run, repeat))
+
+
+def bench_import(server: StubServer, count: int, workers: int) -> dict[str, Any]:
+    """同じ DSL の上書き import を count 回（逐次 / workers スレッド並列）"""
+    with open(SAMPLE_DSL, "r", encoding="utf-8") as f:
+        yaml_content = f.read()
+    client = _client(server)
+    client.login(email=EMAIL, password_plain=PASSWORD)
+    app_id = client.import_app(yaml_content=yaml_content)["app_id"]
+
+    def one(_: int = 0) -> None:
+        client.import_app(yaml_content=yaml_content, app_id=app_id, validate_yaml=False)
+
+    results: dict[str, Any] = {"dsl_bytes": len(yaml_content.encode("utf-8"))}
+    samples = _timed(one, count)
+    results["sequential"] = {**_summary(samples), "imports_per_s": round(count / sum(samples), 2)}
+
+    client.set_pool_size(workers)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, range(count)))
+    wall = time.perf_counter() - t0
+    results["parallel"] = {"workers": workers, "n": count, "imports_per_s": round(count / wall, 2)}
+
+    results["export"] = _summary(_timed(lambda: client.export_app(app_id=app_id), count))
+    return results
+
+
+def bench_sse(server: StubServer, events: int, event_bytes: int, repeat: int) -> dict[str, Any]:
+    """
+    draft run の SSE 解析速度。iter_sse_raw（bytes のまま）と run_draft_workflow_collect
+    （JSON デコードして全イベントを保持）を分けて計る。ピークメモリは tracemalloc で別に計る
+    （tracemalloc 自体が遅いため、速度の計測とは分ける）。
+    """
+    server.state.config.events = events
+    server.state.config.event_bytes = event_bytes
+    server.state.config.event_delay_s = 0.0
+    client = _client(server)
+    client.login(email=EMAIL, password_plain=PASSWORD)
+    app_id = "bench-app"
+
+    def raw() -> tuple[int, int]:
+        resp = client.run_draft_workflow_stream(app_id=app_id, inputs={})
+        n = nbytes = 0
+        for payload in client.iter_sse_raw(resp):
+            n += 1
+            nbytes += len(payload)
+        return n, nbytes
+
+    n, nbytes = raw()  # ウォームアップ（イベント列の生成をサーバー側でキャッシュさせる）
+    raw_s = _timed(raw, repeat)
+    collect_s = _timed(lambda: client.run_draft_workflow_collect(app_id=app_id, inputs={}), repeat)
+
+    def rates(samples: list[float]) -> dict[str, Any]:
+        best = statistics.median(samples)
+        return {
+            **_summary(samples),
+            "events_per_s": round(n / best, 1),
+            "mb_per_s": round(nbytes / best / 1e6, 2),
+        }
+
+    gc.collect()
+    tracemalloc.start()
+    result = client.run_draft_workflow_collect(app_id=app_id, inputs={})
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(result["events"]) == n
+
+    return {
+        "events": n,
+        "bytes": nbytes,
+        "event_bytes": event_bytes,
+        "raw": rates(raw_s),
+        "collect": {**rates(collect_s), "peak_mem_mb": round(peak / 1e6, 2)},
+    }
+
+
+def run_all(args: argparse.Namespace) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    os.environ.setdefault("DIFY_SESSION_CACHE", "0")
+    results["cli_startup"] = bench_cli_startup(args.startup_repeat)
+    imports, failures = check_startup(min(args.startup_repeat, 3))
+    results["startup_check"] = {"imports": imports, "failures": failures}
+    with StubServer(config=StubConfig()) as server:
+        results["login"] = bench_login(server, args.repeat)
+        results["import"] = bench_import(server, args.imports, args.workers)
+        results["sse"] = [bench_sse(server, events, args.event_bytes, args.sse_repeat) for events in args.events]
+    return results
+
+
+def _git_rev() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description="Benchmark dify_creator against a local stub Dify console server")
+    p.add_argument("--out", help="Write JSON results to this file (default: stdout)")
+    p.add_argument("--quick", action="store_true", help="Few iterations (smoke run)")
+    p.add_argument("--repeat", type=int, default=20, help="Iterations for login (default: 20)")
+    p.add_argument("--startup-repeat", type=int, default=10, help="Iterations for CLI startup (default: 10)")
+    p.add_argument("--imports", type=int, default=200, help="Imports per import benchmark (default: 200)")
+    p.add_argument("--workers", type=int, default=8, help="Threads for the parallel import benchmark (default: 8)")
+    p.add_argument(
+        "--events", type=int, nargs="+", default=[1000, 20000], help="SSE events per run (default: 1000 20000)"
+    )
+    p.add_argument("--event-bytes", type=int, default=512, help="Approximate bytes per SSE event (default: 512)")
+    p.add_argument("--sse-repeat", type=int, default=5, help="Runs per SSE configuration (default: 5)")
+    args = p.parse_args(argv)
+    if args.quick:
+        args.repeat, args.startup_repeat, args.imports, args.sse_repeat = 3, 2, 20, 2
+        args.events = [1000]
+
+    results = run_all(args)
+    report = {
+        "meta": {
+            "version": __version__,
+            "git_rev": _git_rev(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    # 起動時の import の回帰（check_startup.py）は計測値と一緒に保存したうえで失敗にする
+    for failure in results["startup_check"]["failures"]:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 1 if results["startup_check"]["failures"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
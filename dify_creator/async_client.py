@@ -0,0 +1,414 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:  # pragma: no cover
+    aiohttp = None  # type: ignore[assignment]
+
+from dify_creator.console_client import (
+    ConsoleConfig,
+    DifyConsoleError,
+    SSEDecoder,
+    _join_url,
+    build_draft_run_request,
+    build_import_payload,
+    build_request_headers,
+    decode_export_response,
+    decode_sse_json,
+    is_auth_error_retryable,
+    session_cache_from_env,
+)
+from dify_creator.session_cache import SessionCache, is_session_cookie
+
+# ストリーム読み取り中に aiohttp が送出する例外（切断・途中終了・読み取りタイムアウト）
+_STREAM_ERRORS: tuple[type[BaseException], ...] = (
+    (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError) if aiohttp is not None else ()
+)
+
+
+async def iter_response_chunks(resp: "aiohttp.ClientResponse") -> AsyncIterator[bytes]:
+    """
+    console_client.iter_response_chunks の async 版。届いた分だけ読む。
+    読み取り中の aiohttp の例外（切断・途中終了・タイムアウト）は DifyConsoleError にする。
+    """
+    try:
+        async for chunk in resp.content.iter_any():
+            yield chunk
+    except _STREAM_ERRORS as e:
+        raise DifyConsoleError(f"ストリームの読み取りに失敗しました: {type(e).__name__}: {e}") from e
+
+
+class AsyncDifyConsoleClient:
+    """
+    DifyConsoleClient と同じ API を asyncio (aiohttp) 上で提供するクライアント。
+
+    1つのコネクションプール (TCPConnector) を共有するため、1プロセスで多数の
+    draft run の SSE ストリームを同時に保持できる。CSRF ヘッダー・import ペイロード・
+    SSE 行の解析は同期クライアントと共通の関数を使う。
+
+        async with AsyncDifyConsoleClient.from_env() as client:
+            await client.ensure_login(email=..., password_plain=...)
+            result = await client.run_draft_workflow_collect(app_id=..., inputs={...})
+    """
+
+    def __init__(
+        self,
+        config: ConsoleConfig,
+        session_cache: SessionCache | None = None,
+        *,
+        max_connections: int = 100,
+    ):
+        if aiohttp is None:
+            raise DifyConsoleError("AsyncDifyConsoleClient には aiohttp が必要です（pip install aiohttp）")
+        self.config = config
+        self.session_cache = session_cache
+        self.max_connections = max_connections
+        self._session: aiohttp.ClientSession | None = None
+        self._credentials: tuple[str, str] | None = None
+        self._auth_lock: asyncio.Lock | None = None
+
+    @classmethod
+    def from_env(cls, *, max_connections: int = 100) -> "AsyncDifyConsoleClient":
+        return cls(ConsoleConfig.from_env(), session_cache=session_cache_from_env(), max_connections=max_connections)
+
+    async def __aenter__(self) -> "AsyncDifyConsoleClient":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self) -> "aiohttp.ClientSession":
+        # ClientSession はイベントループ内で生成する必要があるため遅延生成
+        if self._session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections,
+                ssl=None if self.config.verify_ssl else False,
+            )
+            # unsafe=True: セルフホストで多い IP アドレス直指定の Cookie も受け入れる
+            self._session = aiohttp.ClientSession(
+                connector=connector, cookie_jar=aiohttp.CookieJar(unsafe=True)
+            )
+        return self._session
+
+    def _cookie(self, name: str) -> str | None:
+        for m in self.session.cookie_jar:
+            if m.key == name:
+                return m.value
+        return None
+
+    def _csrf(self) -> str | None:
+        return self._cookie("csrf_token")
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: dict[str, Any] | None = None,
+        json_body: dict[str, Any] | None = None,
+        stream: bool = False,
+        extra_headers: dict[str, str] | None = None,
+        timeout_s: float | None = None,
+    ) -> "aiohttp.ClientResponse":
+        """
+        stream=False の場合はボディを読み込み済みのレスポンスを返す。
+        stream=True の場合は呼び出し側で release() すること。
+        """
+        url = _join_url(self.config.api_base, path)
+        if stream:
+            # requests の timeout と同様、読み取り間隔のタイムアウトのみ適用
+            timeout = aiohttp.ClientTimeout(total=None, sock_read=timeout_s or self.config.timeout_s)
+        else:
+            timeout = aiohttp.ClientTimeout(total=timeout_s or self.config.timeout_s)
+
+        async def send() -> aiohttp.ClientResponse:
+            resp = await self.session.request(
+                method.upper(),
+                url,
+                params=params,
+                json=json_body,
+                headers=build_request_headers(method, self._csrf(), extra_headers),
+                timeout=timeout,
+            )
+            if not stream:
+                await resp.read()
+            return resp
+
+        csrf_sent = self._csrf()
+        resp = await send()
+        if is_auth_error_retryable(resp.status, path) and await self._recover_auth(csrf_sent):
+            resp.release()
+            resp = await send()
+        return resp
+
+    async def _recover_auth(self, csrf_sent: str | None) -> bool:
+        if self._auth_lock is None:
+            self._auth_lock = asyncio.Lock()
+        async with self._auth_lock:
+            if self._csrf() != csrf_sent:
+                return True
+            if await self.refresh_session():
+                return True
+            if self._credentials is None:
+                return False
+            email, password_plain = self._credentials
+            await self.login(email=email, password_plain=password_plain)
+            return True
+
+    async def _raise_for_status(self, resp: "aiohttp.ClientResponse") -> None:
+        if 200 <= resp.status < 300:
+            return
+        text = await resp.text()
+        resp.release()
+        try:
+            detail: Any = json.loads(text)
+        except ValueError:
+            detail = text
+        raise DifyConsoleError(f"HTTP {resp.status}: {detail}")
+
+    def _dump_session_cookies(self) -> list[dict[str, Any]]:
+        out: list[dict[str, Any]] = []
+        for m in self.session.cookie_jar:
+            if not is_session_cookie(m.key):
+                continue
+            expires: float | None = None
+            if m["expires"]:
+                try:
+                    expires = parsedate_to_datetime(m["expires"]).timestamp()
+                except (TypeError, ValueError):
+                    expires = None
+            elif m["max-age"]:
+                expires = time.time() + int(m["max-age"])
+            out.append(
+                {
+                    "name": m.key,
+                    "value": m.value,
+                    "domain": m["domain"],
+                    "path": m["path"] or "/",
+                    "secure": bool(m["secure"]),
+                    "expires": expires,
+                }
+            )
+        return out
+
+    def _save_session(self) -> None:
+        if self.session_cache is None or self._credentials is None:
+            return
+        key = SessionCache.key(self.config.base_url, self._credentials[0])
+        self.session_cache.save(key, self._dump_session_cookies())
+
+    async def login(self, *, email: str, password_plain: str, remember_me: bool = False) -> None:
+        resp = await self._request(
+            "POST",
+            "/login",
+            json_body={"email": email, "password": password_plain, "remember_me": remember_me},
+        )
+        await self._raise_for_status(resp)
+        if not self._csrf():
+            raise DifyConsoleError("ログイン後に csrf_token Cookie が見つかりません（Difyの設定/挙動を確認してください）")
+
+        self._credentials = (email, password_plain)
+        self._save_session()
+
+    async def ensure_login(self, *, email: str, password_plain: str) -> None:
+        """
+        DifyConsoleClient.ensure_login と同じ。
+        キャッシュのファイルロックは同期的に取得する（起動時に1回だけ呼ぶ想定）。
+        """
+        self._credentials = (email, password_plain)
+        if self.session_cache is None:
+            await self.login(email=email, password_plain=password_plain)
+            return
+
+        key = SessionCache.key(self.config.base_url, email)
+        with self.session_cache.locked(key):
+            cookies = self.session_cache.load(key)
+            if cookies:
+                response_url = URL(self.config.base_url)
+                for c in cookies:
+                    self.session.cookie_jar.update_cookies({c["name"]: c["value"]}, response_url=response_url)
+                if self._csrf():
+                    return
+            await self.login(email=email, password_plain=password_plain)
+
+    async def refresh_session(self) -> bool:
+        if self._cookie("refresh_token") is None and self._cookie("__Host-refresh_token") is None:
+            return False
+        resp = await self._request("POST", "/refresh-token")
+        resp.release()
+        if not (200 <= resp.status < 300) or not self._csrf():
+            return False
+        self._save_session()
+        return True
+
+    async def import_app(
+        self,
+        *,
+        yaml_content: str | None = None,
+        yaml_url: str | None = None,
+        app_id: str | None = None,
+        name: str | None = None,
+        description: str | None = None,
+        icon_type: str | None = None,
+        icon: str | None = None,
+        icon_background: str | None = None,
+        validate_yaml: bool = True,
+    ) -> dict[str, Any]:
+        payload = build_import_payload(
+            yaml_content=yaml_content,
+            yaml_url=yaml_url,
+            app_id=app_id,
+            name=name,
+            description=description,
+            icon_type=icon_type,
+            icon=icon,
+            icon_background=icon_background,
+            validate_yaml=validate_yaml,
+        )
+        try:
+            resp = await self._request("POST", "/apps/imports", json_body=payload)
+            # import はステータスに応じて 200/202/400 を返す
+            if resp.status in {200, 202}:
+                return await resp.json()
+            await self._raise_for_status(resp)
+        except DifyConsoleError as e:
+            raise DifyConsoleError(f"DSLインポートに失敗しました: {e}")
+        return {}  # 到達不可
+
+    async def confirm_import(self, import_id: str) -> dict[str, Any]:
+        resp = await self._request("POST", f"/apps/imports/{import_id}/confirm")
+        await self._raise_for_status(resp)
+        return await resp.json()
+
+    async def export_app(self, *, app_id: str, include_secret: bool = False, workflow_id: str | None = None) -> str:
+        params: dict[str, Any] = {"include_secret": str(include_secret).lower()}
+        if workflow_id:
+            params["workflow_id"] = workflow_id
+        resp = await self._request("GET", f"/apps/{app_id}/export", params=params)
+        await self._raise_for_status(resp)
+        return decode_export_response(await resp.json())
+
+    async def run_draft_workflow_stream(
+        self,
+        *,
+        app_id: str,
+        inputs: dict[str, Any],
+        files: list[dict[str, Any]] | None = None,
+        external_trace_id: str | None = None,
+        timeout_s: float | None = None,
+    ) -> "aiohttp.ClientResponse":
+        """
+        呼び出し側で iter_sse_json() で読み切るか release() すること。
+        timeout_s はイベント間の読み取りタイムアウト（未指定なら config.timeout_s）。
+        """
+        payload, headers = build_draft_run_request(inputs, files, external_trace_id)
+        resp = await self._request(
+            "POST",
+            f"/apps/{app_id}/workflows/draft/run",
+            json_body=payload,
+            stream=True,
+            extra_headers=headers,
+            timeout_s=timeout_s,
+        )
+        await self._raise_for_status(resp)
+        return resp
+
+    async def iter_sse_json(self, resp: "aiohttp.ClientResponse") -> AsyncIterator[dict[str, Any]]:
+        """
+        DifyConsoleClient.iter_sse_json の async 版。
+        StreamReader.readline は長い行（大きな node_finished など）で失敗するため、
+        受信チャンクを SSEDecoder で分割する。
+        """
+        decoder = SSEDecoder()
+        try:
+            async for chunk in iter_response_chunks(resp):
+                for payload in decoder.feed(chunk):
+                    ev = decode_sse_json(payload)
+                    if ev is not None:
+                        yield ev
+                if decoder.done:
+                    return
+            for payload in decoder.flush():
+                ev = decode_sse_json(payload)
+                if ev is not None:
+                    yield ev
+        finally:
+            resp.release()
+
+    async def stop_workflow_task(self, *, app_id: str, task_id: str) -> None:
+        """DifyConsoleClient.stop_workflow_task の async 版"""
+        resp = await self._request("POST", f"/apps/{app_id}/workflow-runs/tasks/{task_id}/stop")
+        await self._raise_for_status(resp)
+
+    async def stop_after_timeout(self, *, app_id: str, task_id: str | None) -> bool:
+        """DifyConsoleClient.stop_after_timeout の async 版（失敗しても例外にはしない）"""
+        if not task_id:
+            return False
+        try:
+            await self.stop_workflow_task(app_id=app_id, task_id=task_id)
+        except (DifyConsoleError, aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+        return True
+
+    async def run_draft_workflow_collect(
+        self,
+        *,
+        app_id: str,
+        inputs: dict[str, Any],
+        files: list[dict[str, Any]] | None = None,
+        external_trace_id: str | None = None,
+        max_wait_s: float | None = None,
+        stop_on_timeout: bool = True,
+    ) -> dict[str, Any]:
+        """
+        DifyConsoleClient.run_draft_workflow_collect の async 版。
+        max_wait_s はリクエスト開始からの壁時計の上限で、イベントが届かなくても適用される。
+        超えた場合は status / task_id / stopped を加えて返す。
+        """
+        events: list[dict[str, Any]] = []
+        last: dict[str, Any] | None = None
+        task_id: str | None = None
+        # 期限までは読み取りタイムアウトで切らない（期限は wait_for が守る）
+        timeout_s = max(self.config.timeout_s, max_wait_s + 1.0) if max_wait_s is not None else None
+
+        async def collect() -> None:
+            nonlocal last, task_id
+            resp = await self.run_draft_workflow_stream(
+                app_id=app_id, inputs=inputs, files=files, external_trace_id=external_trace_id, timeout_s=timeout_s
+            )
+            # 途中で抜けた（キャンセルされた）場合もレスポンスを確実に解放する
+            async with contextlib.aclosing(self.iter_sse_json(resp)) as stream:
+                async for ev in stream:
+                    events.append(ev)
+                    last = ev
+                    if task_id is None:
+                        task_id = ev.get("task_id")
+
+        try:
+            await asyncio.wait_for(collect(), max_wait_s)
+        except asyncio.TimeoutError:
+            if max_wait_s is None:
+                raise
+            return {
+                "events": events,
+                "last_event": last,
+                "status": "timeout",
+                "task_id": task_id,
+                "stopped": stop_on_timeout and await self.stop_after_timeout(app_id=app_id, task_id=task_id),
+            }
+        return {"events": events, "last_event": last}
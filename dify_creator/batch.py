@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any
+
+import requests
+
+from dify_creator.console_client import DifyConsoleClient, DifyConsoleError
+from dify_creator.stats import RateLimiter, latency_summary
+from dify_creator.sync import run_status
+
+
+@dataclass
+class BatchCase:
+    id: str
+    inputs: dict[str, Any]
+
+
+@dataclass
+class CaseResult:
+    id: str
+    status: str | None
+    elapsed_s: float
+    total_tokens: int | None = None
+    attempts: int = 1
+    outputs: Any = None
+    error: str | None = None
+
+
+def load_cases(path: str) -> list[BatchCase]:
+    """
+    テストケースを読み込む。
+
+    - .jsonl: 1行1ケース。{"id": ..., "inputs": {...}} 形式、または inputs そのもの
+      （その場合 "_id" キーがあればケースIDとして使い、inputs からは除く）
+    - .csv: ヘッダー行が inputs の変数名。"_id" 列があればケースIDとして使う
+    """
+    cases: list[BatchCase] = []
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for i, row in enumerate(csv.DictReader(f), start=1):
+                case_id = row.pop("_id", None) or str(i)
+                cases.append(BatchCase(id=case_id, inputs=dict(row)))
+        return cases
+
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise DifyConsoleError(f"{path}:{lineno}: JSON パースエラー: {e}")
+            if not isinstance(obj, dict):
+                raise DifyConsoleError(f"{path}:{lineno}: ケースは JSON object である必要があります")
+            if isinstance(obj.get("inputs"), dict):
+                cases.append(BatchCase(id=str(obj.get("id") or lineno), inputs=obj["inputs"]))
+            else:
+                case_id = obj.pop("_id", None)
+                cases.append(BatchCase(id=str(case_id or lineno), inputs=obj))
+    return cases
+
+
+def run_case(
+    client: DifyConsoleClient,
+    app_id: str,
+    case: BatchCase,
+    *,
+    limiter: RateLimiter,
+    retries: int = 0,
+    backoff_s: float = 1.0,
+    max_wait_s: float | None = None,
+) -> CaseResult:
+    """
+    1ケースを run_draft_workflow_collect で実行し、イベント列は捨てて結果だけを返す。
+    通信/HTTP エラーのみ retries 回まで指数バックオフで再試行する
+    （ワークフロー自体の failed は結果として扱い、再試行しない）。
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        limiter.wait()
+        t0 = time.perf_counter()
+        try:
+            collected = client.run_draft_workflow_collect(app_id=app_id, inputs=case.inputs, max_wait_s=max_wait_s)
+        except (DifyConsoleError, requests.RequestException) as e:
+            if attempt <= retries:
+                time.sleep(backoff_s * (2 ** (attempt - 1)))
+                continue
+            return CaseResult(
+                id=case.id, status="error", elapsed_s=time.perf_counter() - t0, attempts=attempt, error=str(e)
+            )
+        elapsed = time.perf_counter() - t0
+
+        last = collected.get("last_event") or {}
+        data = last.get("data") if last.get("event") == "workflow_finished" else None
+        data = data if isinstance(data, dict) else {}
+        return CaseResult(
+            id=case.id,
+            status=run_status(collected),
+            elapsed_s=elapsed,
+            total_tokens=data.get("total_tokens"),
+            attempts=attempt,
+            outputs=data.get("outputs"),
+            error=data.get("error"),
+        )
+
+
+def run_batch(
+    client: DifyConsoleClient,
+    app_id: str,
+    cases: list[BatchCase],
+    *,
+    concurrency: int = 4,
+    rate_per_s: float | None = None,
+    retries: int = 0,
+    max_wait_s: float | None = None,
+) -> tuple[list[CaseResult], dict[str, Any]]:
+    """全ケースを並列実行し、(ケースごとの結果, サマリ) を返す。結果はケースの順序どおり"""
+    concurrency = max(1, concurrency)
+    client.set_pool_size(concurrency)
+    limiter = RateLimiter(rate_per_s)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        results = list(
+            ex.map(
+                lambda c: run_case(client, app_id, c, limiter=limiter, retries=retries, max_wait_s=max_wait_s),
+                cases,
+            )
+        )
+    wall_s = time.perf_counter() - t0
+
+    status_counts: dict[str, int] = {}
+    for r in results:
+        key = r.status or "unknown"
+        status_counts[key] = status_counts.get(key, 0) + 1
+    tokens = [r.total_tokens for r in results if isinstance(r.total_tokens, int)]
+    ok = [r for r in results if r.status == "succeeded"]
+
+    summary = {
+        "app_id": app_id,
+        "cases": len(results),
+        "succeeded": len(ok),
+        "statuses": status_counts,
+        "concurrency": concurrency,
+        "rate_per_s": rate_per_s,
+        "wall_s": round(wall_s, 3),
+        "cases_per_s": round(len(results) / wall_s, 3) if wall_s > 0 else None,
+        "latency_s": latency_summary(r.elapsed_s for r in results),
+        "latency_succeeded_s": latency_summary(r.elapsed_s for r in ok),
+        "total_tokens": sum(tokens),
+        "mean_tokens": round(sum(tokens) / len(tokens), 1) if tokens else None,
+        "retries": sum(r.attempts - 1 for r in results),
+        "http": client.metrics.snapshot(),
+    }
+    return results, summary
+
+
+def write_results(path: str, results: list[CaseResult]) -> None:
+    """結果表を書き出す。.csv なら CSV（outputs は JSON 文字列）、それ以外は JSONL"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if path.lower().endswith(".csv"):
+        fields = ["id", "status", "elapsed_s", "total_tokens", "attempts", "error", "outputs"]
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=fields)
+            w.writeheader()
+            for r in results:
+                row = asdict(r)
+                row["elapsed_s"] = round(r.elapsed_s, 3)
+                row["outputs"] = json.dumps(r.outputs, ensure_ascii=False, separators=(",", ":"))
+                w.writerow(row)
+        return
+
+    with open(path, "w", encoding="utf-8") as f:
+        for r in results:
+            row = asdict(r)
+            row["elapsed_s"] = round(r.elapsed_s, 3)
+            f.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+            f.write("\n")
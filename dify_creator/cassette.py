@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from email.message import Message
+from typing import IO, Any, Iterator
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from dify_creator.errors import DifyConsoleError
+
+CASSETTE_MODES = ("record", "replay")
+MATCH_MODES = ("body", "path")
+
+# 記録しない（値を伏せる）ヘッダー。Cookie の値はトークンなのでカセットに残さない
+_REDACTED_COOKIE = "redacted"
+# 本文は展開して記録するので content-encoding も残さない
+_DROP_RESPONSE_HEADERS = frozenset(
+    {"date", "server", "content-length", "content-encoding", "transfer-encoding", "connection"}
+)
+
+# 記録がなくても replay で成功させるエンドポイント（認証はオフラインでは意味がないため）
+_SYNTHETIC_AUTH = {
+    "/console/api/login": '{"result": "success"}',
+    "/console/api/refresh-token": '{"result": "success"}',
+}
+
+# 認証リクエストの本文（パスワードなど）は hash もキーに残さない。塩なしの sha256 は総当たりで戻せるため
+_UNHASHED_BODY = "-"
+
+
+def _request_key(method: str, url: str, body: bytes | str | None, match: str) -> str:
+    """
+    リクエストの照合キー。path とクエリ（順序は無視）に加え、match="body" なら本文の sha256 も使う。
+    本文はキーにだけ使い、カセットには保存しない。ログイン / refresh-token は本文の hash も使わない。
+    """
+    parts = urlsplit(url)
+    query = "&".join(f"{k}={v}" for k, v in sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    key = f"{method.upper()} {parts.path}?{query}"
+    if match == "body":
+        if parts.path.endswith(tuple(_SYNTHETIC_AUTH)):
+            key += " " + _UNHASHED_BODY
+        else:
+            raw = body.encode("utf-8") if isinstance(body, str) else (body or b"")
+            key += " " + hashlib.sha256(raw).hexdigest()[:16]
+    return key
+
+
+def _encode(data: bytes) -> Any:
+    """本文・チャンクは UTF-8 ならそのまま文字列、そうでなければ {"b64": ...} で保存する"""
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(data).decode("ascii")}
+
+
+def _decode(value: Any) -> bytes:
+    if isinstance(value, dict):
+        return base64.b64decode(value["b64"])
+    return str(value).encode("utf-8")
+
+
+def _redact_set_cookie(value: str) -> str:
+    name, sep, rest = value.partition("=")
+    attrs = rest.partition(";")[2]
+    return f"{name}{sep}{_REDACTED_COOKIE}" + (f";{attrs}" if attrs else "")
+
+
+class Cassette:
+    """
+    HTTP のやり取り（SSE ストリームはチャンクと到着時刻も）を記録・再生するファイル。
+
+    - record: 実際の Dify に送り、リクエストのキーとレスポンスを1行1件の NDJSON (.gz なら gzip) に追記する
+    - replay: ネットワークに出ず、記録したレスポンスを返す。同じキーが複数回記録されていれば順に返し、
+      使い切ったら最後のものを返し続ける。speed=0 で即座に、1 で記録時と同じ間隔、10 なら 10 倍速で SSE を流す
+
+    Set-Cookie の値とリクエスト本文は保存しない（本文は照合キーの hash にだけ使う。認証リクエストは hash も使わない）。
+    replay ではログイン / refresh-token の記録がなくても成功したものとして応答する。
+    """
+
+    def __init__(self, path: str, *, mode: str = "replay", speed: float = 0.0, match: str = "body"):
+        if mode not in CASSETTE_MODES:
+            raise DifyConsoleError(f"cassette の mode は {' / '.join(CASSETTE_MODES)} のいずれかです: {mode}")
+        if match not in MATCH_MODES:
+            raise DifyConsoleError(f"cassette の match は {' / '.join(MATCH_MODES)} のいずれかです: {match}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.match = match
+        self._lock = threading.Lock()
+        self._interactions: dict[str, deque[dict[str, Any]]] = {}
+        self._last: dict[str, dict[str, Any]] = {}
+        if mode == "record":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._open("wb"):
+                pass  # 記録し直す
+        else:
+            self._load()
+
+    def _open(self, mode: str) -> IO[bytes]:
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode)  # type: ignore[return-value]
+        return open(self.path, mode)
+
+    def _load(self) -> None:
+        try:
+            with self._open("rb") as f:
+                lines = f.read().decode("utf-8").splitlines()
+        except FileNotFoundError:
+            raise DifyConsoleError(f"cassette が見つかりません: {self.path}")
+        for line in lines:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            key = entry["key"] if self.match == "body" else entry["key"].rsplit(" ", 1)[0]
+            self._interactions.setdefault(key, deque()).append(entry)
+
+    def adapter(self, pool_maxsize: int) -> BaseAdapter:
+        if self.mode == "record":
+            return RecordingAdapter(self, pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        return ReplayAdapter(self)
+
+    # --- record ---
+
+    def append(self, entry: dict[str, Any]) -> None:
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            with self._open("ab") as f:
+                f.write(line)
+
+    # --- replay ---
+
+    def take(self, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            queue = self._interactions.get(key)
+            if queue:
+                entry = queue.popleft()
+                self._last[key] = entry
+                return entry
+            return self._last.get(key)
+
+
+def cassette_from_env() -> Cassette | None:
+    """
+    DIFY_CASSETTE: カセットのパス（未設定なら無効）
+    DIFY_CASSETTE_MODE: record / replay（既定: replay）
+    DIFY_REPLAY_SPEED: replay で SSE を流す速さ（0 = 待たない（既定）、1 = 記録時と同じ、10 = 10 倍速）
+    DIFY_CASSETTE_MATCH: body（既定: メソッド・パス・クエリ・本文で照合）/ path（本文は無視）
+    """
+    path = os.getenv("DIFY_CASSETTE", "").strip()
+    if not path:
+        return None
+    return Cassette(
+        path,
+        mode=os.getenv("DIFY_CASSETTE_MODE", "").strip().lower() or "replay",
+        speed=float(os.getenv("DIFY_REPLAY_SPEED", "").strip() or 0),
+        match=os.getenv("DIFY_CASSETTE_MATCH", "").strip().lower() or "body",
+    )
+
+
+def _response_headers(raw: Any) -> list[list[str]]:
+    headers = getattr(raw, "headers", None) or {}
+    out: list[list[str]] = []
+    for name, value in headers.items():
+        lower = name.lower()
+        if lower in _DROP_RESPONSE_HEADERS:
+            continue
+        out.append([name, _redact_set_cookie(value) if lower == "set-cookie" else value])
+    return out
+
+
+class RecordingAdapter(HTTPAdapter):
+    """通常の HTTPAdapter として送り、レスポンスをカセットに記録する"""
+
+    def __init__(self, cassette: Cassette, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, **kwargs: Any) -> requests.Response:
+        started = time.perf_counter()
+        resp = super().send(request, stream=stream, **kwargs)
+        entry: dict[str, Any] = {
+            "key": _request_key(request.method or "GET", request.url or "", request.body, "body"),
+            "status": resp.status_code,
+            "reason": resp.reason,
+            "headers": _response_headers(resp.raw),
+            "ttfb_s": round(time.perf_counter() - started, 4),
+        }
+        if stream:
+            resp.raw = _TeeRaw(resp.raw, self.cassette, entry)
+        else:
+            entry["body"] = _encode(resp.content)
+            self.cassette.append(entry)
+        return resp
+
+
+class _TeeRaw:
+    """urllib3 のレスポンスを包み、読んだチャンクを到着時刻付きで記録する（読み終わり / close で書き出す）"""
+
+    def __init__(self, raw: Any, cassette: Cassette, entry: dict[str, Any]):
+        self._raw = raw
+        self._cassette = cassette
+        self._entry = entry
+        self._t0 = time.perf_counter()
+        self._chunks: list[list[Any]] = []
+        self._done = False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._raw, name)
+
+    def _add(self, data: bytes) -> bytes:
+        if data:
+            self._chunks.append([round(time.perf_counter() - self._t0, 4), _encode(data)])
+        else:
+            self._finish()
+        return data
+
+    def _finish(self) -> None:
+        if self._done:
+            return
+        self._done = True
+        self._cassette.append({**self._entry, "chunks": self._chunks})
+
+    def read1(self, amt: int = -1, decode_content: bool | None = None) -> bytes:
+        # 展開後のチャンクを記録する（再生時はそのまま返す）
+        read1 = getattr(self._raw, "read1", None)
+        if read1 is not None:
+            return self._add(read1(amt, decode_content=decode_content))
+        return self._add(self._raw.read(amt, decode_content=decode_content))
+
+    def read(self, amt: int | None = None, *args: Any, **kwargs: Any) -> bytes:
+        data = self._raw.read(amt, *args, **kwargs)
+        if amt is None:
+            self._add(data)
+            return self._add(b"")
+        return self._add(data)
+
+    def stream(self, amt: int | None = 2**16, decode_content: bool | None = None) -> Iterator[bytes]:
+        for chunk in self._raw.stream(amt, decode_content=decode_content):
+            yield self._add(chunk)
+        self._finish()
+
+    def close(self) -> None:
+        self._finish()
+        self._raw.close()
+
+    def release_conn(self) -> None:
+        self._finish()
+        self._raw.release_conn()
+
+
+class _OriginalResponse:
+    """requests が Set-Cookie を取り出すときに参照する http.client.HTTPResponse の代わり"""
+
+    def __init__(self, headers: list[list[str]]):
+        self.msg = Message()
+        for name, value in headers:
+            self.msg[name] = value
+
+    def info(self) -> Message:
+        return self.msg
+
+
+class _ReplayRaw:
+    """記録したチャンクを（speed に応じて記録時の間隔で）返す urllib3 レスポンスの代わり"""
+
+    def __init__(self, entry: dict[str, Any], speed: float):
+        self.status = entry["status"]
+        self.reason = entry.get("reason") or ""
+        self.headers = CaseInsensitiveDict({k: v for k, v in entry.get("headers") or []})
+        self._original_response = _OriginalResponse(entry.get("headers") or [])
+        if "chunks" in entry:
+            self._chunks = deque((t, _decode(data)) for t, data in entry["chunks"])
+        else:
+            self._chunks = deque([(0.0, _decode(entry.get("body", "")))])
+        self._speed = speed
+        self._t0 = time.perf_counter()
+        self._closed = threading.Event()
+        self._buf = b""
+
+    def _next(self) -> bytes:
+        if not self._chunks or self._closed.is_set():
+            return b""
+        t, data = self._chunks.popleft()
+        if self._speed > 0:
+            wait = t / self._speed - (time.perf_counter() - self._t0)
+            if wait > 0 and self._closed.wait(wait):
+                return b""
+        return data
+
+    def read1(self, amt: int = -1, decode_content: bool | None = None) -> bytes:
+        if self._buf:
+            data, self._buf = self._buf, b""
+        else:
+            data = self._next()
+        if amt is not None and amt >= 0 and len(data) > amt:
+            data, self._buf = data[:amt], data[amt:]
+        return data
+
+    def read(self, amt: int | None = None, **_: Any) -> bytes:
+        if amt is None:
+            out = [self._buf] + [self._next() for _ in range(len(self._chunks))]
+            self._buf = b""
+            return b"".join(out)
+        return self.read1(amt)
+
+    def stream(self, amt: int | None = 2**16, decode_content: bool | None = None) -> Iterator[bytes]:
+        while True:
+            data = self.read1(amt if amt is not None else -1)
+            if not data:
+                return
+            yield data
+
+    def close(self) -> None:
+        self._closed.set()
+
+    def release_conn(self) -> None:
+        pass
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+
+class ReplayAdapter(BaseAdapter):
+    """ネットワークに出ずにカセットから応答する"""
+
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self.cassette = cassette
+        self._http = HTTPAdapter(max_retries=0)  # build_response だけ使う
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, **_: Any) -> requests.Response:
+        method, url = request.method or "GET", request.url or ""
+        entry = self.cassette.take(_request_key(method, url, request.body, self.cassette.match))
+        if entry is None:
+            path = urlsplit(url).path
+            if method.upper() == "POST" and path.endswith(tuple(_SYNTHETIC_AUTH)):
+                entry = self._synthetic_auth(path)
+            else:
+                raise DifyConsoleError(f"cassette に記録のないリクエストです: {method} {path} ({self.cassette.path})")
+        speed = self.cassette.speed if stream else 0.0
+        resp = self._http.build_response(request, _ReplayRaw(entry, speed))
+        if not stream:
+            resp.content  # noqa: B018  通常のレスポンスと同様に本文を読み込んでおく
+        return resp
+
+    def _synthetic_auth(self, path: str) -> dict[str, Any]:
+        body = next(v for k, v in _SYNTHETIC_AUTH.items() if path.endswith(k))
+        cookies = [
+            ["Set-Cookie", f"{name}={_REDACTED_COOKIE}; Path=/"]
+            for name in ("access_token", "refresh_token", "csrf_token")
+        ]
+        return {
+            "status": 200,
+            "reason": "OK",
+            "headers": [["Content-Type", "application/json"], *cookies],
+            "body": body,
+        }
+
+    def close(self) -> None:
+        self._http.close()
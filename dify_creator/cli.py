@@ -1,22 +1,28 @@
 from __future__ import annotations
 
 import argparse
+import atexit
 import json
 import os
 import sys
-from typing import Any
+import time
+from typing import TYPE_CHECKING, Any
 
-import yaml
-
-from dify_creator.console_client import (
-    DifyConsoleClient,
-    DifyConsoleError,
+from dify_creator.errors import DifyConsoleError
+from dify_creator.file_io import (
     load_dotenv_if_present,
     read_json_file,
     read_yaml_file,
     write_json_file,
     write_text_file,
 )
+from dify_creator.validate_output import OUTPUT_FORMATS
+
+if TYPE_CHECKING:
+    from dify_creator.console_client import DifyConsoleClient
+
+# サブコマンドに必要なモジュール（requests・yaml など）は各 cmd_* の中で import する。
+# スクリプトから何度も呼ばれるので、validate や --help では HTTP クライアントを読み込まない。
 
 
 def _require_env(name: str) -> str:
@@ -26,16 +32,51 @@ def _require_env(name: str) -> str:
     return v
 
 
-def cmd_login(_: argparse.Namespace) -> int:
+def _client_from_env() -> DifyConsoleClient:
+    """
+    from_env()。計測 (DIFY_PROMETHEUS_FILE / DIFY_OTEL_FILE / OTEL_EXPORTER_OTLP_ENDPOINT) が
+    有効ならプロセス終了時に書き出す。
+    """
+    from dify_creator.console_client import DifyConsoleClient
+
     client = DifyConsoleClient.from_env()
+    if client.instrumentation:
+        atexit.register(client.flush_instrumentation)
+    return client
+
+
+def _logged_in_client() -> DifyConsoleClient:
+    """
+    _client_from_env() + ログイン。セッションキャッシュに有効な Cookie があればログインを省略する。
+    """
+    client = _client_from_env()
+    client.ensure_login(email=_require_env("DIFY_EMAIL"), password_plain=_require_env("DIFY_PASSWORD"))
+    return client
+
+
+def _optimized(doc: Any, enabled: bool | None) -> Any:
+    """--optimize / DIFY_OPTIMIZE_DSL が有効なら import で送る DSL を最適化し、減ったバイト数を stderr に出す"""
+    from dify_creator.dsl_optimize import optimize_document, optimize_from_env
+
+    if doc is None or not optimize_from_env(enabled):
+        return doc
+    optimized = optimize_document(doc)
+    if optimized is not doc:
+        before, after = len(doc.text.encode("utf-8")), len(optimized.text.encode("utf-8"))
+        print(f"optimized: {before} -> {after} bytes (-{(before - after) / before:.1%})", file=sys.stderr)
+    return optimized
+
+
+def cmd_login(_: argparse.Namespace) -> int:
+    # 接続確認なので常に実際にログインする（成功すればキャッシュも更新される）
+    client = _client_from_env()
     client.login(email=_require_env("DIFY_EMAIL"), password_plain=_require_env("DIFY_PASSWORD"))
     print("ok")
     return 0
 
 
 def cmd_export(args: argparse.Namespace) -> int:
-    client = DifyConsoleClient.from_env()
-    client.login(email=_require_env("DIFY_EMAIL"), password_plain=_require_env("DIFY_PASSWORD"))
+    client = _logged_in_client()
     dsl = client.export_app(app_id=args.app_id, include_secret=args.include_secret, workflow_id=args.workflow_id)
     if args.out:
         write_text_file(args.out, dsl)
@@ -44,26 +85,107 @@ def cmd_export(args: argparse.Namespace) -> int:
     return 0
 
 
-def cmd_import(args: argparse.Namespace) -> int:
-    client = DifyConsoleClient.from_env()
-    client.login(email=_require_env("DIFY_EMAIL"), password_plain=_require_env("DIFY_PASSWORD"))
-
-    yaml_content = read_yaml_file(args.dsl) if args.dsl else None
-    result = client.import_app(
-        yaml_content=yaml_content,
-        yaml_url=args.yaml_url,
-        app_id=args.app_id,
-        name=args.name,
-        description=args.description,
-        icon_type=args.icon_type,
-        icon=args.icon,
-        icon_background=args.icon_background,
+def cmd_export_all(args: argparse.Namespace) -> int:
+    """
+    ワークスペースの全アプリを並列に export し、変更があったファイルだけを書き換える
+    """
+    from dify_creator.export_all import export_all
+
+    client = _logged_in_client()
+    summary = export_all(
+        client,
+        args.out_dir,
+        workers=args.workers,
+        include_secret=args.include_secret,
+        page_size=args.page_size,
+        prune=args.prune,
     )
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if not summary["failed"] else 1
 
-    # If pending, confirm
-    if result.get("status") == "pending":
-        confirm = client.confirm_import(result["id"])
-        result = confirm
+
+def cmd_diff(args: argparse.Namespace) -> int:
+    """
+    デプロイ済みの DSL (export) とローカルの DSL の構造的な差分。import したときに何が変わるかを表示する。
+    終了コードは diff(1) と同じく差分なし 0 / あり 1。
+    """
+    from dify_creator.dsl import load_dsl_file, parse_dsl
+    from dify_creator.dsl_diff import diff_dsl, format_diff_text
+
+    doc = load_dsl_file(args.dsl)
+    client = _logged_in_client()
+    remote = parse_dsl(client.export_app(app_id=args.app_id, include_secret=args.include_secret))
+    diff = diff_dsl(remote, doc.data)
+    if args.format == "json":
+        text = json.dumps(diff.to_dict(), ensure_ascii=False, indent=2, default=str) + "\n"
+    else:
+        text = format_diff_text(diff)
+    if args.out:
+        write_text_file(args.out, text)
+    else:
+        sys.stdout.write(text)
+    return 0 if diff.empty else 1
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    from dify_creator.dsl import load_dsl_file
+    from dify_creator.sync import import_unless_unchanged, incremental_import
+    from dify_creator.sync_state import SyncState
+
+    client = _logged_in_client()
+
+    doc = _optimized(load_dsl_file(args.dsl) if args.dsl else None, args.optimize)
+    if args.incremental and doc is not None:
+        # DSL が前回 import 時から変わっていなければ upload しない
+        state = SyncState(args.state_file)
+        result, _, skipped = incremental_import(
+            client,
+            state,
+            doc=doc,
+            app_id=args.app_id,
+            verify_remote=args.verify_remote,
+            diff_remote=args.diff_remote,
+            name=args.name,
+            description=args.description,
+            icon_type=args.icon_type,
+            icon=args.icon,
+            icon_background=args.icon_background,
+        )
+        state.save()
+        if skipped:
+            print("unchanged: import をスキップしました", file=sys.stderr)
+    elif args.diff_remote and doc is not None:
+        # デプロイ済みの DSL と構造的な差分がなければ upload しない
+        result, _, skipped = import_unless_unchanged(
+            client,
+            doc=doc,
+            app_id=args.app_id,
+            diff_remote=True,
+            name=args.name,
+            description=args.description,
+            icon_type=args.icon_type,
+            icon=args.icon,
+            icon_background=args.icon_background,
+        )
+        if skipped:
+            print("unchanged: import をスキップしました", file=sys.stderr)
+    else:
+        result = client.import_app(
+            yaml_content=doc.text if doc is not None else None,
+            yaml_url=args.yaml_url,
+            app_id=args.app_id,
+            name=args.name,
+            description=args.description,
+            icon_type=args.icon_type,
+            icon=args.icon,
+            icon_background=args.icon_background,
+            validate_yaml=False,
+        )
+
+        # If pending, confirm
+        if result.get("status") == "pending":
+            confirm = client.confirm_import(result["id"])
+            result = confirm
 
     if args.out:
         write_json_file(args.out, result)
@@ -72,8 +194,9 @@ def cmd_import(args: argparse.Namespace) -> int:
 
 
 def cmd_run(args: argparse.Namespace) -> int:
-    client = DifyConsoleClient.from_env()
-    client.login(email=_require_env("DIFY_EMAIL"), password_plain=_require_env("DIFY_PASSWORD"))
+    from dify_creator.run_events import stream_run_events
+
+    client = _logged_in_client()
 
     inputs: dict[str, Any]
     if args.inputs_json:
@@ -85,118 +208,286 @@ def cmd_run(args: argparse.Namespace) -> int:
         if not isinstance(inputs, dict):
             raise DifyConsoleError("--inputs-inline は JSON object である必要があります")
 
-    collected = client.run_draft_workflow_collect(app_id=args.app_id, inputs=inputs, max_wait_s=args.max_wait_s)
+    event_types = {t.strip() for t in args.events.split(",") if t.strip()} if args.events else None
+
+    if args.stream:
+        # イベントを受信したそばから NDJSON で書き出し、メモリには集計だけを持つ
+        if args.out:
+            os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+            with open(args.out, "wb") as f:
+                summary = stream_run_events(
+                    client,
+                    app_id=args.app_id,
+                    inputs=inputs,
+                    out=f,
+                    event_types=event_types,
+                    max_wait_s=args.max_wait_s,
+                    stop_on_timeout=not args.no_stop,
+                )
+            print(json.dumps(summary, ensure_ascii=False, indent=2))
+        else:
+            summary = stream_run_events(
+                client,
+                app_id=args.app_id,
+                inputs=inputs,
+                out=sys.stdout.buffer,
+                event_types=event_types,
+                max_wait_s=args.max_wait_s,
+                stop_on_timeout=not args.no_stop,
+            )
+            print(json.dumps(summary, ensure_ascii=False, indent=2), file=sys.stderr)
+        return 0
+
+    collected = client.run_draft_workflow_collect(
+        app_id=args.app_id, inputs=inputs, max_wait_s=args.max_wait_s, stop_on_timeout=not args.no_stop
+    )
+    if event_types is not None:
+        collected["events"] = [ev for ev in collected["events"] if ev.get("event") in event_types]
     if args.out:
         write_json_file(args.out, collected)
     print(json.dumps(collected, ensure_ascii=False, indent=2))
     return 0
 
 
-def cmd_validate(args: argparse.Namespace) -> int:
+def cmd_profile(args: argparse.Namespace) -> int:
     """
-    Validate DSL YAML file for basic structure and required fields
+    draft run のイベントからノードごとの時間・トークンの表、クリティカルパス、トレースファイルを作る。
+    --events-file を指定すると実行せずに保存済みのイベントを解析する。
     """
-    yaml_text = read_yaml_file(args.dsl)
-    try:
-        dsl_content = yaml.safe_load(yaml_text)
-    except yaml.YAMLError as e:
-        raise DifyConsoleError(f"YAML パースエラー: {e}")
-
-    if not isinstance(dsl_content, dict):
-        raise DifyConsoleError("DSL は YAML object (dictionary) である必要があります")
-
-    errors: list[str] = []
-    warnings: list[str] = []
-
-    # Check required top-level fields
-    required_fields = ["version", "kind", "app"]
-    for field in required_fields:
-        if field not in dsl_content:
-            errors.append(f"必須フィールド '{field}' が見つかりません")
-
-    # Check version format
-    version = dsl_content.get("version")
-    if version and not isinstance(version, str):
-        errors.append(f"'version' は文字列である必要があります（現在: {type(version).__name__}）")
-
-    # Check kind value
-    kind = dsl_content.get("kind")
-    if kind and kind != "app":
-        errors.append(f"'kind' は 'app' である必要があります（現在: {kind}）")
-
-    # Check app section
-    app = dsl_content.get("app")
-    if app:
-        if not isinstance(app, dict):
-            errors.append("'app' は object（dictionary）である必要があります")
-        else:
-            if "name" not in app:
-                errors.append("'app.name' は必須です")
-            if "mode" not in app:
-                errors.append("'app.mode' は必須です")
-            else:
-                valid_modes = {"workflow", "chat", "agent"}
-                if app.get("mode") not in valid_modes:
-                    errors.append(f"'app.mode' は {valid_modes} のいずれかである必要があります（現在: {app.get('mode')}）")
-
-    # Check workflow or model_config
-    mode = dsl_content.get("app", {}).get("mode")
-    if mode == "workflow":
-        if "workflow" not in dsl_content:
-            errors.append("Workflow モードの場合、'workflow' セクションは必須です")
-        else:
-            workflow = dsl_content.get("workflow")
-            if not isinstance(workflow, dict):
-                errors.append("'workflow' は object（dictionary）である必要があります")
-            elif "nodes" in workflow and isinstance(workflow["nodes"], list):
-                node_ids = {node.get("id") for node in workflow["nodes"] if isinstance(node, dict)}
-                # Check for required start and end nodes
-                if "start" not in node_ids:
-                    warnings.append("'start' ノードが見つかりません")
-                if "end" not in node_ids:
-                    warnings.append("'end' ノードが見つかりません")
-
-    elif mode == "chat" or mode == "agent":
-        if "model_config" not in dsl_content:
-            errors.append(f"{mode.capitalize()} モードの場合、'model_config' セクションは必須です")
+    from dify_creator.run_profile import RunProfiler, format_profile_table, load_events
+
+    profiler = RunProfiler()
+    if args.events_file:
+        for ev in load_events(args.events_file):
+            if isinstance(ev, dict):
+                profiler.update(ev)
+    else:
+        if not args.app_id:
+            raise DifyConsoleError("--app-id か --events-file のどちらかが必要です")
+        from dify_creator.run_events import stream_run_events
+        from dify_creator.sync import read_inputs
+
+        inputs = read_inputs(args.inputs_json) if args.inputs_json else json.loads(args.inputs_inline or "{}")
+        if not isinstance(inputs, dict):
+            raise DifyConsoleError("inputs は JSON object である必要があります")
+        client = _logged_in_client()
+        stream_run_events(
+            client,
+            app_id=args.app_id,
+            inputs=inputs,
+            out=None,
+            max_wait_s=args.max_wait_s,
+            on_event=profiler,
+        )
+
+    summary = profiler.summary()
+    if args.trace_out:
+        if args.trace_out.endswith((".folded", ".txt")):
+            write_text_file(args.trace_out, profiler.folded_stacks())
         else:
-            model_config = dsl_content.get("model_config")
-            if not isinstance(model_config, dict):
-                errors.append("'model_config' は object（dictionary）である必要があります")
-
-    # Print results
-    print(f"DSL Validation: {args.dsl}")
-    print("")
-
-    if errors:
-        print(f"❌ エラー ({len(errors)}):")
-        for error in errors:
-            print(f"  - {error}")
-        print("")
-
-    if warnings:
-        print(f"⚠️  警告 ({len(warnings)}):")
-        for warning in warnings:
-            print(f"  - {warning}")
-        print("")
-
-    if not errors:
-        print("✅ 検証成功：DSLは基本的に有効です")
-        return 0
+            write_json_file(args.trace_out, profiler.chrome_trace())
+    if args.out:
+        write_json_file(args.out, summary)
+    print(format_profile_table(summary))
+    return 0
+
+
+def cmd_batch(args: argparse.Namespace) -> int:
+    """
+    入力ケースのファイル (JSONL/CSV) を1つの draft workflow に対して並列実行する
+    """
+    from dify_creator.batch import load_cases, run_batch, write_results
+
+    cases = load_cases(args.cases)
+    if not cases:
+        raise DifyConsoleError(f"ケースがありません: {args.cases}")
+
+    client = _logged_in_client()
+    results, summary = run_batch(
+        client,
+        args.app_id,
+        cases,
+        concurrency=args.concurrency,
+        rate_per_s=args.rate,
+        retries=args.retries,
+        max_wait_s=args.max_wait_s,
+    )
+    if args.out:
+        write_results(args.out, results)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if summary["succeeded"] == summary["cases"] else 1
+
+
+def cmd_loadtest(args: argparse.Namespace) -> int:
+    """
+    同時実行数（または到着率）を段階的に上げながら draft run を流し、段ごとの TTFE・レイテンシ・
+    エラー率・スループットと飽和点 (knee) を表示する
+    """
+    from dify_creator.loadtest import build_steps, format_loadtest_table, format_step_row, run_loadtest, write_samples
+
+    steps = build_steps(
+        concurrency=args.concurrency,
+        rate=args.rate,
+        steps=args.steps,
+        step_s=args.step_s,
+        duration_s=args.duration_s,
+    )
+    if args.cases:
+        from dify_creator.batch import load_cases
+
+        inputs = [c.inputs for c in load_cases(args.cases)]
+        if not inputs:
+            raise DifyConsoleError(f"ケースがありません: {args.cases}")
+    else:
+        obj = read_json_file(args.inputs_json)
+        if not isinstance(obj, dict):
+            raise DifyConsoleError("--inputs-json は JSON object である必要があります")
+        inputs = [obj]
+
+    def progress(_: Any, stats: dict[str, Any]) -> None:
+        print("  ".join(format_step_row(stats)), file=sys.stderr, flush=True)
+
+    samples, report = run_loadtest(
+        args.app_id,
+        inputs,
+        steps,
+        email=_require_env("DIFY_EMAIL"),
+        password=_require_env("DIFY_PASSWORD"),
+        max_wait_s=args.max_wait_s,
+        max_inflight=args.max_inflight,
+        on_step=None if args.quiet else progress,
+    )
+    if args.requests_out:
+        write_samples(args.requests_out, samples)
+    if args.out:
+        write_json_file(args.out, report)
+    if args.format == "json":
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(format_loadtest_table(report))
+    return 0 if report["succeeded"] else 1
+
+
+def cmd_validate(args: argparse.Namespace) -> int:
+    """
+    Validate DSL YAML files: top-level fields and the workflow graph
+    (dangling edges, unreachable nodes, cycles, variable references).
+    Multiple files / directories / globs are checked in parallel in a process pool.
+    """
+    from dify_creator.validate_output import format_reports
+    from dify_creator.validator import expand_paths, validate_files
+
+    paths = expand_paths(list(args.paths) + list(args.dsl or []))
+    if not paths:
+        raise DifyConsoleError("検証する DSL ファイルを指定してください（パス / ディレクトリ / glob、または --dsl）")
+    reports = validate_files(paths, workers=args.workers)
+    text = format_reports(reports, args.format)
+    if args.out:
+        write_text_file(args.out, text)
+    else:
+        sys.stdout.write(text)
+    return 0 if all(r.ok for r in reports) else 1
+
+
+def cmd_optimize(args: argparse.Namespace) -> int:
+    """
+    DSL から Studio の表示状態などを除いて小さくし、減ったバイト数を表示する（サーバーへは送らない）。
+    書き出した YAML を読み直して正規化したグラフが変わらないことを確認してから書き込む。
+    --check は最適化で小さくなるファイルがあれば終了コード 1（CI 用）。
+    """
+    from dify_creator.dsl_optimize import format_optimize_table, optimize_file
+    from dify_creator.validator import expand_paths
+
+    paths = expand_paths(list(args.paths) + list(args.dsl or []))
+    if not paths:
+        raise DifyConsoleError("最適化する DSL ファイルを指定してください（パス / ディレクトリ / glob、または --dsl）")
+    if args.out and len(paths) != 1:
+        raise DifyConsoleError("--out はファイルを1つだけ指定したときに使えます（複数なら --in-place）")
+
+    rows: list[dict[str, Any]] = []
+    for path in paths:
+        row: dict[str, Any] = {"path": path}
+        try:
+            result = optimize_file(path)
+        except (DifyConsoleError, OSError) as e:
+            row["error"] = str(e)
+            rows.append(row)
+            continue
+        smaller = result.optimized_bytes < result.original_bytes
+        row.update(
+            original_bytes=result.original_bytes,
+            optimized_bytes=result.optimized_bytes if smaller else result.original_bytes,
+            removed_fields=result.removed_fields if smaller else 0,
+            aliased_strings=result.aliased_strings if smaller else 0,
+            changed=smaller,
+        )
+        if smaller and (args.in_place or args.out):
+            write_text_file(args.out or path, result.text)
+        elif args.out:
+            write_text_file(args.out, read_yaml_file(path))
+        rows.append(row)
+
+    if args.format == "json":
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
     else:
+        print(format_optimize_table(rows))
+    if any("error" in r for r in rows):
         return 1
+    return 1 if args.check and any(r["changed"] for r in rows) else 0
+
+
+def cmd_generate(args: argparse.Namespace) -> int:
+    """
+    テンプレート (DSL + template: params/fanout) から DSL を一括生成し、グラフを検証してから書き出す。
+    生成できた DSL は sync-all --manifest 用の manifest.json にも列挙する
+    （*.yml ではないので validate / sync-all --dir で out_dir を指定しても DSL として扱われない）。
+    """
+    from dify_creator.generate import Variant, generate, load_variants, parse_value, write_manifest
+
+    variants = load_variants(args.vars) if args.vars else [Variant(id="1", values={})]
+    for item in args.set or []:
+        key, sep, value = item.partition("=")
+        if not sep or not key:
+            raise DifyConsoleError(f"--set は KEY=VALUE の形式で指定してください: {item}")
+        for v in variants:
+            v.values[key] = parse_value(value)
+
+    out_dir = args.out_dir or "generated"
+    t0 = time.perf_counter()
+    results = generate(args.template, variants, out_dir, validate=not args.no_validate, workers=args.workers)
+    elapsed = time.perf_counter() - t0
+    manifest = args.manifest or os.path.join(out_dir, "manifest.json")
+    write_manifest(manifest, results)
+
+    failed = [r for r in results if not r.ok]
+    for r in failed:
+        for e in r.errors:
+            print(f"{r.id}: {e}", file=sys.stderr)
+    summary = {
+        "generated": len(results) - len(failed),
+        "failed": len(failed),
+        "warnings": sum(r.warnings for r in results),
+        "out_dir": out_dir,
+        "manifest": manifest,
+        "elapsed_s": round(elapsed, 3),
+    }
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 1 if failed else 0
 
 
 def cmd_sync(args: argparse.Namespace) -> int:
     """
     import (create/overwrite) -> (optional confirm) -> draft run -> write artifacts
     """
-    client = DifyConsoleClient.from_env()
-    client.login(email=_require_env("DIFY_EMAIL"), password_plain=_require_env("DIFY_PASSWORD"))
+    from dify_creator.dsl import inputs_hash, load_dsl_file
+    from dify_creator.run_cache import RunCache, run_cache_from_env
+    from dify_creator.sync import import_unless_unchanged, incremental_import, read_inputs, run_is_fresh, run_status
+    from dify_creator.sync_state import SyncState
+
+    client = _logged_in_client()
 
-    yaml_content = read_yaml_file(args.dsl)
-    import_result = client.import_app(
-        yaml_content=yaml_content,
+    doc = _optimized(load_dsl_file(args.dsl), args.optimize)
+    import_kwargs: dict[str, Any] = dict(
         app_id=args.app_id,
         name=args.name,
         description=args.description,
@@ -204,28 +495,293 @@ def cmd_sync(args: argparse.Namespace) -> int:
         icon=args.icon,
         icon_background=args.icon_background,
     )
-    if import_result.get("status") == "pending":
-        import_result = client.confirm_import(import_result["id"])
-
-    app_id = import_result.get("app_id") or args.app_id
-    if not app_id:
-        raise DifyConsoleError(f"import結果から app_id を取得できません: {import_result}")
-
-    inputs: dict[str, Any] = read_json_file(args.inputs_json)
-    if not isinstance(inputs, dict):
-        raise DifyConsoleError("--inputs-json は JSON object である必要があります")
+    state = SyncState(args.state_file) if args.incremental else None
+    import_skipped = False
+    if state is not None:
+        import_result, app_id, import_skipped = incremental_import(
+            client,
+            state,
+            doc=doc,
+            verify_remote=args.verify_remote,
+            diff_remote=args.diff_remote,
+            **import_kwargs,
+        )
+    else:
+        import_result, app_id, import_skipped = import_unless_unchanged(
+            client, doc=doc, diff_remote=args.diff_remote, **import_kwargs
+        )
 
-    run_result = client.run_draft_workflow_collect(app_id=app_id, inputs=inputs, max_wait_s=args.max_wait_s)
+    inputs = read_inputs(args.inputs_json)
 
     out_dir = args.out_dir or "artifacts"
     os.makedirs(out_dir, exist_ok=True)
+
+    if (
+        state is not None
+        and import_skipped
+        and not args.always_run
+        and run_is_fresh(state, client.config.base_url, app_id, inputs)
+    ):
+        # DSL も inputs も前回成功時と同じ: 前回の artifacts をそのまま使う
+        print(json.dumps({"app_id": app_id, "unchanged": True}, ensure_ascii=False, indent=2))
+        return 0
+
+    cache = run_cache_from_env(args.run_cache_dir, enabled=args.run_cache)
+    cache_key = RunCache.key(client.config.base_url, app_id, doc.hash, inputs_hash(inputs))
+    cached = cache.get(cache_key) if cache is not None and not args.refresh_run_cache else None
+    run_s: float | None = None
+    if cached is not None:
+        # 同じ DSL・inputs で成功した結果を再利用する（draft run を実行しない）。
+        # --incremental の状態と --history には実行した場合と同じように記録する（履歴の elapsed_s は空）
+        run_result = cached["run_result"]
+    else:
+        t0 = time.perf_counter()
+        run_result = client.run_draft_workflow_collect(app_id=app_id, inputs=inputs, max_wait_s=args.max_wait_s)
+        run_s = time.perf_counter() - t0
+        if cache is not None and run_status(run_result) == "succeeded":
+            cache.put(cache_key, run_result)
+    if state is not None:
+        state.record_run(
+            SyncState.key(client.config.base_url, app_id),
+            inputs_hash=inputs_hash(inputs),
+            status=run_status(run_result),
+        )
+        state.save()
+
     write_json_file(os.path.join(out_dir, "import_result.json"), import_result)
     write_json_file(os.path.join(out_dir, "run_result.json"), run_result)
 
-    print(json.dumps({"app_id": app_id, "import": import_result, "run": run_result}, ensure_ascii=False, indent=2))
+    out: dict[str, Any] = {"app_id": app_id, "import": import_result, "run": run_result}
+    if cached is not None:
+        out["cached_at"] = cached["cached_at"]
+    if args.history:
+        from dify_creator.run_store import RunStore
+
+        history = RunStore.from_env(args.history_dir)
+        out["run_id"] = history.record(
+            app_id=app_id,
+            run_result=run_result,
+            status=run_status(run_result),
+            elapsed_s=run_s,
+            dsl_hash=doc.hash,
+            dsl_text=doc.text,
+            inputs_hash=inputs_hash(inputs),
+            import_result=import_result,
+        )["run_id"]
+        history.apply_retention()
+
+    print(json.dumps(out, ensure_ascii=False, indent=2))
+    return 0
+
+
+def cmd_sync_all(args: argparse.Namespace) -> int:
+    """
+    複数DSLを1セッションで並列に sync する（manifest またはディレクトリ指定）
+    """
+    from dify_creator.dsl_optimize import optimize_from_env
+    from dify_creator.run_store import RunStore
+    from dify_creator.sync import discover_entries, format_summary_table, load_manifest, sync_all
+    from dify_creator.sync_state import SyncState
+
+    if args.manifest:
+        entries = load_manifest(args.manifest)
+    else:
+        entries = discover_entries(args.dir, default_inputs_json=args.inputs_json)
+    if not entries:
+        raise DifyConsoleError("sync 対象の DSL が見つかりません")
+
+    client = _logged_in_client()
+    summary = sync_all(
+        client,
+        entries,
+        workers=args.workers,
+        max_wait_s=args.max_wait_s,
+        out_dir=args.out_dir or "artifacts",
+        state=SyncState(args.state_file) if args.incremental else None,
+        always_run=args.always_run,
+        verify_remote=args.verify_remote,
+        diff_remote=args.diff_remote,
+        history=RunStore.from_env(args.history_dir) if args.history else None,
+        optimize=optimize_from_env(args.optimize),
+    )
+    print(format_summary_table(summary))
+    return 0 if summary["failed"] == 0 else 1
+
+
+def cmd_promote(args: argparse.Namespace) -> int:
+    """
+    ソース環境から1回だけ export し、複数の環境（リージョン / ワークスペース）へ並列に import する。
+    環境ごとに別のセッションを使い、環境ごとの所要時間と失敗を報告する。
+    """
+    from dify_creator.dsl import DslDocument, load_dsl_file
+    from dify_creator.environments import EnvironmentsConfig
+    from dify_creator.promote import PromoteTarget, format_promote_table, promote, promote_summary
+
+    cfg = EnvironmentsConfig.load(args.config)
+
+    names = cfg.expand(args.to)
+    if args.source_env in names:
+        raise DifyConsoleError(f"ソース環境 '{args.source_env}' が --to に含まれています")
+    targets: list[PromoteTarget] = []
+    missing: list[str] = []
+    for name in names:
+        app_id = cfg.app_id(args.app, name) if args.app else None
+        if app_id is None and not args.create_missing:
+            missing.append(name)
+        targets.append(PromoteTarget(env=cfg.environment(name), app_id=app_id))
+    if missing:
+        raise DifyConsoleError(
+            f"app_id が定義されていない環境があります: {', '.join(missing)}（apps に追加するか --create-missing）"
+        )
+
+    # ソース: ローカルの DSL、または環境から1回だけ export
+    t0 = time.perf_counter()
+    if args.dsl:
+        doc = load_dsl_file(args.dsl)
+        source: dict[str, Any] = {"dsl": args.dsl}
+    else:
+        src_app_id = args.app_id or (cfg.app_id(args.app, args.source_env) if args.app else None)
+        if not src_app_id:
+            raise DifyConsoleError(f"ソース環境 '{args.source_env}' の app_id がありません（--app-id または apps）")
+        client = cfg.environment(args.source_env).logged_in_client()
+        doc = DslDocument.from_text(client.export_app(app_id=src_app_id, include_secret=args.include_secret))
+        source = {"env": args.source_env, "app_id": src_app_id}
+    source["dsl_hash"] = doc.hash
+    doc = _optimized(doc, args.optimize)
+    export_s = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    results = promote(doc, targets, diff_remote=args.diff_remote, workers=args.workers)
+    summary = promote_summary(results, source=source, export_s=export_s, wall_s=time.perf_counter() - t1)
+    if args.out:
+        write_json_file(args.out, summary)
+    if args.format == "json":
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print(format_promote_table(summary))
+    return 0 if summary["failed"] == 0 else 1
+
+
+def cmd_watch(args: argparse.Namespace) -> int:
+    """
+    DSL の保存を監視し、変更されたアプリだけ import -> confirm -> draft run を繰り返す
+    """
+    from dify_creator.sync import SyncEntry, discover_entries, load_manifest
+    from dify_creator.watch import Watcher
+
+    if args.manifest:
+        entries = load_manifest(args.manifest)
+    elif args.dir:
+        entries = discover_entries(args.dir, default_inputs_json=args.inputs_json)
+    else:
+        entries = [SyncEntry(dsl=args.dsl, app_id=args.app_id, inputs_json=args.inputs_json, name=args.name)]
+    if not entries:
+        raise DifyConsoleError("監視対象の DSL が見つかりません")
+
+    client = _logged_in_client()
+    watcher = Watcher(client, entries, max_wait_s=args.max_wait_s)
+    try:
+        watcher.run(poll=args.poll, debounce_s=args.debounce_s, initial=args.initial)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_runs(args: argparse.Namespace) -> int:
+    """
+    sync --history で保存した draft run の履歴を index から検索・表示・削除する（ネットワークは使わない）
+    """
+    from dify_creator.run_store import RunStore, format_runs_table
+
+    store = RunStore(args.history_dir)
+    if args.runs_cmd == "list":
+        since = time.time() - args.since_days * 86400 if args.since_days is not None else None
+        entries = store.query(app_id=args.app_id, status=args.status, dsl_hash=args.dsl_hash, since=since, limit=args.limit)
+        if args.format == "json":
+            print(json.dumps(entries, ensure_ascii=False, indent=2))
+        else:
+            print(format_runs_table(entries))
+        return 0
+    if args.runs_cmd == "show":
+        try:
+            for obj in store.iter_lines(args.run_id):
+                sys.stdout.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        except KeyError:
+            raise DifyConsoleError(f"run が見つかりません: {args.run_id}")
+        return 0
+    if args.runs_cmd == "dsl":
+        entry = store.get(args.run_id)
+        text = store.load_dsl(entry["dsl_hash"]) if entry and entry.get("dsl_hash") else None
+        if text is None:
+            raise DifyConsoleError(f"run の DSL が見つかりません: {args.run_id}")
+        sys.stdout.write(text)
+        return 0
+    removed = store.prune(keep=args.keep, max_age_days=args.max_age_days)
+    print(json.dumps({"removed": len(removed), "remaining": len(store.entries())}, ensure_ascii=False))
     return 0
 
 
+def _add_history_args(s: argparse.ArgumentParser) -> None:
+    s.add_argument(
+        "--history",
+        action="store_true",
+        help="Also record each draft run (compressed events + index) in the run history store",
+    )
+    s.add_argument("--history-dir", help="Run history dir (default: $DIFY_RUN_STORE or .dify-creator/runs)")
+
+
+def _add_run_cache_args(s: argparse.ArgumentParser) -> None:
+    g = s.add_mutually_exclusive_group()
+    g.add_argument(
+        "--run-cache",
+        dest="run_cache",
+        action="store_const",
+        const=True,
+        help="Reuse the last successful draft run result for the same app, normalised DSL and inputs "
+        "(default: on when $DIFY_RUN_CACHE is set)",
+    )
+    g.add_argument(
+        "--no-run-cache", dest="run_cache", action="store_const", const=False, help="Disable the run result cache"
+    )
+    s.add_argument(
+        "--refresh-run-cache",
+        action="store_true",
+        help="Ignore any cached result, run the draft workflow and store the new result",
+    )
+    s.add_argument("--run-cache-dir", help="Run result cache dir (default: $DIFY_RUN_CACHE or .dify-creator/run_cache)")
+
+
+def _add_optimize_args(s: argparse.ArgumentParser) -> None:
+    g = s.add_mutually_exclusive_group()
+    g.add_argument(
+        "--optimize",
+        dest="optimize",
+        action="store_const",
+        const=True,
+        help="Upload a minified DSL (Studio UI state stripped, repeated long strings aliased; see optimize) "
+        "(default: on when $DIFY_OPTIMIZE_DSL=1)",
+    )
+    g.add_argument("--no-optimize", dest="optimize", action="store_const", const=False, help="Upload the DSL file as is")
+
+
+def _add_incremental_args(s: argparse.ArgumentParser, *, run: bool = True) -> None:
+    s.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip import when the normalised DSL hash is unchanged since the last import"
+        + (" (and skip the draft run if inputs are also unchanged and it succeeded)" if run else ""),
+    )
+    s.add_argument("--verify-remote", action="store_true", help="With --incremental, also compare a hash of export_app")
+    s.add_argument("--state-file", help="Sync state file (default: $DIFY_SYNC_STATE or .dify-creator/sync_state.json)")
+    s.add_argument(
+        "--diff-remote",
+        action="store_true",
+        help="Export the deployed app first and skip the import when there is no structural difference (see diff)",
+    )
+    if run:
+        s.add_argument("--always-run", action="store_true", help="With --incremental, run the draft workflow even if unchanged")
+
+
 def build_parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(prog="dify-creator", description="Dify Console API automation (import/overwrite/test)")
     sub = p.add_subparsers(dest="cmd", required=True)
@@ -243,8 +799,18 @@ def build_parser() -> argparse.ArgumentParser:
     s.add_argument("--icon")
     s.add_argument("--icon-background")
     s.add_argument("--out", help="Write result json")
+    _add_incremental_args(s, run=False)
+    _add_optimize_args(s)
     s.set_defaults(func=cmd_import)
 
+    s = sub.add_parser("diff", help="ローカルの DSL とデプロイ済みアプリの構造的な差分（ノード・エッジ・プロンプト・モデル・変数）")
+    s.add_argument("--dsl", required=True, help="Local DSL YAML file path")
+    s.add_argument("--app-id", required=True, help="Deployed app to compare against")
+    s.add_argument("--include-secret", action="store_true", help="Export secret environment variables for comparison")
+    s.add_argument("--format", choices=["text", "json"], default="text")
+    s.add_argument("--out", help="Write the diff to a file instead of stdout")
+    s.set_defaults(func=cmd_diff)
+
     s = sub.add_parser("export", help="アプリをDSLとしてエクスポート")
     s.add_argument("--app-id", required=True)
     s.add_argument("--include-secret", action="store_true")
@@ -252,19 +818,98 @@ def build_parser() -> argparse.ArgumentParser:
     s.add_argument("--out", help="Write DSL to file (optional)")
     s.set_defaults(func=cmd_export)
 
+    s = sub.add_parser("export-all", help="ワークスペースの全アプリを DSL としてディレクトリに書き出す（バックアップ）")
+    s.add_argument("--out-dir", required=True, help="出力先（<mode>/<name>__<app_id>.yml と index.json）")
+    s.add_argument("--workers", type=int, default=8, help="並列 export 数（既定: 8）")
+    s.add_argument("--include-secret", action="store_true")
+    s.add_argument("--page-size", type=int, default=100, help="アプリ一覧の1ページの件数（既定: 100）")
+    s.add_argument("--prune", action="store_true", help="一覧に存在しないアプリの DSL ファイルを削除する")
+    s.set_defaults(func=cmd_export_all)
+
     s = sub.add_parser("run", help="Workflowアプリの draft workflow を実行（テスト）")
     s.add_argument("--app-id", required=True)
     g = s.add_mutually_exclusive_group(required=True)
     g.add_argument("--inputs-json", help="Inputs JSON file (object)")
     g.add_argument("--inputs-inline", help='Inputs JSON string (e.g. \'{"foo":"bar"}\')')
-    s.add_argument("--max-wait-s", type=float)
-    s.add_argument("--out", help="Write result json")
+    s.add_argument("--max-wait-s", type=float, help="Wall-clock limit for the draft run; stops the run on the server")
+    s.add_argument("--out", help="Write result json (NDJSON events with --stream)")
+    s.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write events as NDJSON while they arrive (to --out or stdout) and print only a summary",
+    )
+    s.add_argument("--events", help="Comma-separated event types to keep (e.g. node_finished,workflow_finished)")
+    s.add_argument("--no-stop", action="store_true", help="Do not stop the workflow on the server after --max-wait-s")
     s.set_defaults(func=cmd_run)
 
+    s = sub.add_parser("profile", help="draft run をノード単位でプロファイル（時間・トークン・クリティカルパス・トレース）")
+    s.add_argument("--app-id", help="Run the draft workflow of this app and profile it")
+    g = s.add_mutually_exclusive_group()
+    g.add_argument("--inputs-json", help="Inputs JSON file (object)")
+    g.add_argument("--inputs-inline", help='Inputs JSON string (e.g. \'{"foo":"bar"}\')')
+    g.add_argument("--events-file", help="Profile saved events instead (run --stream NDJSON or run --out JSON)")
+    s.add_argument("--max-wait-s", type=float, help="Wall-clock limit for the draft run; stops the run on the server")
+    s.add_argument("--trace-out", help="Chrome trace JSON (chrome://tracing, Perfetto, speedscope); *.folded for collapsed stacks")
+    s.add_argument("--out", help="Write the profile summary JSON")
+    s.set_defaults(func=cmd_profile)
+
+    s = sub.add_parser("batch", help="JSONL/CSV の入力ケースを draft workflow に一括実行（回帰テスト）")
+    s.add_argument("--app-id", required=True)
+    s.add_argument("--cases", required=True, help="Cases file (.jsonl or .csv)")
+    s.add_argument("--concurrency", type=int, default=4)
+    s.add_argument("--rate", type=float, help="Max case starts per second")
+    s.add_argument("--retries", type=int, default=1, help="Retries on transport/HTTP errors (default: 1)")
+    s.add_argument("--max-wait-s", type=float, help="Wall-clock limit per case")
+    s.add_argument("--out", help="Per-case results (.jsonl or .csv)")
+    s.set_defaults(func=cmd_batch)
+
+    s = sub.add_parser("loadtest", help="同時実行数を段階的に上げて draft run の負荷試験（段ごとの TTFE・レイテンシ・飽和点）")
+    s.add_argument("--app-id", required=True)
+    g = s.add_mutually_exclusive_group(required=True)
+    g.add_argument("--inputs-json", help="Inputs JSON file (object) used for every run")
+    g.add_argument("--cases", help="Cases file (.jsonl or .csv); runs cycle through the cases")
+    g = s.add_mutually_exclusive_group(required=True)
+    g.add_argument("--concurrency", help="Concurrent runs per step: N, N1,N2,..., or START:END (doubling by default)")
+    g.add_argument("--rate", help="Run starts per second per step (open loop): R, R1,R2,..., or START:END")
+    s.add_argument("--steps", type=int, help="Number of steps for START:END (geometric)")
+    s.add_argument("--step-s", type=float, help="Seconds per step (default: 30, or --duration-s / steps)")
+    s.add_argument("--duration-s", type=float, help="Total ramp duration, split evenly across steps")
+    s.add_argument("--max-wait-s", type=float, help="Count a run as timeout after this many seconds")
+    s.add_argument("--max-inflight", type=int, default=1000, help="Cap on in-flight runs for --rate (default: 1000)")
+    s.add_argument("--format", choices=["text", "json"], default="text", help="Output format (default: text)")
+    s.add_argument("--out", help="Also write the JSON report to this file")
+    s.add_argument("--requests-out", help="Per-run samples (.jsonl)")
+    s.add_argument("--quiet", action="store_true", help="Do not print per-step progress to stderr")
+    s.set_defaults(func=cmd_loadtest)
+
     s = sub.add_parser("validate", help="DSL YAML を検証（Difyにアップロードせずにチェック）")
-    s.add_argument("--dsl", required=True, help="DSL YAML file path")
+    s.add_argument("paths", nargs="*", help="DSL YAML ファイル / ディレクトリ（*.yml, *.yaml を再帰的に）/ glob")
+    s.add_argument("--dsl", action="append", help="DSL YAML file path（複数指定可。paths と併用可）")
+    s.add_argument("--format", choices=OUTPUT_FORMATS, default="text", help="出力形式（既定: text）")
+    s.add_argument("--out", default=None, help="結果の出力先ファイル（既定: 標準出力）")
+    s.add_argument("--workers", type=int, default=None, help="並列プロセス数（既定: CPU 数）")
     s.set_defaults(func=cmd_validate)
 
+    s = sub.add_parser("optimize", help="DSL を小さくする（表示状態の除去・重複文字列のエイリアス化）。減ったバイト数を表示")
+    s.add_argument("paths", nargs="*", help="DSL files, directories (recursive *.yml/*.yaml) or glob patterns")
+    s.add_argument("--dsl", action="append", help="DSL YAML file path (repeatable)")
+    g = s.add_mutually_exclusive_group()
+    g.add_argument("--in-place", action="store_true", help="Rewrite each file that gets smaller")
+    g.add_argument("--out", help="Write the optimized DSL here (single file only)")
+    s.add_argument("--check", action="store_true", help="Exit 1 if any file would get smaller (CI)")
+    s.add_argument("--format", choices=["text", "json"], default="text", help="Output format (default: text)")
+    s.set_defaults(func=cmd_optimize)
+
+    s = sub.add_parser("generate", help="テンプレートから DSL を一括生成（パラメータ・ノードの複製、書き出し前に検証）")
+    s.add_argument("--template", required=True, help="Template DSL YAML (with a top-level 'template: {params, fanout}')")
+    s.add_argument("--vars", help="Variants file (.yml/.json list, .jsonl or .csv); one DSL per variant")
+    s.add_argument("--set", action="append", metavar="KEY=VALUE", help="Set a parameter for every variant (JSON or string)")
+    s.add_argument("--out-dir", help="Output dir (default: generated)")
+    s.add_argument("--manifest", help="Manifest for sync-all --manifest (default: <out-dir>/manifest.json)")
+    s.add_argument("--no-validate", action="store_true", help="Write variants without the graph checks")
+    s.add_argument("--workers", type=int, default=None, help="並列プロセス数（既定: CPU 数）")
+    s.set_defaults(func=cmd_generate)
+
     s = sub.add_parser("sync", help="import -> (confirm) -> draft run を1コマンドで")
     s.add_argument("--dsl", required=True, help="DSL YAML file path")
     s.add_argument("--app-id", help="Overwrite target app_id (optional)")
@@ -274,17 +919,89 @@ def build_parser() -> argparse.ArgumentParser:
     s.add_argument("--icon")
     s.add_argument("--icon-background")
     s.add_argument("--inputs-json", required=True, help="Inputs JSON file (object)")
-    s.add_argument("--max-wait-s", type=float)
+    s.add_argument("--max-wait-s", type=float, help="Wall-clock limit for the draft run; stops the run on the server")
     s.add_argument("--out-dir", help="Artifacts dir (default: artifacts)")
+    _add_incremental_args(s)
+    _add_history_args(s)
+    _add_run_cache_args(s)
+    _add_optimize_args(s)
     s.set_defaults(func=cmd_sync)
 
+    s = sub.add_parser("sync-all", help="複数DSLを並列に sync（manifest またはディレクトリ）")
+    g = s.add_mutually_exclusive_group(required=True)
+    g.add_argument("--manifest", help="Manifest YAML/JSON (apps: [{dsl, app_id, inputs_json}])")
+    g.add_argument("--dir", help="Directory of DSL files (*.yml, *.yaml); <name>.inputs.json is used if present")
+    s.add_argument("--inputs-json", help="Default inputs JSON for --dir (omit to import only)")
+    s.add_argument("--workers", type=int, default=4, help="Concurrent apps (default: 4)")
+    s.add_argument("--max-wait-s", type=float, help="Wall-clock limit for the draft run; stops the run on the server")
+    s.add_argument("--out-dir", help="Artifacts dir (default: artifacts)")
+    _add_incremental_args(s)
+    _add_history_args(s)
+    _add_optimize_args(s)
+    s.set_defaults(func=cmd_sync_all)
+
+    s = sub.add_parser("promote", help="1つの環境から export し、複数の環境へ並列に import（リージョン展開）")
+    s.add_argument("--config", help="Environments file (default: $DIFY_ENVIRONMENTS or environments.yml)")
+    g = s.add_mutually_exclusive_group(required=True)
+    g.add_argument("--from", dest="source_env", help="Source environment to export from")
+    g.add_argument("--dsl", help="Promote a local DSL file instead of exporting")
+    s.add_argument("--to", action="append", required=True, help="Target environments or groups (repeatable, comma-separated)")
+    s.add_argument("--app", help="Logical app name in the environments file (maps to each environment's app_id)")
+    s.add_argument("--app-id", help="Source app_id (overrides the mapping for --from)")
+    s.add_argument("--include-secret", action="store_true", help="Export secret environment variables from the source")
+    s.add_argument("--create-missing", action="store_true", help="Create the app in targets without an app_id mapping")
+    s.add_argument(
+        "--diff-remote",
+        action="store_true",
+        help="Skip targets whose deployed app has no structural difference (see diff)",
+    )
+    s.add_argument("--workers", type=int, default=None, help="Concurrent targets (default: all targets at once)")
+    s.add_argument("--format", choices=["text", "json"], default="text", help="Output format (default: text)")
+    s.add_argument("--out", help="Also write the JSON summary to this file")
+    _add_optimize_args(s)
+    s.set_defaults(func=cmd_promote)
+
+    s = sub.add_parser("watch", help="DSL の保存を監視して import -> draft run を自動で繰り返す（開発ループ用）")
+    g = s.add_mutually_exclusive_group(required=True)
+    g.add_argument("--dsl", help="DSL YAML file path")
+    g.add_argument("--manifest", help="Manifest YAML/JSON (apps: [{dsl, app_id, inputs_json}])")
+    g.add_argument("--dir", help="Directory of DSL files (*.yml, *.yaml); <name>.inputs.json is used if present")
+    s.add_argument("--app-id", help="With --dsl: overwrite target app_id (omit to create once, then overwrite it)")
+    s.add_argument("--name", help="With --dsl: app name when creating")
+    s.add_argument("--inputs-json", help="Inputs JSON file (omit to import only); default for --dir")
+    s.add_argument("--max-wait-s", type=float, help="Wall-clock limit for the draft run; stops the run on the server")
+    s.add_argument("--debounce-s", type=float, default=0.3, help="Wait until saves settle (default: 0.3)")
+    s.add_argument("--poll", action="store_true", help="Use mtime polling instead of inotify (e.g. Docker on macOS)")
+    s.add_argument("--initial", action="store_true", help="Sync every app once at startup")
+    s.set_defaults(func=cmd_watch)
+
+    s = sub.add_parser("runs", help="保存した draft run の履歴を検索・表示・削除（sync --history で記録）")
+    s.add_argument("--history-dir", help="Run history dir (default: $DIFY_RUN_STORE or .dify-creator/runs)")
+    runs = s.add_subparsers(dest="runs_cmd", required=True)
+    r = runs.add_parser("list", help="List runs from the index (newest first)")
+    r.add_argument("--app-id")
+    r.add_argument("--status", help="e.g. succeeded, failed, timeout")
+    r.add_argument("--dsl-hash")
+    r.add_argument("--since-days", type=float, help="Only runs from the last N days")
+    r.add_argument("--limit", type=int, default=50, help="Max runs (default: 50)")
+    r.add_argument("--format", choices=["text", "json"], default="text")
+    r = runs.add_parser("show", help="Print a run (header line + events) as NDJSON")
+    r.add_argument("run_id")
+    r = runs.add_parser("dsl", help="Print the DSL a run was executed with")
+    r.add_argument("run_id")
+    r = runs.add_parser("prune", help="Delete old runs")
+    r.add_argument("--keep", type=int, help="Runs to keep per app (newest)")
+    r.add_argument("--max-age-days", type=float, help="Delete runs older than this")
+    s.set_defaults(func=cmd_runs)
+
     return p
 
 
 def main(argv: list[str] | None = None) -> int:
-    load_dotenv_if_present()
     parser = build_parser()
     args = parser.parse_args(argv)
+    # オフラインのコマンド（runs や --history の保持期間）も .env の設定を使うので、ここで読み込む
+    load_dotenv_if_present()
     try:
         return args.func(args)
     except DifyConsoleError as e:
@@ -293,5 +1010,3 @@ def main(argv: list[str] | None = None) -> int:
 
 
 __all__ = ["main"]
-
-
@@ -3,16 +3,38 @@ from __future__ import annotations
 import base64
 import json
 import os
+import queue
+import socket
+import threading
 import time
+import uuid
 from dataclasses import dataclass
-from typing import Any, Iterable, Iterator
+from typing import Any, Callable, Iterator
 
 import requests
+import urllib3
 import yaml
-
-
-class DifyConsoleError(RuntimeError):
-    pass
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from dify_creator import yaml_io
+from dify_creator.cassette import Cassette, cassette_from_env
+from dify_creator.errors import DifyConsoleError
+from dify_creator.file_io import load_dotenv_if_present  # noqa: F401  CLI 以外からの互換のため
+from dify_creator.instrumentation import (
+    Instrumentation,
+    RequestRecord,
+    StreamTracker,
+    endpoint_template,
+    instrumentation_from_env,
+)
+from dify_creator.resilience import (
+    NOT_PROCESSED_STATUSES,
+    RETRYABLE_STATUSES,
+    CircuitBreaker,
+    RequestMetrics,
+    RetryPolicy,
+)
+from dify_creator.session_cache import SessionCache, is_session_cookie
 
 
 def _env_bool(name: str, default: bool) -> bool:
@@ -30,11 +52,320 @@ def _join_url(base: str, path: str) -> str:
     return base.rstrip("/") + "/" + path.lstrip("/")
 
 
+# 以下は同期クライアントと AsyncDifyConsoleClient で共有するリクエスト組み立て/レスポンス解析処理
+
+_SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def build_request_headers(method: str, csrf: str | None, extra_headers: dict[str, str] | None) -> dict[str, str]:
+    headers: dict[str, str] = {}
+    if extra_headers:
+        headers.update(extra_headers)
+    # 安全でないメソッド用の CSRF
+    if method.upper() not in _SAFE_METHODS and csrf:
+        headers.setdefault("X-CSRF-Token", csrf)
+    return headers
+
+
+def build_import_payload(
+    *,
+    yaml_content: str | None,
+    yaml_url: str | None,
+    app_id: str | None,
+    name: str | None,
+    description: str | None,
+    icon_type: str | None,
+    icon: str | None,
+    icon_background: str | None,
+    validate_yaml: bool = True,
+) -> dict[str, Any]:
+    # OSS は mode を {"yaml-content","yaml-url"} のいずれかで期待
+    if yaml_content and yaml_url:
+        raise ValueError("yaml_content と yaml_url は同時指定できません")
+    if not yaml_content and not yaml_url:
+        raise ValueError("yaml_content か yaml_url のどちらかが必要です")
+
+    # yaml_contentが指定されている場合、YAML形式の検証を行う（パース済みの DSL なら省略できる）
+    if yaml_content and validate_yaml:
+        try:
+            yaml_io.safe_load(yaml_content)
+        except yaml.YAMLError as e:
+            raise DifyConsoleError(f"無効なYAML形式です: {e}")
+
+    mode = "yaml-content" if yaml_content else "yaml-url"
+    payload: dict[str, Any] = {
+        "mode": mode,
+        "yaml_content": yaml_content,
+        "yaml_url": yaml_url,
+        "name": name,
+        "description": description,
+        "icon_type": icon_type,
+        "icon": icon,
+        "icon_background": icon_background,
+        "app_id": app_id,
+    }
+    # None のキーを削除
+    return {k: v for k, v in payload.items() if v is not None}
+
+
+def build_draft_run_request(
+    inputs: dict[str, Any],
+    files: list[dict[str, Any]] | None,
+    external_trace_id: str | None,
+) -> tuple[dict[str, Any], dict[str, str]]:
+    payload: dict[str, Any] = {"inputs": inputs}
+    if files is not None:
+        payload["files"] = files
+    headers: dict[str, str] = {}
+    if external_trace_id:
+        # Dify は外部トレースID の伝播をサポート
+        headers["X-External-Trace-Id"] = external_trace_id
+    return payload, headers
+
+
+def decode_export_response(data: Any) -> str:
+    if not isinstance(data, dict) or "data" not in data:
+        raise DifyConsoleError(f"exportレスポンスが想定外です: {data}")
+
+    export_data = data["data"]
+    # レスポンスがdictの場合はYAMLに変換
+    if isinstance(export_data, dict):
+        return yaml_io.safe_dump(export_data)
+    elif isinstance(export_data, str):
+        return export_data
+    else:
+        raise DifyConsoleError(f"export dataの型が想定外です: {type(export_data)}")
+
+
+class SSEDecoder:
+    """
+    helper.compact_generate_response() から発行される SSE 風のストリームを、受信チャンク (bytes)
+    単位で 'data:' のペイロード (bytes) に分解するインクリメンタルデコーダ。
+
+    行ごとの str デコード・strip を避け、改行を含まないチャンクは結合を遅延させるので、
+    大きなイベントが細切れに届いても二乗時間にならない。"data: [DONE]" で done になる。
+    """
+
+    __slots__ = ("_pending", "done")
+
+    def __init__(self) -> None:
+        self._pending: list[bytes] = []
+        self.done = False
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        if self.done or not chunk:
+            return []
+        if b"\n" not in chunk:
+            self._pending.append(chunk)
+            return []
+        if self._pending:
+            self._pending.append(chunk)
+            chunk = b"".join(self._pending)
+            self._pending = []
+
+        out: list[bytes] = []
+        start = 0
+        while True:
+            nl = chunk.find(b"\n", start)
+            if nl < 0:
+                break
+            payload = _sse_payload(chunk[start:nl])
+            start = nl + 1
+            if payload is None:
+                continue
+            if payload == b"[DONE]":
+                self.done = True
+                return out
+            out.append(payload)
+        if start < len(chunk):
+            self._pending.append(chunk[start:])
+        return out
+
+    def flush(self) -> list[bytes]:
+        """ストリーム終端で改行なしに残った最後の行を処理する"""
+        rest = b"".join(self._pending)
+        self._pending = []
+        if self.done:
+            return []
+        payload = _sse_payload(rest)
+        if payload is None or payload == b"[DONE]":
+            return []
+        return [payload]
+
+
+def _sse_payload(line: bytes) -> bytes | None:
+    if not line.startswith(b"data:"):
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            return None
+    payload = line[5:].strip()
+    return payload or None
+
+
+def decode_sse_json(payload: bytes) -> dict[str, Any] | None:
+    try:
+        ev = json.loads(payload)
+    except ValueError:
+        # 一部のイベントは非JSONデータを送信する可能性があるため無視
+        return None
+    return ev if isinstance(ev, dict) else None
+
+
+def iter_response_chunks(resp: requests.Response) -> Iterator[bytes]:
+    """
+    ストリーミングレスポンスを「届いた分だけ」読む。
+    urllib3 の read1 があればそれを使い（Content-Length/chunked どちらでもブロックしない）、
+    なければ iter_content(chunk_size=None) にフォールバックする。
+    requests は decode_content=False でレスポンスを開くので、gzip などはここで展開する。
+    読み取り中の urllib3 の例外（タイムアウト・切断など）は DifyConsoleError にする。
+    """
+    read1 = getattr(resp.raw, "read1", None)
+    if read1 is None:
+        yield from resp.iter_content(chunk_size=None)
+        return
+    while True:
+        try:
+            chunk = read1(65536, decode_content=True)
+        except urllib3.exceptions.HTTPError as e:
+            raise DifyConsoleError(f"ストリームの読み取りに失敗しました: {type(e).__name__}: {e}") from e
+        if not chunk:
+            return
+        yield chunk
+
+
+def is_auth_error_retryable(status_code: int, path: str) -> bool:
+    """401 かつログイン/refresh 以外のパスなら、refresh/再ログイン後に1回だけ再送する"""
+    return status_code == 401 and path not in {"/login", "/refresh-token"}
+
+
+class DeadlineStream:
+    """
+    SSE ストリームを別スレッドで読み、呼び出し側は壁時計の期限 (time.monotonic 基準) まで待つ。
+
+    イベントが1件も来ない（ハングした）ワークフローでも期限で確実に抜けられる。
+    期限切れ後は timed_out が True になり、ソケットを shutdown して読み取りスレッドを終わらせる。
+    deadline=None の場合はスレッドを使わずそのまま読む。
+    """
+
+    _END = object()
+
+    def __init__(
+        self,
+        open_stream: Callable[[], requests.Response],
+        iter_payloads: Callable[[requests.Response], Iterator[bytes]],
+        deadline: float | None,
+    ):
+        self._open_stream = open_stream
+        self._iter_payloads = iter_payloads
+        self.deadline = deadline
+        self.timed_out = False
+        self._resp: requests.Response | None = None
+        self._closed = threading.Event()
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self.deadline is None:
+            self._resp = self._open_stream()
+            yield from self._iter_payloads(self._resp)
+            return
+
+        # 読み取り側が先行しすぎないよう有界キューで背圧をかける
+        q: queue.Queue[Any] = queue.Queue(maxsize=1024)
+        t = threading.Thread(target=self._reader, args=(q,), daemon=True)
+        t.start()
+        try:
+            while True:
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timed_out = True
+                    return
+                try:
+                    item = q.get(timeout=remaining)
+                except queue.Empty:
+                    self.timed_out = True
+                    return
+                if item is self._END:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            self._closed.set()
+            # 読み取り中のレスポンスを別スレッドから close() するとバッファのロック待ちで
+            # ブロックするため、ソケットを shutdown して読み取りスレッド側で閉じさせる
+            if self._resp is not None:
+                _shutdown_response_socket(self._resp)
+
+    def _reader(self, q: "queue.Queue[Any]") -> None:
+        def put(item: Any) -> bool:
+            while not self._closed.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            self._resp = self._open_stream()
+            if self._closed.is_set():
+                self._resp.close()
+                return
+            for payload in self._iter_payloads(self._resp):
+                if not put(payload):
+                    return
+            put(self._END)
+        except BaseException as e:  # 呼び出し側のスレッドで再送出する
+            if not self._closed.is_set():
+                put(e)
+
+
+def _shutdown_response_socket(resp: requests.Response) -> None:
+    conn = getattr(resp.raw, "_connection", None)
+    sock = getattr(conn, "sock", None)
+    if sock is None:
+        # urllib3 がコネクションを手放した後は http.client 側から辿る
+        fp = getattr(getattr(resp.raw, "_fp", None), "fp", None)
+        sock = getattr(getattr(fp, "raw", None), "_sock", None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
 @dataclass(frozen=True)
 class ConsoleConfig:
     base_url: str
     verify_ssl: bool = True
     timeout_s: float = 60.0
+    # 同一ホストへのコネクションプールの上限（並列実行時は set_pool_size で拡張される）
+    pool_maxsize: int = 10
+    retry: RetryPolicy = RetryPolicy()
+    # 連続失敗でリクエストを止めるサーキットブレーカー（0 で無効）
+    breaker_failures: int = 5
+    breaker_reset_s: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "ConsoleConfig":
+        """
+        DIFY_BASE_URL / DIFY_VERIFY_SSL / DIFY_TIMEOUT_S に加えて以下を読む:
+        DIFY_POOL_MAXSIZE, DIFY_MAX_RETRIES, DIFY_BACKOFF_BASE_S, DIFY_BACKOFF_MAX_S,
+        DIFY_CB_FAILURES, DIFY_CB_RESET_S
+        """
+        base_url = os.getenv("DIFY_BASE_URL", "").strip()
+        if not base_url:
+            raise DifyConsoleError("DIFY_BASE_URL が未設定です")
+        breaker = CircuitBreaker.from_env()
+        return cls(
+            base_url=base_url,
+            verify_ssl=_env_bool("DIFY_VERIFY_SSL", True),
+            timeout_s=float(os.getenv("DIFY_TIMEOUT_S", "60")),
+            pool_maxsize=int(os.getenv("DIFY_POOL_MAXSIZE", "").strip() or 10),
+            retry=RetryPolicy.from_env(),
+            breaker_failures=breaker.failure_threshold,
+            breaker_reset_s=breaker.reset_timeout_s,
+        )
 
     @property
     def api_base(self) -> str:
@@ -52,20 +383,72 @@ class DifyConsoleClient:
       - refresh_token (httpOnly)
       - csrf_token (読み取り可能)
     - 安全でないメソッドの場合、csrf_token Cookieと一致する X-CSRF-Token ヘッダーを送信。
+    - access_token の期限切れ (401) は POST /console/api/refresh-token で更新し、
+      それも失敗した場合のみ再ログインする。
+
+    session_cache を指定すると、ログイン済み Cookie をプロセス間で再利用する。
+
+    一時的な障害 (429/502/503/504・接続エラー) は config.retry に従って再試行する。
+    再送して安全なリクエスト (GET、app_id 指定の上書き import など) はすべて再試行し、
+    それ以外は「サーバーが処理していない」ことが明らかな場合 (接続失敗・429・503) のみ再試行する。
+    再試行回数などは metrics に記録される。
+
+    instrumentation にはリクエスト（再試行を含む各送信）と SSE イベントごとに呼ばれる
+    フック (Instrumentation) を登録できる。from_env() では環境変数で有効にした exporter を登録する。
+
+    cassette を渡すと HTTP のやり取り（SSE はチャンクと到着時刻も）をファイルに記録する / ファイルから再生する
+    (dify_creator.cassette)。再生時はネットワークに出ない。
     """
 
-    def __init__(self, config: ConsoleConfig):
+    def __init__(
+        self,
+        config: ConsoleConfig,
+        session_cache: SessionCache | None = None,
+        instrumentation: list[Instrumentation] | None = None,
+        cassette: Cassette | None = None,
+    ):
         self.config = config
         self.session = requests.Session()
+        self.session_cache = session_cache
+        self._credentials: tuple[str, str] | None = None
+        # 複数スレッドが同時に 401 を受けたときに refresh を1回にまとめる
+        self._auth_lock = threading.Lock()
+        self.breaker = CircuitBreaker(config.breaker_failures, config.breaker_reset_s)
+        self.metrics = RequestMetrics()
+        self.instrumentation: list[Instrumentation] = list(instrumentation or [])
+        self.cassette = cassette
+        self._pool_maxsize = 0
+        self.set_pool_size(config.pool_maxsize)
 
     @classmethod
     def from_env(cls) -> "DifyConsoleClient":
-        base_url = os.getenv("DIFY_BASE_URL", "").strip()
-        if not base_url:
-            raise DifyConsoleError("DIFY_BASE_URL が未設定です")
-        verify_ssl = _env_bool("DIFY_VERIFY_SSL", True)
-        timeout_s = float(os.getenv("DIFY_TIMEOUT_S", "60"))
-        return cls(ConsoleConfig(base_url=base_url, verify_ssl=verify_ssl, timeout_s=timeout_s))
+        cassette = cassette_from_env()
+        # 再生時は保存済みセッションを使わない（記録した Cookie は伏せてあり、ログインも再生で済む）
+        session_cache = None if cassette is not None and cassette.mode == "replay" else session_cache_from_env()
+        client = cls(ConsoleConfig.from_env(), session_cache=session_cache, cassette=cassette)
+        client.instrumentation.extend(instrumentation_from_env(client.metrics))
+        return client
+
+    def flush_instrumentation(self) -> None:
+        """登録したフックの flush() を呼ぶ（exporter がファイル / OTLP に書き出す）"""
+        for hook in self.instrumentation:
+            hook.flush()
+
+    def set_pool_size(self, maxsize: int) -> None:
+        """
+        同一ホストへの同時接続数の上限を設定する（スレッドから並列に使う場合に必要）。
+        config.pool_maxsize より小さくはしない。再試行は _request で行うため urllib3 側では行わない。
+        """
+        maxsize = max(self.config.pool_maxsize, maxsize)
+        if maxsize == self._pool_maxsize:
+            return
+        if self.cassette is not None:
+            adapter = self.cassette.adapter(maxsize)
+        else:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=maxsize, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool_maxsize = maxsize
 
     def _csrf(self) -> str | None:
         # OSS での Cookie 名: csrf_token
@@ -81,30 +464,163 @@ class DifyConsoleClient:
         stream: bool = False,
         extra_headers: dict[str, str] | None = None,
         timeout_s: float | None = None,
+        idempotent: bool | None = None,
     ) -> requests.Response:
+        """
+        idempotent: 失敗時に再送して安全か。None の場合は GET/HEAD/OPTIONS/PUT/DELETE を安全とみなす。
+        """
         url = _join_url(self.config.api_base, path)
-        headers: dict[str, str] = {}
-
-        if extra_headers:
-            headers.update(extra_headers)
+        if idempotent is None:
+            idempotent = method.upper() in {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
 
-        # 安全でないメソッド用の CSRF
-        if method.upper() not in {"GET", "HEAD", "OPTIONS"}:
-            csrf = self._csrf()
-            if csrf:
-                headers.setdefault("X-CSRF-Token", csrf)
+        def send() -> requests.Response:
+            # refresh 後は CSRF トークンが変わるので毎回組み立てる
+            headers = build_request_headers(method, self._csrf(), extra_headers)
+            started_at, started_perf = time.time(), time.perf_counter()
+            try:
+                resp = self.session.request(
+                    method=method.upper(),
+                    url=url,
+                    params=params,
+                    json=json_body,
+                    headers=headers,
+                    verify=self.config.verify_ssl,
+                    timeout=timeout_s or self.config.timeout_s,
+                    stream=stream,
+                )
+            except requests.RequestException as e:
+                if self.instrumentation:
+                    self._record_request(method, path, headers, None, started_at, started_perf, stream, e)
+                raise
+            if self.instrumentation:
+                self._record_request(method, path, headers, resp, started_at, started_perf, stream, None)
+            return resp
+
+        csrf_sent = self._csrf()
+        resp = self._send_with_retry(send, idempotent=idempotent)
+        if is_auth_error_retryable(resp.status_code, path) and self._recover_auth(csrf_sent):
+            resp.close()
+            resp = self._send_with_retry(send, idempotent=idempotent)
+        return resp
 
-        resp = self.session.request(
+    def _record_request(
+        self,
+        method: str,
+        path: str,
+        headers: dict[str, str],
+        resp: requests.Response | None,
+        started_at: float,
+        started_perf: float,
+        stream: bool,
+        error: BaseException | None,
+    ) -> None:
+        elapsed = time.perf_counter() - started_perf
+        body = resp.request.body if resp is not None and resp.request is not None else None
+        record = RequestRecord(
             method=method.upper(),
-            url=url,
-            params=params,
-            json=json_body,
-            headers=headers,
-            verify=self.config.verify_ssl,
-            timeout=timeout_s or self.config.timeout_s,
+            endpoint=endpoint_template(path),
+            status=resp.status_code if resp is not None else None,
+            started_at=started_at,
+            elapsed_s=elapsed,
+            ttfb_s=resp.elapsed.total_seconds() if resp is not None else None,
+            bytes_sent=len(body) if body else 0,
+            # stream の場合は本文をまだ読んでいない（SSE 側で数える）
+            bytes_received=len(resp.content) if resp is not None and not stream else None,
             stream=stream,
+            external_trace_id=headers.get("X-External-Trace-Id"),
+            error=type(error).__name__ if error is not None else None,
         )
-        return resp
+        if resp is not None and stream:
+            # iter_sse_raw で SSE の計測を始めるときに使う
+            resp._dify_started = (started_at, started_perf)  # type: ignore[attr-defined]
+        for hook in self.instrumentation:
+            hook.on_request(record)
+
+    def _send_with_retry(self, send: Callable[[], requests.Response], *, idempotent: bool) -> requests.Response:
+        policy = self.config.retry
+        # サーキットブレーカーは論理リクエストごとに1回だけ確認する。再試行のたびに確認すると、
+        # half-open の試行リクエスト自身の再試行が「試行中」として拒否され、閉じられなくなる
+        remaining = self.breaker.before_request()
+        if remaining is not None:
+            self.metrics.count_rejected()
+            raise DifyConsoleError(
+                f"サーバーへのリクエストが連続 {self.breaker.consecutive_failures} 回失敗したため、"
+                f"{remaining:.1f}s 間リクエストを停止しています"
+            )
+        attempt = 0
+        while True:
+            self.metrics.count_request()
+            try:
+                resp = send()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # 接続できなかった場合はリクエストが届いていないので、非冪等でも再送してよい
+                if attempt < policy.max_retries and (idempotent or _is_connect_failure(e)):
+                    self._sleep_before_retry(attempt, type(e).__name__, None)
+                    attempt += 1
+                    continue
+                self.metrics.count_failure(self.breaker.record_failure())
+                raise
+            except BaseException:
+                # サーバーの失敗ではない例外（中断など）。half-open の試行枠だけ返す
+                self.breaker.release_trial()
+                raise
+
+            if resp.status_code not in RETRYABLE_STATUSES:
+                self.breaker.record_success()
+                return resp
+            if attempt < policy.max_retries and (idempotent or resp.status_code in NOT_PROCESSED_STATUSES):
+                retry_after = resp.headers.get("Retry-After")
+                resp.close()
+                self._sleep_before_retry(attempt, str(resp.status_code), retry_after)
+                attempt += 1
+                continue
+            self.metrics.count_failure(self.breaker.record_failure())
+            return resp
+
+    def _sleep_before_retry(self, attempt: int, reason: str, retry_after: str | None) -> None:
+        wait = self.config.retry.delay_s(attempt, retry_after)
+        self.metrics.count_retry(reason, wait)
+        time.sleep(wait)
+
+    def _recover_auth(self, csrf_sent: str | None) -> bool:
+        """
+        401 を受けたときの復旧: refresh token で更新 → だめなら保存済み認証情報で再ログイン。
+        """
+        with self._auth_lock:
+            # 待っている間に他のスレッドが更新済み
+            if self._csrf() != csrf_sent:
+                return True
+            if self.refresh_session():
+                return True
+            if self._credentials is None:
+                return False
+            email, password_plain = self._credentials
+            self.login(email=email, password_plain=password_plain)
+            return True
+
+    def _cache_key(self) -> str | None:
+        if self.session_cache is None or self._credentials is None:
+            return None
+        return SessionCache.key(self.config.base_url, self._credentials[0])
+
+    def _dump_session_cookies(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "name": c.name,
+                "value": c.value,
+                "domain": c.domain,
+                "path": c.path,
+                "secure": c.secure,
+                "expires": c.expires,
+            }
+            for c in self.session.cookies
+            if is_session_cookie(c.name)
+        ]
+
+    def _save_session(self) -> None:
+        key = self._cache_key()
+        if key is not None:
+            self.session_cache.save(key, self._dump_session_cookies())  # type: ignore[union-attr]
 
     def _raise_for_status(self, resp: requests.Response) -> None:
         if 200 <= resp.status_code < 300:
@@ -128,6 +644,7 @@ class DifyConsoleClient:
                 "password": password_plain,
                 "remember_me": remember_me,
             },
+            idempotent=True,
         )
         self._raise_for_status(resp)
 
@@ -135,6 +652,51 @@ class DifyConsoleClient:
         if not self._csrf():
             raise DifyConsoleError("ログイン後に csrf_token Cookie が見つかりません（Difyの設定/挙動を確認してください）")
 
+        self._credentials = (email, password_plain)
+        self._save_session()
+
+    def ensure_login(self, *, email: str, password_plain: str) -> None:
+        """
+        セッションキャッシュに有効な Cookie があればそれを復元し、なければログインする。
+        Cookie の有効性はここでは確認しない（期限切れなら最初のリクエストの 401 で refresh される）。
+        """
+        self._credentials = (email, password_plain)
+        if self.session_cache is None:
+            self.login(email=email, password_plain=password_plain)
+            return
+
+        key = SessionCache.key(self.config.base_url, email)
+        # キーのロック中にログインすることで、同じアカウントで同時起動したジョブのログインを1回にまとめる
+        with self.session_cache.locked(key):
+            cookies = self.session_cache.load(key)
+            if cookies:
+                for c in cookies:
+                    self.session.cookies.set(
+                        c["name"],
+                        c["value"],
+                        domain=c.get("domain") or "",
+                        path=c.get("path") or "/",
+                        secure=bool(c.get("secure")),
+                        expires=c.get("expires"),
+                    )
+                if self._csrf():
+                    return
+            self.login(email=email, password_plain=password_plain)
+
+    def refresh_session(self) -> bool:
+        """
+        refresh_token Cookie を使って POST /console/api/refresh-token でトークンを更新する。
+        成功時はキャッシュも更新する。
+        """
+        if not any(c.name.removeprefix("__Host-") == "refresh_token" for c in self.session.cookies):
+            return False
+        resp = self._request("POST", "/refresh-token")
+        resp.close()
+        if not (200 <= resp.status_code < 300) or not self._csrf():
+            return False
+        self._save_session()
+        return True
+
     def import_app(
         self,
         *,
@@ -146,37 +708,23 @@ class DifyConsoleClient:
         icon_type: str | None = None,
         icon: str | None = None,
         icon_background: str | None = None,
+        validate_yaml: bool = True,
     ) -> dict[str, Any]:
-        # OSS は mode を {"yaml-content","yaml-url"} のいずれかで期待
-        if yaml_content and yaml_url:
-            raise ValueError("yaml_content と yaml_url は同時指定できません")
-        if not yaml_content and not yaml_url:
-            raise ValueError("yaml_content か yaml_url のどちらかが必要です")
-
-        # yaml_contentが指定されている場合、YAML形式の検証を行う
-        if yaml_content:
-            try:
-                yaml.safe_load(yaml_content)
-            except yaml.YAMLError as e:
-                raise DifyConsoleError(f"無効なYAML形式です: {e}")
-
-        mode = "yaml-content" if yaml_content else "yaml-url"
-        payload: dict[str, Any] = {
-            "mode": mode,
-            "yaml_content": yaml_content,
-            "yaml_url": yaml_url,
-            "name": name,
-            "description": description,
-            "icon_type": icon_type,
-            "icon": icon,
-            "icon_background": icon_background,
-            "app_id": app_id,
-        }
-        # None のキーを削除
-        payload = {k: v for k, v in payload.items() if v is not None}
+        payload = build_import_payload(
+            yaml_content=yaml_content,
+            yaml_url=yaml_url,
+            app_id=app_id,
+            name=name,
+            description=description,
+            icon_type=icon_type,
+            icon=icon,
+            icon_background=icon_background,
+            validate_yaml=validate_yaml,
+        )
 
         try:
-            resp = self._request("POST", "/apps/imports", json_body=payload)
+            # app_id 指定の上書き import は何度送っても結果が同じなので再試行してよい
+            resp = self._request("POST", "/apps/imports", json_body=payload, idempotent=app_id is not None)
             # import はステータスに応じて 200/202/400 を返す
             if resp.status_code in {200, 202}:
                 return resp.json()
@@ -191,24 +739,33 @@ class DifyConsoleClient:
         self._raise_for_status(resp)
         return resp.json()
 
+    def list_apps(self, *, page: int = 1, limit: int = 100, name: str | None = None) -> dict[str, Any]:
+        """アプリ一覧の1ページ分（{"data": [...], "has_more": bool, "page", "limit", "total"}）"""
+        params: dict[str, Any] = {"page": page, "limit": limit}
+        if name:
+            params["name"] = name
+        resp = self._request("GET", "/apps", params=params)
+        self._raise_for_status(resp)
+        return resp.json()
+
+    def iter_apps(self, *, limit: int = 100, name: str | None = None) -> Iterator[dict[str, Any]]:
+        """全ページを順にたどってアプリを1件ずつ返す"""
+        page = 1
+        while True:
+            body = self.list_apps(page=page, limit=limit, name=name)
+            apps = body.get("data") or []
+            yield from apps
+            if not body.get("has_more") or not apps:
+                return
+            page += 1
+
     def export_app(self, *, app_id: str, include_secret: bool = False, workflow_id: str | None = None) -> str:
         params: dict[str, Any] = {"include_secret": str(include_secret).lower()}
         if workflow_id:
             params["workflow_id"] = workflow_id
         resp = self._request("GET", f"/apps/{app_id}/export", params=params)
         self._raise_for_status(resp)
-        data = resp.json()
-        if "data" not in data:
-            raise DifyConsoleError(f"exportレスポンスが想定外です: {data}")
-
-        export_data = data["data"]
-        # レスポンスがdictの場合はYAMLに変換
-        if isinstance(export_data, dict):
-            return yaml.dump(export_data, allow_unicode=True, sort_keys=False)
-        elif isinstance(export_data, str):
-            return export_data
-        else:
-            raise DifyConsoleError(f"export dataの型が想定外です: {type(export_data)}")
+        return decode_export_response(resp.json())
 
     def run_draft_workflow_stream(
         self,
@@ -217,14 +774,16 @@ class DifyConsoleClient:
         inputs: dict[str, Any],
         files: list[dict[str, Any]] | None = None,
         external_trace_id: str | None = None,
+        timeout_s: float | None = None,
     ) -> requests.Response:
-        payload: dict[str, Any] = {"inputs": inputs}
-        if files is not None:
-            payload["files"] = files
-        headers: dict[str, str] = {}
-        if external_trace_id:
-            # Dify は外部トレースID の伝播をサポート
-            headers["X-External-Trace-Id"] = external_trace_id
+        """
+        計測が有効で external_trace_id が未指定なら採番して送り、クライアント側のスパンと
+        Dify 側のトレースを同じ ID で突き合わせられるようにする。
+        timeout_s はイベント間の読み取りタイムアウト（未指定なら config.timeout_s）。
+        """
+        if external_trace_id is None and self.instrumentation:
+            external_trace_id = str(uuid.uuid4())
+        payload, headers = build_draft_run_request(inputs, files, external_trace_id)
 
         resp = self._request(
             "POST",
@@ -232,32 +791,98 @@ class DifyConsoleClient:
             json_body=payload,
             stream=True,
             extra_headers=headers,
-            timeout_s=None,  # 長時間実行を許可
+            timeout_s=timeout_s,
         )
         self._raise_for_status(resp)
         return resp
 
+    def iter_sse_raw(self, resp: requests.Response) -> Iterator[bytes]:
+        """
+        SSE ストリームの 'data:' ペイロードを bytes のまま返す（NDJSON へのそのまま書き出し用）。
+        """
+        started = getattr(resp, "_dify_started", None)
+        if self.instrumentation and started is not None:
+            yield from self._iter_sse_tracked(resp, StreamTracker(self.instrumentation, resp, *started))
+            return
+        decoder = SSEDecoder()
+        try:
+            for chunk in iter_response_chunks(resp):
+                yield from decoder.feed(chunk)
+                if decoder.done:
+                    return
+            yield from decoder.flush()
+        finally:
+            resp.close()
+
+    def _iter_sse_tracked(self, resp: requests.Response, tracker: StreamTracker) -> Iterator[bytes]:
+        decoder = SSEDecoder()
+        try:
+            for chunk in iter_response_chunks(resp):
+                for payload in decoder.feed(chunk):
+                    tracker.on_payload(payload)
+                    yield payload
+                if decoder.done:
+                    return
+            for payload in decoder.flush():
+                tracker.on_payload(payload)
+                yield payload
+        finally:
+            resp.close()
+            tracker.finish()
+
     def iter_sse_json(self, resp: requests.Response) -> Iterator[dict[str, Any]]:
         """
         helper.compact_generate_response() から発行される SSE 風のストリーミングレスポンスを解析。
         'data: {json}' のような行のみを解析します。
         """
-        for raw_line in resp.iter_lines(decode_unicode=True):
-            if not raw_line:
-                continue
-            line = raw_line.strip()
-            if not line.startswith("data:"):
-                continue
-            data_str = line[len("data:") :].strip()
-            if not data_str:
-                continue
-            if data_str == "[DONE]":
-                return
-            try:
-                yield json.loads(data_str)
-            except json.JSONDecodeError:
-                # 一部のイベントは非JSONデータを送信する可能性があるため無視
-                continue
+        for payload in self.iter_sse_raw(resp):
+            ev = decode_sse_json(payload)
+            if ev is not None:
+                yield ev
+
+    def open_draft_run(
+        self,
+        *,
+        app_id: str,
+        inputs: dict[str, Any],
+        files: list[dict[str, Any]] | None = None,
+        external_trace_id: str | None = None,
+        max_wait_s: float | None = None,
+    ) -> DeadlineStream:
+        """
+        draft run を開始し、SSE ペイロード (bytes) を返す DeadlineStream を返す。
+        max_wait_s はリクエスト開始からの壁時計の上限で、イベントが届かなくても適用される。
+        期限まではイベントの間隔が config.timeout_s を超えても読み続ける（期限は DeadlineStream が守る）。
+        """
+        deadline = time.monotonic() + max_wait_s if max_wait_s is not None else None
+
+        def open_stream() -> requests.Response:
+            timeout_s = None
+            if deadline is not None:
+                timeout_s = max(self.config.timeout_s, deadline - time.monotonic() + 1.0)
+            return self.run_draft_workflow_stream(
+                app_id=app_id, inputs=inputs, files=files, external_trace_id=external_trace_id, timeout_s=timeout_s
+            )
+
+        return DeadlineStream(open_stream, self.iter_sse_raw, deadline)
+
+    def stop_workflow_task(self, *, app_id: str, task_id: str) -> None:
+        """実行中の draft run を停止する（task_id は workflow_started イベントに含まれる）"""
+        resp = self._request("POST", f"/apps/{app_id}/workflow-runs/tasks/{task_id}/stop")
+        self._raise_for_status(resp)
+
+    def stop_after_timeout(self, *, app_id: str, task_id: str | None) -> bool:
+        """
+        期限切れ後にサーバー側のワークフローを止める（トークン消費を止めるため）。
+        停止できたかを返し、失敗しても例外にはしない。
+        """
+        if not task_id:
+            return False
+        try:
+            self.stop_workflow_task(app_id=app_id, task_id=task_id)
+        except (DifyConsoleError, requests.RequestException):
+            return False
+        return True
 
     def run_draft_workflow_collect(
         self,
@@ -267,56 +892,61 @@ class DifyConsoleClient:
         files: list[dict[str, Any]] | None = None,
         external_trace_id: str | None = None,
         max_wait_s: float | None = None,
+        stop_on_timeout: bool = True,
     ) -> dict[str, Any]:
         """
         ストリーミングイベントを以下に収集:
         - events: JSON イベントのリスト
         - last_event: 最後の JSON イベント (存在する場合)
+
+        max_wait_s を超えた場合は途中までのイベントに加えて以下を返す:
+        - status: "timeout"
+        - task_id: workflow_started で通知された task_id
+        - stopped: stop_on_timeout で停止 API を呼べたか
         """
-        resp = self.run_draft_workflow_stream(
-            app_id=app_id, inputs=inputs, files=files, external_trace_id=external_trace_id
+        stream = self.open_draft_run(
+            app_id=app_id, inputs=inputs, files=files, external_trace_id=external_trace_id, max_wait_s=max_wait_s
         )
 
-        t0 = time.time()
         events: list[dict[str, Any]] = []
         last: dict[str, Any] | None = None
-        for ev in self.iter_sse_json(resp):
+        task_id: str | None = None
+        for payload in stream:
+            ev = decode_sse_json(payload)
+            if ev is None:
+                continue
             events.append(ev)
             last = ev
-            if max_wait_s is not None and (time.time() - t0) > max_wait_s:
-                break
+            if task_id is None:
+                task_id = ev.get("task_id")
 
-        return {"events": events, "last_event": last}
-
-
-def load_dotenv_if_present() -> None:
-    # オプション; python-dotenv がインストールされていない場合は何もしない
-    try:
-        from dotenv import load_dotenv  # type: ignore
-    except Exception:
-        return
-    load_dotenv(override=False)
+        result: dict[str, Any] = {"events": events, "last_event": last}
+        if stream.timed_out:
+            result["status"] = "timeout"
+            result["task_id"] = task_id
+            result["stopped"] = stop_on_timeout and self.stop_after_timeout(app_id=app_id, task_id=task_id)
+        return result
 
 
-def read_yaml_file(path: str) -> str:
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
-
-
-def read_json_file(path: str) -> Any:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-
-def write_text_file(path: str, text: str) -> None:
-    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(text)
-
-
-def write_json_file(path: str, obj: Any) -> None:
-    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
+def _is_connect_failure(e: requests.RequestException) -> bool:
+    """接続確立前の失敗 (名前解決・接続拒否・接続タイムアウト) か"""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    if not isinstance(e, requests.ConnectionError):
+        return False
+    reason = e.args[0] if e.args else None
+    reason = getattr(reason, "reason", reason)
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
 
 
+def session_cache_from_env() -> SessionCache | None:
+    """
+    DIFY_SESSION_CACHE:
+    - 未設定: 既定のパス (~/.cache/dify-creator/sessions.json) を使用
+    - 0/false/off/no: 無効
+    - それ以外: キャッシュファイルのパス
+    """
+    v = os.getenv("DIFY_SESSION_CACHE", "").strip()
+    if v.lower() in {"0", "false", "off", "no", "n"}:
+        return None
+    return SessionCache(v or None)
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any
+
+import yaml
+
+from dify_creator import yaml_io
+from dify_creator.errors import DifyConsoleError
+from dify_creator.file_io import read_yaml_file
+
+
+# Studio の表示状態だけを表すフィールド（ワークフローの動作には影響しない）
+COSMETIC_NODE_KEYS = frozenset(
+    {"position", "positionAbsolute", "width", "height", "selected", "dragging", "zIndex"}
+)
+COSMETIC_NODE_DATA_KEYS = frozenset({"selected"})
+COSMETIC_EDGE_KEYS = frozenset({"selected", "zIndex"})
+COSMETIC_GRAPH_KEYS = frozenset({"viewport"})
+
+# load_dsl_file のキャッシュに保持するファイル数
+FILE_CACHE_SIZE = 256
+
+
+def parse_dsl(yaml_text: str) -> dict[str, Any]:
+    try:
+        data = yaml_io.safe_load(yaml_text)
+    except yaml.YAMLError as e:
+        raise DifyConsoleError(f"YAML パースエラー: {e}")
+    if not isinstance(data, dict):
+        raise DifyConsoleError("DSL は YAML object (dictionary) である必要があります")
+    return data
+
+
+@dataclass(frozen=True)
+class DslDocument:
+    """
+    パース済みの DSL。元のテキスト（import でそのまま送る）とパース結果を一緒に持ち回り、
+    同じ DSL を validate / hash / import のたびにパースし直さないようにする。
+    data は共有されるので変更しないこと。
+    """
+
+    text: str
+    data: dict[str, Any]
+    path: str | None = None
+
+    @classmethod
+    def from_text(cls, text: str, path: str | None = None) -> "DslDocument":
+        return cls(text=text, data=parse_dsl(text), path=path)
+
+    @cached_property
+    def hash(self) -> str:
+        """正規化 hash（初回だけ計算）"""
+        return dsl_hash(self.data)
+
+
+_file_cache: OrderedDict[str, tuple[int, int, DslDocument]] = OrderedDict()
+_file_cache_lock = threading.Lock()
+
+
+def load_dsl_file(path: str) -> DslDocument:
+    """
+    DSL ファイルを読み込んでパースする。(mtime, サイズ) が変わっていなければ前回の結果を返す
+    （watch / sync-all などで同じファイルを何度も読む場合に効く）。
+    """
+    st = os.stat(path)
+    key = os.path.realpath(path)
+    with _file_cache_lock:
+        hit = _file_cache.get(key)
+        if hit is not None and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            _file_cache.move_to_end(key)
+            return hit[2]
+
+    doc = DslDocument.from_text(read_yaml_file(path), path=path)
+    with _file_cache_lock:
+        _file_cache[key] = (st.st_mtime_ns, st.st_size, doc)
+        _file_cache.move_to_end(key)
+        while len(_file_cache) > FILE_CACHE_SIZE:
+            _file_cache.popitem(last=False)
+    return doc
+
+
+def normalize_dsl(data: dict[str, Any]) -> dict[str, Any]:
+    """
+    比較用に DSL を正規化する（元のオブジェクトは変更しない）。
+    ノード位置などの見た目だけのフィールドを除き、ノード/エッジは id 順に並べる。
+    キー順は hash 時に sort_keys で吸収する。
+    """
+    out = dict(data)
+    workflow = data.get("workflow")
+    if not isinstance(workflow, dict):
+        return out
+    graph = workflow.get("graph")
+    if not isinstance(graph, dict):
+        return out
+
+    g = {k: v for k, v in graph.items() if k not in COSMETIC_GRAPH_KEYS}
+    nodes = graph.get("nodes")
+    if isinstance(nodes, list):
+        g["nodes"] = sorted((_normalize_node(n) for n in nodes), key=_id_key)
+    edges = graph.get("edges")
+    if isinstance(edges, list):
+        g["edges"] = sorted(
+            (
+                {k: v for k, v in e.items() if k not in COSMETIC_EDGE_KEYS} if isinstance(e, dict) else e
+                for e in edges
+            ),
+            key=_id_key,
+        )
+    out["workflow"] = {**workflow, "graph": g}
+    return out
+
+
+def _normalize_node(node: Any) -> Any:
+    if not isinstance(node, dict):
+        return node
+    out = {k: v for k, v in node.items() if k not in COSMETIC_NODE_KEYS}
+    data = node.get("data")
+    if isinstance(data, dict) and COSMETIC_NODE_DATA_KEYS.intersection(data):
+        out["data"] = {k: v for k, v in data.items() if k not in COSMETIC_NODE_DATA_KEYS}
+    return out
+
+
+def _id_key(item: Any) -> str:
+    if isinstance(item, dict):
+        return str(item.get("id", ""))
+    return ""
+
+
+def canonical_json(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def dsl_hash(data: dict[str, Any]) -> str:
+    """正規化した DSL の sha256（キー順やノード位置の違いでは変わらない）"""
+    return hashlib.sha256(canonical_json(normalize_dsl(data)).encode("utf-8")).hexdigest()
+
+
+def inputs_hash(inputs: dict[str, Any]) -> str:
+    return hashlib.sha256(canonical_json(inputs).encode("utf-8")).hexdigest()
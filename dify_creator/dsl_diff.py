@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import difflib
+import json
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator
+
+from dify_creator.dsl import normalize_dsl
+
+# リスト要素を突き合わせるキー（全要素が持ち、かつ一意なものを前から順に使う）
+LIST_ID_KEYS = ("id", "variable", "name", "key")
+
+# Change.category の判定（パスに含まれる部分文字列 → 分類）
+_CATEGORY_RULES = (
+    ("prompt", ("prompt_template", "system_prompt", "query_prompt_template", "instruction", "pre_prompt")),
+    ("model", ("data.model", "completion_params", "model_config")),
+    ("variables", ("variables", "variable_selector", "outputs", "environment_variables")),
+)
+
+_MISSING = object()
+
+
+@dataclass
+class Change:
+    path: str  # 例: data.model.completion_params.temperature, data.variables[query].required
+    kind: str  # added / removed / modified
+    old: Any = None
+    new: Any = None
+
+    @property
+    def category(self) -> str:
+        for name, needles in _CATEGORY_RULES:
+            if any(n in self.path for n in needles):
+                return name
+        return "other"
+
+
+@dataclass
+class ItemDiff:
+    """ノードまたはエッジ1件分の差分"""
+
+    id: str
+    label: str
+    changes: list[Change] = field(default_factory=list)
+
+
+@dataclass
+class DslDiff:
+    """
+    デプロイ済み DSL (old) → ローカル DSL (new) の構造的な差分。
+    import したときに何が変わるかを表す。
+    """
+
+    nodes_added: list[ItemDiff] = field(default_factory=list)
+    nodes_removed: list[ItemDiff] = field(default_factory=list)
+    nodes_modified: list[ItemDiff] = field(default_factory=list)
+    edges_added: list[ItemDiff] = field(default_factory=list)
+    edges_removed: list[ItemDiff] = field(default_factory=list)
+    edges_modified: list[ItemDiff] = field(default_factory=list)
+    other: list[Change] = field(default_factory=list)  # app 情報・features・環境変数など graph 以外
+
+    @property
+    def empty(self) -> bool:
+        return not (
+            self.nodes_added
+            or self.nodes_removed
+            or self.nodes_modified
+            or self.edges_added
+            or self.edges_removed
+            or self.edges_modified
+            or self.other
+        )
+
+    def counts(self) -> dict[str, int]:
+        return {
+            "nodes_added": len(self.nodes_added),
+            "nodes_removed": len(self.nodes_removed),
+            "nodes_modified": len(self.nodes_modified),
+            "edges_added": len(self.edges_added),
+            "edges_removed": len(self.edges_removed),
+            "edges_modified": len(self.edges_modified),
+            "other": len(self.other),
+        }
+
+    def to_dict(self) -> dict[str, Any]:
+        out = asdict(self)
+        out["changed"] = not self.empty
+        out["counts"] = self.counts()
+        return out
+
+
+def diff_dsl(old: dict[str, Any], new: dict[str, Any]) -> DslDiff:
+    """
+    2つの DSL を normalize_dsl で正規化（位置などの見た目のフィールドを除去）してから比較する。
+    ノード・エッジは id で索引を作って突き合わせるので、グラフが大きくても線形時間で済む。
+    empty な結果は dsl_hash が一致することと同じ意味になる。
+    """
+    old_n, new_n = normalize_dsl(old), normalize_dsl(new)
+    out = DslDiff()
+    if old_n == new_n:
+        return out
+
+    old_graph, old_rest = _split_graph(old_n)
+    new_graph, new_rest = _split_graph(new_n)
+
+    _diff_items(
+        _index(old_graph.get("nodes"), _node_key),
+        _index(new_graph.get("nodes"), _node_key),
+        _node_label,
+        out.nodes_added,
+        out.nodes_removed,
+        out.nodes_modified,
+    )
+    _diff_items(
+        _index(old_graph.get("edges"), _edge_key),
+        _index(new_graph.get("edges"), _edge_key),
+        _edge_label,
+        out.edges_added,
+        out.edges_removed,
+        out.edges_modified,
+    )
+    out.other.extend(diff_values(old_rest, new_rest))
+    if out.empty:
+        # 重複した id のノードなど、索引では区別できない違いしかない場合
+        out.other.append(Change("workflow.graph", "modified"))
+    return out
+
+
+def _split_graph(data: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any]]:
+    """(graph, graph の nodes/edges 以外のすべて)"""
+    workflow = data.get("workflow")
+    graph = workflow.get("graph") if isinstance(workflow, dict) else None
+    if not isinstance(graph, dict):
+        return {}, data
+    rest_graph = {k: v for k, v in graph.items() if k not in {"nodes", "edges"}}
+    rest = {**data, "workflow": {**workflow, "graph": rest_graph}}
+    return graph, rest
+
+
+def _node_key(node: dict[str, Any], i: int) -> str:
+    return str(node.get("id") or f"#{i}")
+
+
+def _edge_key(edge: dict[str, Any], i: int) -> str:
+    if edge.get("id"):
+        return str(edge["id"])
+    return "{}:{}->{}:{}".format(
+        edge.get("source"), edge.get("sourceHandle"), edge.get("target"), edge.get("targetHandle")
+    )
+
+
+def _node_label(node: dict[str, Any]) -> str:
+    data = node.get("data") if isinstance(node.get("data"), dict) else {}
+    kind = data.get("type") or node.get("type") or "?"
+    title = data.get("title")
+    return f"{kind} {json.dumps(title, ensure_ascii=False)}" if title else str(kind)
+
+
+def _edge_label(edge: dict[str, Any]) -> str:
+    handle = edge.get("sourceHandle")
+    suffix = f" [{handle}]" if handle not in (None, "", "source") else ""
+    return f"{edge.get('source')} -> {edge.get('target')}{suffix}"
+
+
+def _index(items: Any, key_fn: Any) -> dict[str, dict[str, Any]]:
+    out: dict[str, dict[str, Any]] = {}
+    if not isinstance(items, list):
+        return out
+    for i, item in enumerate(items):
+        if isinstance(item, dict):
+            out[key_fn(item, i)] = item
+    return out
+
+
+def _diff_items(
+    old: dict[str, dict[str, Any]],
+    new: dict[str, dict[str, Any]],
+    label_fn: Any,
+    added: list[ItemDiff],
+    removed: list[ItemDiff],
+    modified: list[ItemDiff],
+) -> None:
+    for key, item in new.items():
+        before = old.get(key)
+        if before is None:
+            added.append(ItemDiff(id=key, label=label_fn(item)))
+        elif before != item:
+            modified.append(ItemDiff(id=key, label=label_fn(item), changes=list(diff_values(before, item))))
+    for key, item in old.items():
+        if key not in new:
+            removed.append(ItemDiff(id=key, label=label_fn(item)))
+
+
+def diff_values(old: Any, new: Any, path: str = "") -> Iterator[Change]:
+    """
+    任意の値を再帰的に比較して Change を返す。dict はキー、リストは LIST_ID_KEYS で
+    要素を突き合わせ（該当キーがなければ位置で）比較する。等しい部分木は == で打ち切る。
+    """
+    if old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for k in new:
+            sub = f"{path}.{k}" if path else str(k)
+            if k not in old:
+                yield Change(sub, "added", new=new[k])
+            else:
+                yield from diff_values(old[k], new[k], sub)
+        for k in old:
+            if k not in new:
+                yield Change(f"{path}.{k}" if path else str(k), "removed", old=old[k])
+        return
+    if isinstance(old, list) and isinstance(new, list):
+        yield from _diff_lists(old, new, path)
+        return
+    yield Change(path, "modified", old=old, new=new)
+
+
+def _diff_lists(old: list[Any], new: list[Any], path: str) -> Iterator[Change]:
+    key = _list_id_key(old, new)
+    if key is None:
+        for i in range(max(len(old), len(new))):
+            a = old[i] if i < len(old) else _MISSING
+            b = new[i] if i < len(new) else _MISSING
+            sub = f"{path}[{i}]"
+            if a is _MISSING:
+                yield Change(sub, "added", new=b)
+            elif b is _MISSING:
+                yield Change(sub, "removed", old=a)
+            else:
+                yield from diff_values(a, b, sub)
+        return
+    old_by = {item[key]: item for item in old}
+    new_by = {item[key]: item for item in new}
+    for k, item in new_by.items():
+        sub = f"{path}[{k}]"
+        if k not in old_by:
+            yield Change(sub, "added", new=item)
+        else:
+            yield from diff_values(old_by[k], item, sub)
+    for k, item in old_by.items():
+        if k not in new_by:
+            yield Change(f"{path}[{k}]", "removed", old=item)
+    if [k for k in new_by if k in old_by] != [k for k in old_by if k in new_by]:
+        yield Change(f"{path}[*]", "modified", old=list(old_by), new=list(new_by))
+
+
+def _list_id_key(old: list[Any], new: list[Any]) -> str | None:
+    items = old + new
+    if not items or not all(isinstance(it, dict) for it in items):
+        return None
+    for key in LIST_ID_KEYS:
+        if all(isinstance(it.get(key), (str, int)) for it in items) and _unique(old, key) and _unique(new, key):
+            return key
+    return None
+
+
+def _unique(items: list[dict[str, Any]], key: str) -> bool:
+    return len({it[key] for it in items}) == len(items)
+
+
+# --- 表示 ---
+
+_TEXT_LIMIT = 120
+
+
+def _short(v: Any) -> str:
+    s = v if isinstance(v, str) else json.dumps(v, ensure_ascii=False, default=str)
+    s = s.replace("\n", "\\n")
+    return s if len(s) <= _TEXT_LIMIT else s[: _TEXT_LIMIT - 1] + "…"
+
+
+def _format_change(c: Change, indent: str) -> list[str]:
+    head = f"{indent}{c.category:<9} {c.path}"
+    if c.kind == "added":
+        return [f"{head}: + {_short(c.new)}"]
+    if c.kind == "removed":
+        return [f"{head}: - {_short(c.old)}"]
+    if isinstance(c.old, str) and isinstance(c.new, str) and ("\n" in c.old or "\n" in c.new):
+        # 複数行のテキスト（プロンプトなど）は行単位の差分で出す
+        lines = [head + ":"]
+        diff = difflib.unified_diff(c.old.splitlines(), c.new.splitlines(), lineterm="", n=1)
+        lines.extend(f"{indent}    {line}" for line in list(diff)[2:])
+        return lines
+    return [f"{head}: {_short(c.old)} -> {_short(c.new)}"]
+
+
+def format_diff_text(diff: DslDiff) -> str:
+    if diff.empty:
+        return "no changes\n"
+    n = diff.counts()
+    lines = [
+        f"nodes: +{n['nodes_added']} -{n['nodes_removed']} ~{n['nodes_modified']}  "
+        f"edges: +{n['edges_added']} -{n['edges_removed']} ~{n['edges_modified']}  other: {n['other']}",
+        "",
+    ]
+    for kind, items in (("node", diff.nodes_added), ("edge", diff.edges_added)):
+        lines.extend(f"+ {kind} {it.id}  {it.label}" for it in items)
+    for kind, items in (("node", diff.nodes_removed), ("edge", diff.edges_removed)):
+        lines.extend(f"- {kind} {it.id}  {it.label}" for it in items)
+    for kind, items in (("node", diff.nodes_modified), ("edge", diff.edges_modified)):
+        for it in items:
+            lines.append(f"~ {kind} {it.id}  {it.label}")
+            for c in it.changes:
+                lines.extend(_format_change(c, "    "))
+    if diff.other:
+        lines.append("~ app")
+        for c in diff.other:
+            lines.extend(_format_change(c, "    "))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import os
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any
+
+import yaml
+
+from dify_creator import yaml_io
+from dify_creator.dsl import DslDocument, dsl_hash, load_dsl_file, parse_dsl
+from dify_creator.errors import DifyConsoleError
+from dify_creator.stats import format_table
+
+# Studio が画面を開いたときに作り直す表示状態（サーバーは使わない）
+UI_NODE_KEYS = frozenset({"positionAbsolute", "selected", "dragging"})
+UI_NODE_DATA_KEYS = frozenset({"selected"})
+UI_EDGE_KEYS = frozenset({"selected"})
+# width / height は描画時に測り直される。ただしコンテナ（iteration / loop）とメモは保存した大きさを使うので残す
+SIZED_NODE_DATA_TYPES = frozenset({"iteration", "loop"})
+SIZED_NODE_TYPES = frozenset({"custom-note"})
+
+# この文字数以上の同じ文字列が2回以上出てきたら YAML のアンカー / エイリアスにする
+ALIAS_MIN_CHARS = 64
+# 最適化済みテキストを保持する数（watch / sync-all で同じ DSL を何度も import する場合に効く）
+OPTIMIZE_CACHE_SIZE = 64
+OPTIMIZE_ENV = "DIFY_OPTIMIZE_DSL"
+
+
+@dataclass
+class OptimizeResult:
+    text: str
+    data: dict[str, Any]
+    original_bytes: int
+    optimized_bytes: int
+    removed_fields: int = 0
+    aliased_strings: int = 0
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - self.optimized_bytes
+
+    @property
+    def saved_ratio(self) -> float:
+        return self.saved_bytes / self.original_bytes if self.original_bytes else 0.0
+
+
+class _Optimizer:
+    """
+    DSL を1回だけたどって、表示状態の除去・座標の丸め・長い文字列の共有（同じオブジェクトにする）を行う。
+    元のデータ（DslDocument.data は共有される）は変更せず、新しい dict / list を作る。
+    """
+
+    def __init__(self, alias_min_chars: int):
+        self.alias_min_chars = alias_min_chars
+        self.removed = 0
+        self.strings: dict[str, str] = {}
+        self.counts: Counter[str] = Counter()
+
+    def value(self, obj: Any) -> Any:
+        if isinstance(obj, dict):
+            return {k: self.value(v) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [self.value(v) for v in obj]
+        if isinstance(obj, str) and len(obj) >= self.alias_min_chars:
+            self.counts[obj] += 1
+            return self.strings.setdefault(obj, obj)
+        return obj
+
+    def without(self, obj: dict[str, Any], keys: frozenset[str]) -> dict[str, Any]:
+        out = {k: v for k, v in obj.items() if k not in keys}
+        self.removed += len(obj) - len(out)
+        return out
+
+    def node(self, node: Any) -> Any:
+        if not isinstance(node, dict):
+            return self.value(node)
+        data = node.get("data")
+        keys = UI_NODE_KEYS
+        sized = node.get("type") in SIZED_NODE_TYPES or (
+            isinstance(data, dict) and data.get("type") in SIZED_NODE_DATA_TYPES
+        )
+        if not sized:
+            keys = keys | {"width", "height"}
+        out: dict[str, Any] = {}
+        for k, v in self.without(node, keys).items():
+            if k == "data" and isinstance(v, dict):
+                out[k] = self.value(self.without(v, UI_NODE_DATA_KEYS))
+            elif k == "position" and isinstance(v, dict):
+                out[k] = _round_point(v)
+            else:
+                out[k] = self.value(v)
+        return out
+
+    def edge(self, edge: Any) -> Any:
+        return self.value(self.without(edge, UI_EDGE_KEYS) if isinstance(edge, dict) else edge)
+
+    def graph(self, graph: dict[str, Any]) -> dict[str, Any]:
+        out: dict[str, Any] = {}
+        for k, v in graph.items():
+            if k == "nodes" and isinstance(v, list):
+                out[k] = [self.node(n) for n in v]
+            elif k == "edges" and isinstance(v, list):
+                out[k] = [self.edge(e) for e in v]
+            elif k == "viewport" and isinstance(v, dict):
+                out[k] = {**_round_point(v), **({"zoom": round(v["zoom"], 3)} if _is_number(v.get("zoom")) else {})}
+            else:
+                out[k] = self.value(v)
+        return out
+
+    def document(self, data: dict[str, Any]) -> dict[str, Any]:
+        out: dict[str, Any] = {}
+        for k, v in data.items():
+            if k == "workflow" and isinstance(v, dict) and isinstance(v.get("graph"), dict):
+                out[k] = {wk: (self.graph(wv) if wk == "graph" else self.value(wv)) for wk, wv in v.items()}
+            else:
+                out[k] = self.value(v)
+        return out
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _round_point(point: dict[str, Any]) -> dict[str, Any]:
+    """座標を整数に丸める（1px 未満の差は Studio の表示に影響しない）"""
+    return {k: (round(v) if k in ("x", "y") and _is_number(v) else v) for k, v in point.items()}
+
+
+class _OptimizedDumper(yaml_io.SafeDumper):  # type: ignore[misc, valid-type]
+    """複数行の文字列をブロック (|) で書き、長い文字列は同じオブジェクトならエイリアスにする"""
+
+    alias_min_chars = ALIAS_MIN_CHARS
+
+    def ignore_aliases(self, data: Any) -> bool:
+        # SafeDumper は文字列をエイリアスにしない。文字列は変更できないので共有しても安全
+        if isinstance(data, str) and len(data) >= self.alias_min_chars:
+            return False
+        return super().ignore_aliases(data)
+
+
+def _represent_str(dumper: yaml.SafeDumper, data: str) -> yaml.ScalarNode:
+    # ブロックで書けない文字列（行末の空白など）は emitter が自動でクォートに戻す
+    style = "|" if "\n" in data else None
+    return dumper.represent_scalar("tag:yaml.org,2002:str", data, style=style)
+
+
+_OptimizedDumper.add_representer(str, _represent_str)
+
+
+def dump_optimized(data: Any) -> str:
+    # 長い行を折り返すと改行とインデントの分だけ大きくなるので折り返さない
+    return yaml.dump(data, Dumper=_OptimizedDumper, allow_unicode=True, sort_keys=False, width=1 << 30)
+
+
+def optimize_data(data: dict[str, Any], *, alias_min_chars: int = ALIAS_MIN_CHARS) -> OptimizeResult:
+    """
+    DSL を小さくする（import 前のアップロード量と git の差分を減らす）:
+    - Studio の表示状態（positionAbsolute・selected・dragging、コンテナ以外の width / height）を除く
+    - ノード位置と viewport の座標を整数に丸める
+    - 同じ長い文字列（プロンプトなど）をアンカー / エイリアスで1回だけ書く（辞書やリストは共有しない。
+      import 時にサーバーがノードの設定をその場で書き換えることがあり、共有すると両方に効いてしまうため）
+    - 複数行の文字列をエスケープなしのブロック形式で書き、長い行を折り返さない
+
+    書き出したテキストをパースし直して、最適化後のデータと一致し、正規化 hash（normalize_dsl）が
+    元と同じであることを確認する。一致しなければ DifyConsoleError。original_bytes は呼び出し側で入れる。
+    """
+    opt = _Optimizer(alias_min_chars)
+    new = opt.document(data)
+    text = dump_optimized(new)
+
+    reparsed = parse_dsl(text)
+    if reparsed != new:
+        raise DifyConsoleError("DSL の最適化に失敗しました（書き出した YAML を読み直すと内容が変わります）")
+    if dsl_hash(reparsed) != dsl_hash(data):
+        raise DifyConsoleError("DSL の最適化に失敗しました（正規化したグラフが変わります）")
+    return OptimizeResult(
+        text=text,
+        data=reparsed,
+        original_bytes=0,
+        optimized_bytes=len(text.encode("utf-8")),
+        removed_fields=opt.removed,
+        aliased_strings=sum(n - 1 for n in opt.counts.values() if n > 1),
+    )
+
+
+@lru_cache(maxsize=OPTIMIZE_CACHE_SIZE)
+def optimize_text(text: str) -> OptimizeResult:
+    """YAML テキストを最適化する（同じテキストは2回目からキャッシュを返すので、結果は変更しないこと）"""
+    result = optimize_data(parse_dsl(text))
+    result.original_bytes = len(text.encode("utf-8"))
+    return result
+
+
+def optimize_file(path: str) -> OptimizeResult:
+    return optimize_text(load_dsl_file(path).text)
+
+
+def optimize_document(doc: DslDocument) -> DslDocument:
+    """
+    import で送るテキストを最適化した DslDocument を返す（小さくならなければ doc をそのまま返す）。
+    正規化 hash は変わらないので、--incremental の状態や run cache のキーはそのまま使える。
+    """
+    result = optimize_text(doc.text)
+    if result.optimized_bytes >= result.original_bytes:
+        return doc
+    return DslDocument(text=result.text, data=result.data, path=doc.path)
+
+
+def optimize_from_env(enabled: bool | None = None) -> bool:
+    """--optimize / --no-optimize（enabled）が優先。未指定なら DIFY_OPTIMIZE_DSL=1 で有効"""
+    if enabled is not None:
+        return enabled
+    return os.getenv(OPTIMIZE_ENV, "").strip().lower() in {"1", "true", "on", "yes", "y"}
+
+
+def format_optimize_table(rows: list[dict[str, Any]]) -> str:
+    headers = ["path", "before", "after", "saved", "fields", "aliases"]
+    table = []
+    for r in rows:
+        if "error" in r:
+            table.append([r["path"], "-", "-", "error", "-", "-"])
+            continue
+        saved = r["original_bytes"] - r["optimized_bytes"]
+        table.append(
+            [
+                r["path"],
+                str(r["original_bytes"]),
+                str(r["optimized_bytes"]),
+                f"{saved / r['original_bytes']:.1%}" if r["original_bytes"] else "-",
+                str(r["removed_fields"]),
+                str(r["aliased_strings"]),
+            ]
+        )
+    lines = [format_table(headers, table)]
+    ok = [r for r in rows if "error" not in r]
+    before = sum(r["original_bytes"] for r in ok)
+    after = sum(r["optimized_bytes"] for r in ok)
+    lines.append("")
+    lines.append(
+        f"{len(ok)}/{len(rows)} files, {before} -> {after} bytes"
+        + (f" (-{(before - after) / before:.1%})" if before > after else "")
+    )
+    for r in rows:
+        if "error" in r:
+            lines.append(f"error: {r['path']}: {r['error']}")
+    return "\n".join(lines)
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, field
+from typing import Any
+
+from dify_creator import yaml_io
+from dify_creator.console_client import ConsoleConfig, DifyConsoleClient, session_cache_from_env
+from dify_creator.errors import DifyConsoleError
+from dify_creator.resilience import CircuitBreaker, RetryPolicy
+
+DEFAULT_ENVIRONMENTS_PATH = "environments.yml"
+
+
+def environments_path_from_env() -> str:
+    return os.getenv("DIFY_ENVIRONMENTS", "").strip() or DEFAULT_ENVIRONMENTS_PATH
+
+
+@dataclass
+class Environment:
+    """デプロイ先の Dify 1つ分（URL と認証情報）"""
+
+    name: str
+    base_url: str
+    email: str
+    password: str = field(repr=False)
+    verify_ssl: bool | None = None
+    timeout_s: float | None = None
+
+    def client(self) -> DifyConsoleClient:
+        """
+        この環境用のクライアント（セッション・コネクションプール・サーキットブレーカーは環境ごとに別）。
+        再試行・サーキットブレーカー・プールの設定は DIFY_MAX_RETRIES などの環境変数を共通で使う。
+        """
+        breaker = CircuitBreaker.from_env()
+        config = ConsoleConfig(
+            base_url=self.base_url,
+            verify_ssl=True if self.verify_ssl is None else self.verify_ssl,
+            timeout_s=float(os.getenv("DIFY_TIMEOUT_S", "60")) if self.timeout_s is None else self.timeout_s,
+            pool_maxsize=int(os.getenv("DIFY_POOL_MAXSIZE", "").strip() or 10),
+            retry=RetryPolicy.from_env(),
+            breaker_failures=breaker.failure_threshold,
+            breaker_reset_s=breaker.reset_timeout_s,
+        )
+        return DifyConsoleClient(config, session_cache=session_cache_from_env())
+
+    def logged_in_client(self) -> DifyConsoleClient:
+        client = self.client()
+        client.ensure_login(email=self.email, password_plain=self.password)
+        return client
+
+
+@dataclass
+class EnvironmentsConfig:
+    """
+    環境の定義ファイル (YAML/JSON)。
+
+        environments:
+          staging:
+            base_url: https://staging.dify.example.com
+            email_env: STAGING_DIFY_EMAIL          # 認証情報は環境変数から
+            password_env: STAGING_DIFY_PASSWORD
+          prod-tokyo:
+            env_file: envs/prod-tokyo.env          # DIFY_BASE_URL / DIFY_EMAIL / DIFY_PASSWORD を書いた .env
+          prod-osaka:
+            env_file: envs/prod-osaka.env
+            verify_ssl: false
+        groups:
+          prod: [prod-tokyo, prod-osaka]
+        apps:                                      # 論理名 → 環境ごとの app_id
+          support-bot:
+            staging: 0b6c...
+            prod-tokyo: 9f1e...
+
+    env_file のパスは定義ファイルからの相対パス。base_url / email は直接書いてもよい
+    （password は password_env か env_file で指定する）。
+    """
+
+    environments: dict[str, dict[str, Any]]
+    groups: dict[str, list[str]] = field(default_factory=dict)
+    apps: dict[str, dict[str, str]] = field(default_factory=dict)
+    base_dir: str = "."
+
+    @classmethod
+    def load(cls, path: str | None = None) -> "EnvironmentsConfig":
+        path = path or environments_path_from_env()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = yaml_io.safe_load(f.read())
+        except FileNotFoundError:
+            raise DifyConsoleError(f"環境の定義ファイルが見つかりません: {path}")
+        if not isinstance(data, dict) or not isinstance(data.get("environments"), dict):
+            raise DifyConsoleError(f"環境の定義ファイルの形式が不正です（environments: {{...}} が必要）: {path}")
+        groups = data.get("groups") or {}
+        apps = data.get("apps") or {}
+        if not isinstance(groups, dict) or not isinstance(apps, dict):
+            raise DifyConsoleError(f"groups / apps は object である必要があります: {path}")
+        return cls(
+            environments={str(k): dict(v or {}) for k, v in data["environments"].items()},
+            groups={str(k): [str(n) for n in v or []] for k, v in groups.items()},
+            apps={str(k): {str(e): str(a) for e, a in (v or {}).items()} for k, v in apps.items()},
+            base_dir=os.path.dirname(os.path.abspath(path)),
+        )
+
+    def expand(self, names: list[str]) -> list[str]:
+        """環境名 / グループ名（カンマ区切り可）を重複なしの環境名の列にする"""
+        out: list[str] = []
+        for raw in names:
+            for name in (n.strip() for n in raw.split(",")):
+                if not name:
+                    continue
+                members = self.groups.get(name, [name])
+                for m in members:
+                    if m not in self.environments:
+                        raise DifyConsoleError(f"環境 '{m}' は定義されていません")
+                    if m not in out:
+                        out.append(m)
+        return out
+
+    def environment(self, name: str) -> Environment:
+        spec = self.environments.get(name)
+        if spec is None:
+            raise DifyConsoleError(f"環境 '{name}' は定義されていません")
+        values: dict[str, str] = {}
+        if spec.get("env_file"):
+            values = read_env_file(os.path.join(self.base_dir, str(spec["env_file"])))
+
+        def pick(key: str, env_key: str, *, literal: bool = True) -> str:
+            # 優先順: <key>_env の環境変数 > 定義ファイルに直接書いた値 > env_file
+            env_name = spec.get(f"{key}_env")
+            if env_name:
+                v = os.getenv(str(env_name), "").strip()
+                if not v:
+                    raise DifyConsoleError(f"環境 '{name}': {env_name} が未設定です")
+                return v
+            v = (str(spec.get(key) or "").strip() if literal else "") or values.get(env_key, "").strip()
+            if not v:
+                raise DifyConsoleError(f"環境 '{name}': {key} がありません（{key}_env または env_file の {env_key}）")
+            return v
+
+        return Environment(
+            name=name,
+            base_url=pick("base_url", "DIFY_BASE_URL"),
+            email=pick("email", "DIFY_EMAIL"),
+            password=pick("password", "DIFY_PASSWORD", literal=False),
+            verify_ssl=spec.get("verify_ssl"),
+            timeout_s=spec.get("timeout_s"),
+        )
+
+    def app_id(self, app: str, env: str) -> str | None:
+        return (self.apps.get(app) or {}).get(env)
+
+
+def read_env_file(path: str) -> dict[str, str]:
+    """KEY=VALUE 形式の .env を読む（os.environ には反映しない）"""
+    try:
+        from dotenv import dotenv_values  # type: ignore
+    except Exception:
+        dotenv_values = None
+    if not os.path.exists(path):
+        raise DifyConsoleError(f"env_file が見つかりません: {path}")
+    if dotenv_values is not None:
+        return {k: v for k, v in dotenv_values(path).items() if v is not None}
+
+    out: dict[str, str] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, _, value = line.removeprefix("export ").partition("=")
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+                value = value[1:-1]
+            out[key.strip()] = value
+    return out
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+import requests
+
+from dify_creator.console_client import DifyConsoleClient, DifyConsoleError
+
+
+INDEX_FILE = "index.json"
+DSL_SUFFIX = ".yml"
+# ファイル名末尾の "__<app_id>.yml" から app_id を取り出す（名前が変わったアプリの旧ファイル検出用）
+_APP_FILE_RE = re.compile(r"__([0-9A-Za-z-]+)\.yml$")
+
+
+@dataclass
+class ExportResult:
+    app_id: str
+    name: str
+    mode: str
+    path: str
+    status: str  # "written" | "unchanged" | "error"
+    bytes: int = 0
+    elapsed_s: float = 0.0
+    error: str | None = None
+
+
+def app_file_path(app: dict[str, Any]) -> str:
+    """
+    出力先の相対パス: <mode>/<アプリ名>__<app_id>.yml
+    app_id を含めるので同名アプリがあっても衝突せず、一覧の順序にも依存しない。
+    """
+    mode = re.sub(r"[^\w.-]+", "_", str(app.get("mode") or "unknown"))
+    name = re.sub(r"[^\w.-]+", "_", str(app.get("name") or "")).strip("._")[:80] or "app"
+    return os.path.join(mode, f"{name}__{app['id']}{DSL_SUFFIX}")
+
+
+def write_if_changed(path: str, text: str) -> bool:
+    """内容が同じなら書かない（mtime も変えない）。変わっていれば一時ファイル経由で置き換え、True を返す"""
+    data = text.encode("utf-8")
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=DSL_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return True
+
+
+def _existing_files(out_dir: str) -> dict[str, list[str]]:
+    """out_dir 以下の既存 DSL ファイルを app_id ごとに（相対パス）"""
+    found: dict[str, list[str]] = {}
+    for dirpath, _, filenames in os.walk(out_dir):
+        for name in filenames:
+            m = _APP_FILE_RE.search(name)
+            if m:
+                rel = os.path.relpath(os.path.join(dirpath, name), out_dir)
+                found.setdefault(m.group(1), []).append(rel)
+    return found
+
+
+def export_one(client: DifyConsoleClient, app: dict[str, Any], out_dir: str, *, include_secret: bool) -> ExportResult:
+    rel = app_file_path(app)
+    result = ExportResult(
+        app_id=str(app["id"]), name=str(app.get("name") or ""), mode=str(app.get("mode") or ""), path=rel, status="error"
+    )
+    t0 = time.perf_counter()
+    try:
+        dsl = client.export_app(app_id=result.app_id, include_secret=include_secret)
+        result.bytes = len(dsl.encode("utf-8"))
+        result.status = "written" if write_if_changed(os.path.join(out_dir, rel), dsl) else "unchanged"
+    except (DifyConsoleError, requests.RequestException, OSError) as e:
+        result.error = str(e)
+    result.elapsed_s = time.perf_counter() - t0
+    return result
+
+
+def export_all(
+    client: DifyConsoleClient,
+    out_dir: str,
+    *,
+    workers: int = 8,
+    include_secret: bool = False,
+    page_size: int = 100,
+    prune: bool = False,
+) -> dict[str, Any]:
+    """
+    ワークスペースの全アプリを out_dir 以下に DSL として書き出し、サマリを返す。
+
+    - アプリ一覧のページを取得しながら、届いたアプリから順に並列で export する（1セッションを共有）
+    - 内容が変わったファイルだけを書き換える（git の差分を最小にするため）
+    - 名前が変わったアプリの旧ファイルは削除し（export に失敗したアプリは残す）、
+      prune=True なら一覧にないアプリのファイルも削除する
+    - out_dir/index.json にアプリ一覧（id 順）を書く
+    """
+    workers = max(1, workers)
+    client.set_pool_size(workers)
+    os.makedirs(out_dir, exist_ok=True)
+    existing = _existing_files(out_dir)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = [
+            ex.submit(export_one, client, app, out_dir, include_secret=include_secret)
+            for app in client.iter_apps(limit=page_size)
+        ]
+        results = [f.result() for f in futures]
+    wall_s = time.perf_counter() - t0
+    results.sort(key=lambda r: r.app_id)
+
+    removed: list[str] = []
+    exported = {r.app_id: r.path for r in results}
+    # export に失敗したアプリは新しいファイルがないので、既存のファイルを残す
+    failed = {r.app_id for r in results if r.status == "error"}
+    for app_id, paths in existing.items():
+        if app_id in failed:
+            continue
+        keep = exported.get(app_id)
+        if keep is None and not prune:
+            continue
+        for rel in paths:
+            if rel != keep:
+                os.remove(os.path.join(out_dir, rel))
+                removed.append(rel)
+
+    index = [{"id": r.app_id, "name": r.name, "mode": r.mode, "path": r.path.replace(os.sep, "/")} for r in results]
+    write_if_changed(os.path.join(out_dir, INDEX_FILE), json.dumps(index, ensure_ascii=False, indent=2) + "\n")
+
+    counts: dict[str, int] = {}
+    for r in results:
+        counts[r.status] = counts.get(r.status, 0) + 1
+    return {
+        "apps": len(results),
+        "written": counts.get("written", 0),
+        "unchanged": counts.get("unchanged", 0),
+        "failed": counts.get("error", 0),
+        "removed": sorted(removed),
+        "bytes": sum(r.bytes for r in results),
+        "workers": workers,
+        "wall_s": round(wall_s, 3),
+        "apps_per_s": round(len(results) / wall_s, 3) if wall_s > 0 else None,
+        "http": client.metrics.snapshot(),
+        "errors": [{"app_id": r.app_id, "name": r.name, "error": r.error} for r in results if r.error],
+    }
@@ -0,0 +1,555 @@
+from __future__ import annotations
+
+import copy
+import csv
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import product
+from typing import Any
+
+from dify_creator import yaml_io
+from dify_creator.dsl import parse_dsl
+from dify_creator.errors import DifyConsoleError
+from dify_creator.file_io import read_yaml_file, write_json_file, write_text_file
+from dify_creator.validator import validate_dsl
+
+# テンプレート定義を書くトップレベルのキー（出力する DSL からは除く）
+TEMPLATE_KEY = "template"
+# fanout でコピーしたノードの中だけで使える組み込みパラメータ（1 始まりの番号）
+INDEX_PARAM = "index"
+# {{$name}}。Dify の変数参照 {{#node.var#}} / Jinja2 の {{ var }} / JS の ${...} とは重ならない
+_PARAM_RE = re.compile(r"\{\{\$([A-Za-z_][A-Za-z0-9_]*)\}\}")
+_REF_RE = re.compile(r"\{\{#([^#{}\s]+)#\}\}")
+
+# ノード id を値に持つキー（fanout のコピーで id を付け替える）
+_NODE_ID_KEYS = frozenset({"id", "parentId", "iteration_id", "loop_id", "start_node_id"})
+# コピーしたノードを Studio 上で重ならないよう縦にずらす間隔
+FANOUT_GAP_Y = 40
+
+# load_template のキャッシュに保持するテンプレート数
+TEMPLATE_CACHE_SIZE = 64
+
+
+@dataclass(frozen=True)
+class TemplateParam:
+    name: str
+    default: Any = None
+    required: bool = False
+    description: str = ""
+
+
+@dataclass(frozen=True)
+class FanoutGroup:
+    """nodes を count パラメータの数だけ複製する（id は <id>_1, <id>_2, ...）"""
+
+    nodes: tuple[str, ...]
+    count: str
+
+
+@dataclass(frozen=True)
+class _Param:
+    name: str
+
+
+@dataclass(frozen=True)
+class _Text:
+    parts: tuple[Any, ...]  # str | _Param
+
+
+@dataclass(frozen=True)
+class _Map:
+    items: tuple[tuple[Any, Any], ...]
+
+
+@dataclass(frozen=True)
+class _Seq:
+    items: tuple[Any, ...]
+
+
+@dataclass(frozen=True)
+class _Fanout:
+    group: int
+    node: Any
+
+
+@dataclass
+class CompiledTemplate:
+    """
+    パラメータ付き DSL テンプレートをコンパイルしたもの。
+
+    YAML の文字列中の {{$name}} をパラメータで置き換える。値が {{$name}} だけの場合は
+    型を保ったまま（数値・配列など）置き換える。パラメータと fanout はトップレベルの template に書く:
+
+        template:
+          params:
+            model: {default: gpt-4o-mini}
+            temperature: {default: 0.7}
+            dataset_ids: {required: true}
+            branches: {default: 3}
+          fanout:
+            - nodes: [branch_llm]   # このノード群を branches 個に複製する
+              count: branches
+
+    複製したノードの中では {{$index}}（1 始まり）が使える。複製したノードにつながるエッジも複製し、
+    他のノードからの参照は、変数のリスト（集約ノードの variables、end の outputs など）なら
+    コピーの数だけ展開し、文字列中の {{#id.var#}} は全コピーを空行区切りで並べる。
+    """
+
+    params: dict[str, TemplateParam]
+    fanout: list[FanoutGroup]
+    body: Any
+    path: str | None = None
+
+    def resolve(self, values: dict[str, Any]) -> dict[str, Any]:
+        unknown = sorted(set(values) - set(self.params))
+        if unknown:
+            raise DifyConsoleError(f"テンプレートにないパラメータです: {', '.join(unknown)}")
+        out: dict[str, Any] = {}
+        for name, p in self.params.items():
+            if name in values:
+                out[name] = values[name]
+            elif p.required:
+                raise DifyConsoleError(f"パラメータ '{name}' は必須です")
+            else:
+                out[name] = p.default
+        for g in self.fanout:
+            n = out[g.count]
+            if isinstance(n, bool) or not isinstance(n, int) or n < 1:
+                raise DifyConsoleError(f"fanout のパラメータ '{g.count}' は 1 以上の整数である必要があります: {n!r}")
+        return out
+
+    def render(self, values: dict[str, Any]) -> dict[str, Any]:
+        """パラメータを埋めた DSL（毎回新しいオブジェクト）を返す"""
+        params = self.resolve(values)
+        data = _render(self.body, params, self)
+        if self.fanout:
+            _rewire(data, {nid: g for g in self.fanout for nid in g.nodes}, params)
+        return data
+
+
+def compile_template(text: str, path: str | None = None) -> CompiledTemplate:
+    """テンプレートの YAML をパースし、置き換え箇所を事前に解析する（レンダリングは置き換えとコピーだけ）"""
+    data = parse_dsl(text)
+    spec = data.pop(TEMPLATE_KEY, None) or {}
+    if not isinstance(spec, dict):
+        raise DifyConsoleError(f"'{TEMPLATE_KEY}' は object である必要があります")
+    params = _parse_params(spec.get("params") or {})
+    fanout = _parse_fanout(spec.get("fanout") or [], params)
+
+    nodes = ((data.get("workflow") or {}).get("graph") or {}).get("nodes") or []
+    by_id = {str(n.get("id")): n for n in nodes if isinstance(n, dict)}
+    marks: dict[int, int] = {}
+    for gi, g in enumerate(fanout):
+        for nid in g.nodes:
+            if nid not in by_id:
+                raise DifyConsoleError(f"fanout のノード '{nid}' が workflow.graph.nodes にありません")
+            if id(by_id[nid]) in marks:
+                raise DifyConsoleError(f"ノード '{nid}' が複数の fanout に含まれています")
+            marks[id(by_id[nid])] = gi
+
+    body = _compile(data, marks)
+    used: set[str] = set()
+    used_in_fanout: set[str] = set()
+    _collect_params(body, used, used_in_fanout)
+    undeclared = sorted((used | used_in_fanout) - set(params) - {INDEX_PARAM})
+    if undeclared:
+        raise DifyConsoleError(f"template.params に宣言されていないパラメータです: {', '.join(undeclared)}")
+    if INDEX_PARAM in used:
+        raise DifyConsoleError(f"{{{{${INDEX_PARAM}}}}} は fanout のノードの中でだけ使えます")
+    return CompiledTemplate(params=params, fanout=fanout, body=body, path=path)
+
+
+def _parse_params(raw: Any) -> dict[str, TemplateParam]:
+    if not isinstance(raw, dict):
+        raise DifyConsoleError("template.params は object である必要があります")
+    out: dict[str, TemplateParam] = {}
+    for name, spec in raw.items():
+        if not isinstance(name, str) or not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name):
+            raise DifyConsoleError(f"パラメータ名が不正です: {name!r}")
+        if name == INDEX_PARAM:
+            raise DifyConsoleError(f"'{INDEX_PARAM}' は組み込みのパラメータです")
+        if isinstance(spec, dict):
+            out[name] = TemplateParam(
+                name=name,
+                default=spec.get("default"),
+                required=bool(spec.get("required", False)),
+                description=str(spec.get("description") or ""),
+            )
+        else:
+            out[name] = TemplateParam(name=name, default=spec)  # `name: 既定値` の省略形
+    return out
+
+
+def _parse_fanout(raw: Any, params: dict[str, TemplateParam]) -> list[FanoutGroup]:
+    if not isinstance(raw, list):
+        raise DifyConsoleError("template.fanout は配列である必要があります")
+    out: list[FanoutGroup] = []
+    for i, item in enumerate(raw):
+        nodes = item.get("nodes") if isinstance(item, dict) else None
+        if not isinstance(nodes, list) or not nodes:
+            raise DifyConsoleError(f"template.fanout[{i}] に nodes がありません")
+        count = item.get("count")
+        if count not in params:
+            raise DifyConsoleError(f"template.fanout[{i}].count は params のパラメータ名である必要があります: {count!r}")
+        out.append(FanoutGroup(nodes=tuple(str(n) for n in nodes), count=count))
+    return out
+
+
+def _compile(obj: Any, marks: dict[int, int]) -> Any:
+    if isinstance(obj, str):
+        if "{{$" not in obj:
+            return obj
+        parts: list[Any] = []
+        pos = 0
+        for m in _PARAM_RE.finditer(obj):
+            if m.start() > pos:
+                parts.append(obj[pos : m.start()])
+            parts.append(_Param(m.group(1)))
+            pos = m.end()
+        if pos < len(obj):
+            parts.append(obj[pos:])
+        if len(parts) == 1 and isinstance(parts[0], _Param):
+            return parts[0]
+        return _Text(tuple(parts)) if any(isinstance(p, _Param) for p in parts) else obj
+    if isinstance(obj, dict):
+        compiled = _Map(tuple((_compile(k, marks), _compile(v, marks)) for k, v in obj.items()))
+        group = marks.get(id(obj))
+        return compiled if group is None else _Fanout(group, compiled)
+    if isinstance(obj, list):
+        return _Seq(tuple(_compile(v, marks) for v in obj))
+    return obj
+
+
+def _collect_params(node: Any, used: set[str], used_in_fanout: set[str]) -> None:
+    if isinstance(node, _Param):
+        used.add(node.name)
+    elif isinstance(node, _Text):
+        used.update(p.name for p in node.parts if isinstance(p, _Param))
+    elif isinstance(node, _Map):
+        for k, v in node.items:
+            _collect_params(k, used, used_in_fanout)
+            _collect_params(v, used, used_in_fanout)
+    elif isinstance(node, _Seq):
+        for v in node.items:
+            _collect_params(v, used, used_in_fanout)
+    elif isinstance(node, _Fanout):
+        _collect_params(node.node, used_in_fanout, used_in_fanout)
+
+
+def _render(node: Any, params: dict[str, Any], tpl: CompiledTemplate) -> Any:
+    # 変更されない値（str / 数値）は共有し、dict / list は毎回作り直す
+    if isinstance(node, _Param):
+        return copy.deepcopy(params[node.name])
+    if isinstance(node, _Text):
+        return "".join(_as_text(params[p.name]) if isinstance(p, _Param) else p for p in node.parts)
+    if isinstance(node, _Map):
+        return {_render(k, params, tpl): _render(v, params, tpl) for k, v in node.items}
+    if isinstance(node, _Seq):
+        out: list[Any] = []
+        for item in node.items:
+            if isinstance(item, _Fanout):
+                out.extend(_render_copies(item, params, tpl))
+            else:
+                out.append(_render(item, params, tpl))
+        return out
+    return node
+
+
+def _as_text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _render_copies(item: _Fanout, params: dict[str, Any], tpl: CompiledTemplate) -> list[dict[str, Any]]:
+    group = tpl.fanout[item.group]
+    out: list[dict[str, Any]] = []
+    for k in range(1, params[group.count] + 1):
+        node = _render(item.node, {**params, INDEX_PARAM: k}, tpl)
+        _rename(node, {nid: f"{nid}_{k}" for nid in group.nodes})
+        if k > 1 and not node.get("parentId"):
+            dy = (k - 1) * ((node.get("height") or 100) + FANOUT_GAP_Y)
+            for key in ("position", "positionAbsolute"):
+                pos = node.get(key)
+                if isinstance(pos, dict) and isinstance(pos.get("y"), (int, float)):
+                    pos["y"] = pos["y"] + dy
+        out.append(node)
+    return out
+
+
+def _is_selector(value: Any) -> bool:
+    return isinstance(value, list) and len(value) >= 2 and all(isinstance(v, str) for v in value)
+
+
+def _rename_refs(text: str, mapping: dict[str, str]) -> str:
+    def sub(m: re.Match[str]) -> str:
+        head, _, rest = m.group(1).partition(".")
+        return f"{{{{#{mapping[head]}.{rest}#}}}}" if head in mapping and rest else m.group(0)
+
+    return _REF_RE.sub(sub, text) if "{{#" in text else text
+
+
+def _rename(obj: Any, mapping: dict[str, str]) -> Any:
+    """コピーしたノードの中で、同じグループのノードへの id / セレクタ / {{#id.var#}} を付け替える（破壊的）"""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key in _NODE_ID_KEYS and isinstance(value, str) and value in mapping:
+                obj[key] = mapping[value]
+            elif isinstance(value, str):
+                obj[key] = _rename_refs(value, mapping)
+            else:
+                _rename(value, mapping)
+    elif isinstance(obj, list):
+        if _is_selector(obj) and obj[0] in mapping:
+            obj[0] = mapping[obj[0]]
+            return obj
+        for i, value in enumerate(obj):
+            if isinstance(value, str):
+                obj[i] = _rename_refs(value, mapping)
+            else:
+                _rename(value, mapping)
+    return obj
+
+
+def _rewire(data: dict[str, Any], groups: dict[str, FanoutGroup], params: dict[str, Any]) -> None:
+    """fanout で複製したノードに合わせてエッジと他ノードからの参照を展開する（破壊的）"""
+    copies = {nid: [f"{nid}_{k}" for k in range(1, params[g.count] + 1)] for nid, g in groups.items()}
+    graph = data["workflow"]["graph"]
+
+    edges: list[Any] = []
+    for edge in graph.get("edges") or []:
+        src, tgt = (edge.get("source"), edge.get("target")) if isinstance(edge, dict) else (None, None)
+        if src not in copies and tgt not in copies:
+            edges.append(edge)
+            continue
+        if src in copies and tgt in copies and groups[src] is groups[tgt]:
+            # 同じグループの中のエッジは k 番目のコピー同士をつなぐ
+            group = groups[src]
+            pairs = list(zip(copies[src], copies[tgt]))
+            mappings = [{nid: copies[nid][k] for nid in group.nodes} for k in range(len(pairs))]
+        else:
+            pairs = list(product(copies.get(src, [src]), copies.get(tgt, [tgt])))
+            mappings = [{src: s, tgt: t} for s, t in pairs]
+        for j, ((s, t), mapping) in enumerate(zip(pairs, mappings), start=1):
+            e = _rename(copy.deepcopy(edge), mapping)
+            e.update({"id": f"{edge.get('id')}_{j}", "source": s, "target": t})
+            edges.append(e)
+    graph["edges"] = edges
+
+    for node in graph.get("nodes") or []:
+        if isinstance(node, dict):
+            _expand_refs(node, copies)
+
+
+def _expand_refs(obj: Any, copies: dict[str, list[str]]) -> Any:
+    """複製したノードへの参照を全コピー分に展開する（破壊的）"""
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if isinstance(value, str):
+                obj[key] = _expand_text(value, copies)
+            else:
+                _expand_refs(value, copies)
+        return obj
+    if not isinstance(obj, list):
+        return obj
+    expanded: list[Any] = []
+    for item in obj:
+        if _is_selector(item) and item[0] in copies:
+            # 変数集約ノードの variables: [[id, var], ...]
+            expanded.extend([cid, *item[1:]] for cid in copies[item[0]])
+            continue
+        selector_key = _copied_selector_key(item, copies)
+        if selector_key is not None:
+            # end ノードの outputs: [{variable, value_selector}, ...] など
+            for k, cid in enumerate(copies[item[selector_key][0]], start=1):
+                c = copy.deepcopy(item)
+                c[selector_key][0] = cid
+                if isinstance(c.get("variable"), str):
+                    c["variable"] = f"{c['variable']}_{k}"
+                expanded.append(_expand_refs(c, copies))
+            continue
+        expanded.append(_expand_text(item, copies) if isinstance(item, str) else _expand_refs(item, copies))
+    obj[:] = expanded
+    return obj
+
+
+def _copied_selector_key(item: Any, copies: dict[str, list[str]]) -> str | None:
+    if not isinstance(item, dict):
+        return None
+    for key, value in item.items():
+        if isinstance(key, str) and key.endswith("selector") and _is_selector(value) and value[0] in copies:
+            return key
+    return None
+
+
+def _expand_text(text: str, copies: dict[str, list[str]]) -> str:
+    if "{{#" not in text:
+        return text
+
+    def sub(m: re.Match[str]) -> str:
+        head, _, rest = m.group(1).partition(".")
+        if head not in copies or not rest:
+            return m.group(0)
+        return "\n\n".join(f"{{{{#{cid}.{rest}#}}}}" for cid in copies[head])
+
+    return _REF_RE.sub(sub, text)
+
+
+_template_cache: OrderedDict[str, tuple[int, int, CompiledTemplate]] = OrderedDict()
+_template_cache_lock = threading.Lock()
+
+
+def load_template(path: str) -> CompiledTemplate:
+    """テンプレートを読み込んでコンパイルする。(mtime, サイズ) が変わっていなければプロセス内で再利用する"""
+    st = os.stat(path)
+    key = os.path.realpath(path)
+    with _template_cache_lock:
+        hit = _template_cache.get(key)
+        if hit is not None and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            _template_cache.move_to_end(key)
+            return hit[2]
+
+    try:
+        tpl = compile_template(read_yaml_file(path), path=path)
+    except DifyConsoleError as e:
+        raise DifyConsoleError(f"{path}: {e}")
+    with _template_cache_lock:
+        _template_cache[key] = (st.st_mtime_ns, st.st_size, tpl)
+        _template_cache.move_to_end(key)
+        while len(_template_cache) > TEMPLATE_CACHE_SIZE:
+            _template_cache.popitem(last=False)
+    return tpl
+
+
+# --- バリアント ---
+
+
+@dataclass
+class Variant:
+    id: str
+    values: dict[str, Any]
+
+
+def parse_value(text: str) -> Any:
+    """CSV のセル / --set の値: JSON として読めればその値、読めなければ文字列"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def load_variants(path: str) -> list[Variant]:
+    """
+    バリアント（パラメータの組）を読み込む。"_id" があれば出力ファイル名に使う。
+
+    - .yml / .yaml / .json: パラメータの object の配列、または {variants: [...]}
+    - .jsonl: 1行1バリアント
+    - .csv: ヘッダー行がパラメータ名。セルは JSON として読めればその値（数値・配列など）、空欄は既定値
+    """
+    lower = path.lower()
+    items: list[Any]
+    if lower.endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            items = [{k: parse_value(v) for k, v in row.items() if v != ""} for row in csv.DictReader(f)]
+    elif lower.endswith(".jsonl"):
+        items = []
+        with open(path, "r", encoding="utf-8") as f:
+            for lineno, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise DifyConsoleError(f"{path}:{lineno}: JSON パースエラー: {e}")
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml_io.safe_load(f.read())
+        items = data.get("variants") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise DifyConsoleError(f"バリアントの形式が不正です（配列または variants: [...] が必要）: {path}")
+
+    out: list[Variant] = []
+    for i, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            raise DifyConsoleError(f"{path}: {i} 件目のバリアントは object である必要があります")
+        values = dict(item)
+        out.append(Variant(id=str(values.pop("_id", None) or i), values=values))
+    return out
+
+
+# --- 生成 ---
+
+
+@dataclass
+class GenerateResult:
+    id: str
+    path: str
+    ok: bool
+    errors: list[str] = field(default_factory=list)
+    warnings: int = 0
+
+
+def _file_stem(text: str) -> str:
+    return re.sub(r"[^\w.-]+", "-", text).strip("-.") or "variant"
+
+
+def _generate_one(job: tuple[str, Variant, str, bool]) -> GenerateResult:
+    """1バリアントをレンダリング → 検証 → 書き込み（プロセスプールから呼ばれる）"""
+    template_path, variant, out_path, validate = job
+    try:
+        data = load_template(template_path).render(variant.values)
+    except DifyConsoleError as e:
+        return GenerateResult(variant.id, out_path, False, [str(e)])
+    warnings = 0
+    if validate:
+        issues = validate_dsl(data)
+        errors = [f"[{i.code}] {i.message}" for i in issues if i.severity == "error"]
+        if errors:
+            return GenerateResult(variant.id, out_path, False, errors)
+        warnings = len(issues) - len(errors)
+    write_text_file(out_path, yaml_io.safe_dump(data))
+    return GenerateResult(variant.id, out_path, True, warnings=warnings)
+
+
+def generate(
+    template_path: str,
+    variants: list[Variant],
+    out_dir: str,
+    *,
+    validate: bool = True,
+    workers: int | None = None,
+) -> list[GenerateResult]:
+    """
+    テンプレートから variants の数だけ DSL を生成して out_dir に書き出す（結果は variants の順）。
+    グラフの検証でエラーになったバリアントは書き出さない。
+    テンプレートのコンパイルは各プロセスで1回だけ行う（最初に親プロセスでコンパイルしてエラーを報告する）。
+    """
+    load_template(template_path)
+    stem = os.path.splitext(os.path.basename(template_path))[0]
+    jobs: list[tuple[str, Variant, str, bool]] = []
+    seen: set[str] = set()
+    for i, v in enumerate(variants, start=1):
+        name = _file_stem(v.id if v.id != str(i) else f"{stem}-{i:04d}")
+        if name in seen:
+            raise DifyConsoleError(f"出力ファイル名が重複しています: {name}.yml（_id を確認してください）")
+        seen.add(name)
+        jobs.append((template_path, v, os.path.join(out_dir, f"{name}.yml"), validate))
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [_generate_one(j) for j in jobs]
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(_generate_one, jobs, chunksize=chunksize))
+
+
+def write_manifest(path: str, results: list[GenerateResult]) -> None:
+    """sync-all --manifest で一括 import できる形式で、生成できた DSL を列挙する"""
+    base = os.path.dirname(os.path.abspath(path))
+    apps = [{"dsl": os.path.relpath(os.path.abspath(r.path), base)} for r in results if r.ok]
+    write_json_file(path, {"apps": apps})
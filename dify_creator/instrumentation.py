@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import requests
+
+from dify_creator.resilience import RequestMetrics
+
+
+# パス中の ID（UUID・長い16進/数字）をまとめてエンドポイント単位で集計する
+_ID_SEGMENT_RE = re.compile(r"^(?:[0-9a-fA-F-]{32,36}|[0-9a-fA-F]{16,}|\d+)$")
+# SSE ペイロードの先頭からイベント名だけを取り出す（全イベントを JSON デコードしないため）
+_EVENT_NAME_RE = re.compile(rb'"event"\s*:\s*"([^"]+)"')
+
+DEFAULT_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def endpoint_template(path: str) -> str:
+    """/apps/0b6c.../export -> /apps/{id}/export"""
+    path = path.split("?", 1)[0]
+    return "/".join("{id}" if _ID_SEGMENT_RE.match(seg) else seg for seg in path.split("/"))
+
+
+def sse_event_name(payload: bytes) -> str | None:
+    m = _EVENT_NAME_RE.search(payload, 0, 256)
+    return m.group(1).decode("utf-8", "replace") if m else None
+
+
+def trace_id_from_external(external_trace_id: str) -> str:
+    """
+    external_trace_id を W3C/OpenTelemetry の trace id（32桁の16進）に対応付ける。
+    UUID や 32 桁の16進ならそのまま、それ以外は sha256 の先頭 32 桁。
+    """
+    compact = external_trace_id.replace("-", "").lower()
+    if re.fullmatch(r"[0-9a-f]{32}", compact):
+        return compact
+    return hashlib.sha256(external_trace_id.encode("utf-8")).hexdigest()[:32]
+
+
+@dataclass
+class RequestRecord:
+    """HTTP リクエスト1回分（再試行はそれぞれ別の記録になる）"""
+
+    method: str
+    endpoint: str
+    status: int | None
+    started_at: float  # UNIX 時刻
+    elapsed_s: float  # 送信開始から応答本文の受信完了まで（stream の場合はヘッダー受信まで）
+    ttfb_s: float | None  # 応答ヘッダーを受け取るまで（ネットワーク + サーバー処理）
+    bytes_sent: int = 0
+    bytes_received: int | None = None
+    stream: bool = False
+    external_trace_id: str | None = None
+    error: str | None = None
+
+
+@dataclass
+class StreamRecord:
+    """SSE ストリーム1本分（draft run）"""
+
+    endpoint: str
+    started_at: float  # リクエスト送信時の UNIX 時刻
+    ttfb_s: float | None
+    ttfe_s: float | None  # 最初のイベントを受け取るまで
+    duration_s: float
+    events: int
+    bytes: int
+    event_counts: dict[str, int] = field(default_factory=dict)
+    server_elapsed_s: float | None = None  # workflow_finished の elapsed_time（Dify 側の処理時間）
+    external_trace_id: str | None = None
+
+
+class Instrumentation:
+    """
+    DifyConsoleClient の計測フック。必要なメソッドだけオーバーライドする。
+    フックはリクエストを送ったスレッドから呼ばれるので、状態を持つ場合はスレッドセーフにすること。
+    """
+
+    def on_request(self, record: RequestRecord) -> None:
+        pass
+
+    def on_stream_event(self, endpoint: str, event: str | None, nbytes: int, elapsed_s: float) -> None:
+        pass
+
+    def on_stream_end(self, record: StreamRecord) -> None:
+        pass
+
+    def flush(self) -> None:
+        """プロセス終了時などに溜めた内容を書き出す"""
+
+
+class _Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, v: float) -> None:
+        self.count += 1
+        self.sum += v
+        for i, b in enumerate(self.buckets):
+            if v <= b:
+                self.counts[i] += 1
+
+
+def _labels(pairs: tuple[tuple[str, str], ...]) -> str:
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class PrometheusExporter(Instrumentation):
+    """
+    Prometheus のテキスト形式でメトリクスを出す。
+    path を指定すると flush() で node_exporter の textfile collector 用ファイルとして書き出す。
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        *,
+        metrics: RequestMetrics | None = None,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS_S,
+    ):
+        self.path = path
+        self.metrics = metrics
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[tuple[tuple[str, str], ...], float]] = {}
+        self._histograms: dict[str, dict[tuple[tuple[str, str], ...], _Histogram]] = {}
+
+    def _inc(self, name: str, labels: tuple[tuple[str, str], ...], v: float = 1.0) -> None:
+        series = self._counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0.0) + v
+
+    def _observe(self, name: str, labels: tuple[tuple[str, str], ...], v: float) -> None:
+        series = self._histograms.setdefault(name, {})
+        h = series.get(labels)
+        if h is None:
+            h = series[labels] = _Histogram(self.buckets)
+        h.observe(v)
+
+    def on_request(self, record: RequestRecord) -> None:
+        labels = (("method", record.method), ("endpoint", record.endpoint))
+        status = str(record.status) if record.status is not None else "error"
+        with self._lock:
+            self._inc("dify_client_requests_total", labels + (("status", status),))
+            self._observe("dify_client_request_duration_seconds", labels, record.elapsed_s)
+            if record.ttfb_s is not None:
+                self._observe("dify_client_request_ttfb_seconds", labels, record.ttfb_s)
+            self._inc("dify_client_request_bytes_sent_total", labels, record.bytes_sent)
+            if record.bytes_received is not None:
+                self._inc("dify_client_request_bytes_received_total", labels, record.bytes_received)
+
+    def on_stream_end(self, record: StreamRecord) -> None:
+        labels = (("endpoint", record.endpoint),)
+        with self._lock:
+            self._inc("dify_client_streams_total", labels)
+            self._observe("dify_client_stream_duration_seconds", labels, record.duration_s)
+            if record.ttfe_s is not None:
+                self._observe("dify_client_stream_first_event_seconds", labels, record.ttfe_s)
+            if record.server_elapsed_s is not None:
+                self._observe("dify_client_stream_server_elapsed_seconds", labels, record.server_elapsed_s)
+            self._inc("dify_client_stream_bytes_total", labels, record.bytes)
+            for event, n in record.event_counts.items():
+                self._inc("dify_client_stream_events_total", labels + (("event", event),), n)
+
+    _HELP = {
+        "dify_client_requests_total": ("counter", "HTTP requests to the Dify console API"),
+        "dify_client_request_duration_seconds": ("histogram", "Request latency until the body is received"),
+        "dify_client_request_ttfb_seconds": ("histogram", "Time until response headers (network + server)"),
+        "dify_client_request_bytes_sent_total": ("counter", "Request body bytes sent"),
+        "dify_client_request_bytes_received_total": ("counter", "Response body bytes received (non-streaming)"),
+        "dify_client_streams_total": ("counter", "SSE streams (draft runs) consumed"),
+        "dify_client_stream_duration_seconds": ("histogram", "SSE stream duration from request to last event"),
+        "dify_client_stream_first_event_seconds": ("histogram", "Time from request to the first SSE event"),
+        "dify_client_stream_server_elapsed_seconds": ("histogram", "elapsed_time reported by workflow_finished"),
+        "dify_client_stream_bytes_total": ("counter", "SSE bytes received"),
+        "dify_client_stream_events_total": ("counter", "SSE events received by type"),
+    }
+
+    def render(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name)
+                for labels, v in sorted(series.items()):
+                    lines.append(f"{name}{_labels(labels)} {v:g}")
+            for name, hseries in sorted(self._histograms.items()):
+                self._header(lines, name)
+                for labels, h in sorted(hseries.items()):
+                    for b, c in zip(h.buckets, h.counts):
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', f'{b:g}'),))} {c}")
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {h.count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {h.sum:.6f}")
+                    lines.append(f"{name}_count{_labels(labels)} {h.count}")
+        if self.metrics is not None:
+            snap = self.metrics.snapshot()
+            lines.append("# TYPE dify_client_retries_total counter")
+            for reason, n in sorted(snap["retries_by_reason"].items()):
+                lines.append(f"dify_client_retries_total{_labels((('reason', reason),))} {n}")
+            lines.append("# TYPE dify_client_circuit_opened_total counter")
+            lines.append(f"dify_client_circuit_opened_total {snap['circuit_opened']}")
+            lines.append("# TYPE dify_client_circuit_rejected_total counter")
+            lines.append(f"dify_client_circuit_rejected_total {snap['circuit_rejected']}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: list[str], name: str) -> None:
+        kind, help_text = self._HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    def flush(self) -> None:
+        if not self.path:
+            return
+        # textfile collector が書きかけを読まないよう、一時ファイルから置き換える
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, self.path)
+
+
+class OTelSpanRecorder(Instrumentation):
+    """
+    リクエスト / SSE ストリームを OpenTelemetry 互換のスパン（OTLP/JSON 形式）として記録する。
+    opentelemetry SDK には依存しない。flush() で
+    - endpoint（OTLP/HTTP の受け口。例: http://localhost:4318）があれば {endpoint}/v1/traces に POST
+    - path があればファイルに追記する（flush 1回につき1行の OTLP/JSON。watch のように何度 flush しても前の分を残す）
+
+    draft run の external_trace_id を trace id に対応付けるので、Dify 側のトレース
+    （Langfuse / LangSmith などに送られるもの）と同じ ID で突き合わせられる。
+    """
+
+    def __init__(self, *, path: str | None = None, endpoint: str | None = None, service_name: str = "dify-creator"):
+        self.path = path
+        self.endpoint = endpoint
+        self.service_name = service_name
+        # external_trace_id のないリクエストはこのプロセスの1トレースにまとめる
+        self.trace_id = secrets.token_hex(16)
+        self.spans: list[dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _span(
+        self,
+        name: str,
+        start: float,
+        duration_s: float,
+        attributes: dict[str, Any],
+        *,
+        external_trace_id: str | None,
+        error: str | None = None,
+        events: list[tuple[str, float]] | None = None,
+    ) -> None:
+        start_ns = int(start * 1e9)
+        span: dict[str, Any] = {
+            "traceId": trace_id_from_external(external_trace_id) if external_trace_id else self.trace_id,
+            "spanId": secrets.token_hex(8),
+            "name": name,
+            "kind": 3,  # SPAN_KIND_CLIENT
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(duration_s * 1e9)),
+            "attributes": [_otlp_attr(k, v) for k, v in attributes.items() if v is not None],
+            "status": {"code": 2, "message": error} if error else {"code": 1},
+        }
+        if events:
+            span["events"] = [
+                {"name": ev_name, "timeUnixNano": str(start_ns + int(offset_s * 1e9))} for ev_name, offset_s in events
+            ]
+        with self._lock:
+            self.spans.append(span)
+
+    def on_request(self, record: RequestRecord) -> None:
+        if record.stream:
+            # ストリームは on_stream_end で1スパンにする
+            return
+        self._span(
+            f"{record.method} {record.endpoint}",
+            record.started_at,
+            record.elapsed_s,
+            {
+                "http.request.method": record.method,
+                "url.path": record.endpoint,
+                "http.response.status_code": record.status,
+                "dify.ttfb_s": record.ttfb_s,
+                "http.request.body.size": record.bytes_sent,
+                "http.response.body.size": record.bytes_received,
+                "dify.external_trace_id": record.external_trace_id,
+            },
+            external_trace_id=record.external_trace_id,
+            error=record.error or (f"HTTP {record.status}" if record.status and record.status >= 400 else None),
+        )
+
+    def on_stream_end(self, record: StreamRecord) -> None:
+        events = []
+        if record.ttfb_s is not None:
+            events.append(("response_headers", record.ttfb_s))
+        if record.ttfe_s is not None:
+            events.append(("first_event", record.ttfe_s))
+        overhead = (
+            round(record.duration_s - record.server_elapsed_s, 6) if record.server_elapsed_s is not None else None
+        )
+        self._span(
+            f"POST {record.endpoint}",
+            record.started_at,
+            record.duration_s,
+            {
+                "http.request.method": "POST",
+                "url.path": record.endpoint,
+                "dify.sse.events": record.events,
+                "dify.sse.bytes": record.bytes,
+                "dify.ttfb_s": record.ttfb_s,
+                "dify.ttfe_s": record.ttfe_s,
+                "dify.server_elapsed_s": record.server_elapsed_s,
+                # クライアントから見た時間のうち Dify の処理時間以外（ネットワーク・キュー待ち・クライアント処理）
+                "dify.client_overhead_s": overhead,
+                "dify.external_trace_id": record.external_trace_id,
+            },
+            external_trace_id=record.external_trace_id,
+            events=events,
+        )
+
+    def to_otlp_json(self, spans: list[dict[str, Any]] | None = None) -> dict[str, Any]:
+        if spans is None:
+            with self._lock:
+                spans = list(self.spans)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": [_otlp_attr("service.name", self.service_name)]},
+                    "scopeSpans": [{"scope": {"name": "dify_creator"}, "spans": spans}],
+                }
+            ]
+        }
+
+    def flush(self) -> None:
+        # 書き出し中に記録されたスパンを消さないよう、取り出しと clear を同時に行う
+        with self._lock:
+            spans, self.spans = self.spans, []
+        if not spans:
+            return
+        body = self.to_otlp_json(spans)
+        if self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(body, ensure_ascii=False) + "\n")
+        if self.endpoint:
+            url = self.endpoint.rstrip("/") + "/v1/traces"
+            try:
+                requests.post(url, json=body, timeout=10)
+            except requests.RequestException:
+                # 計測の送信失敗でコマンド自体を失敗させない
+                pass
+
+
+def _otlp_attr(key: str, value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        v: dict[str, Any] = {"boolValue": value}
+    elif isinstance(value, int):
+        v = {"intValue": str(value)}
+    elif isinstance(value, float):
+        v = {"doubleValue": value}
+    else:
+        v = {"stringValue": str(value)}
+    return {"key": key, "value": v}
+
+
+class StreamTracker:
+    """1本の SSE ストリームの TTFE・イベント数などを数え、終了時に StreamRecord をフックに渡す"""
+
+    def __init__(
+        self,
+        hooks: list[Instrumentation],
+        resp: requests.Response,
+        started_at: float,
+        started_perf: float,
+    ):
+        self.hooks = hooks
+        self.endpoint = endpoint_template(_relative_path(resp))
+        self.started_at = started_at
+        self.started_perf = started_perf
+        self.ttfb_s = resp.elapsed.total_seconds() if resp.elapsed else None
+        self.ttfe_s: float | None = None
+        self.events = 0
+        self.bytes = 0
+        self.event_counts: dict[str, int] = {}
+        self.server_elapsed_s: float | None = None
+        self.external_trace_id = resp.request.headers.get("X-External-Trace-Id") if resp.request else None
+
+    def on_payload(self, payload: bytes) -> None:
+        now = time.perf_counter() - self.started_perf
+        if self.ttfe_s is None:
+            self.ttfe_s = now
+        self.events += 1
+        self.bytes += len(payload)
+        event = sse_event_name(payload)
+        key = event or "unknown"
+        self.event_counts[key] = self.event_counts.get(key, 0) + 1
+        if event == "workflow_finished":
+            # このイベントだけはデコードして Dify 側の処理時間を取る
+            try:
+                elapsed = json.loads(payload).get("data", {}).get("elapsed_time")
+            except (ValueError, AttributeError):
+                elapsed = None
+            if isinstance(elapsed, (int, float)):
+                self.server_elapsed_s = float(elapsed)
+        for hook in self.hooks:
+            hook.on_stream_event(self.endpoint, event, len(payload), now)
+
+    def finish(self) -> None:
+        record = StreamRecord(
+            endpoint=self.endpoint,
+            started_at=self.started_at,
+            ttfb_s=self.ttfb_s,
+            ttfe_s=self.ttfe_s,
+            duration_s=time.perf_counter() - self.started_perf,
+            events=self.events,
+            bytes=self.bytes,
+            event_counts=self.event_counts,
+            server_elapsed_s=self.server_elapsed_s,
+            external_trace_id=self.external_trace_id,
+        )
+        for hook in self.hooks:
+            hook.on_stream_end(record)
+
+
+def _relative_path(resp: requests.Response) -> str:
+    """/console/api 以降のパス"""
+    path = requests.utils.urlparse(resp.url).path
+    marker = "/console/api"
+    i = path.find(marker)
+    return path[i + len(marker) :] if i >= 0 else path
+
+
+def instrumentation_from_env(metrics: RequestMetrics | None = None) -> list[Instrumentation]:
+    """
+    環境変数で有効にする計測:
+    - DIFY_PROMETHEUS_FILE: Prometheus テキスト形式の書き出し先（textfile collector 用）
+    - DIFY_OTEL_FILE: OTLP/JSON のスパンの書き出し先（1行1回の flush で追記）
+    - OTEL_EXPORTER_OTLP_ENDPOINT（または OTEL_EXPORTER_OTLP_TRACES_ENDPOINT）: OTLP/HTTP の送信先
+    """
+    hooks: list[Instrumentation] = []
+    prom = os.getenv("DIFY_PROMETHEUS_FILE", "").strip()
+    if prom:
+        hooks.append(PrometheusExporter(prom, metrics=metrics))
+    otel_file = os.getenv("DIFY_OTEL_FILE", "").strip()
+    otel_endpoint = os.getenv("OTEL_EXPORTER_OTLP_TRACES_ENDPOINT", "").strip()
+    if otel_endpoint.endswith("/v1/traces"):
+        otel_endpoint = otel_endpoint[: -len("/v1/traces")]
+    otel_endpoint = otel_endpoint or os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "").strip()
+    if otel_file or otel_endpoint:
+        hooks.append(
+            OTelSpanRecorder(
+                path=otel_file or None,
+                endpoint=otel_endpoint or None,
+                service_name=os.getenv("OTEL_SERVICE_NAME", "").strip() or "dify-creator",
+            )
+        )
+    return hooks
+
@@ -0,0 +1,498 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable
+
+from dify_creator.async_client import AsyncDifyConsoleClient, aiohttp, iter_response_chunks
+from dify_creator.console_client import SSEDecoder, decode_sse_json
+from dify_creator.errors import DifyConsoleError
+from dify_creator.stats import format_table, latency_summary, percentile
+from dify_creator.sync import run_status
+
+DEFAULT_STEP_S = 30.0
+DEFAULT_MAX_INFLIGHT = 1000
+# イベントループの遅延を測る間隔。遅延が大きい = クライアント側が詰まっていて計測が当てにならない
+_LAG_INTERVAL_S = 0.05
+CLIENT_LAG_WARN_MS = 50.0
+# run 1回の失敗として数える例外（それ以外はバグなのでそのまま送出する）
+_RUN_ERRORS: tuple[type[BaseException], ...] = (DifyConsoleError, OSError, asyncio.TimeoutError) + (
+    (aiohttp.ClientError,) if aiohttp is not None else ()
+)
+
+
+@dataclass
+class LoadStep:
+    """ランプの1段。concurrency（同時実行数を一定に保つ）か rate_per_s（開始数/秒を一定にする）のどちらか"""
+
+    index: int
+    duration_s: float
+    concurrency: int | None = None
+    rate_per_s: float | None = None
+
+
+@dataclass
+class Sample:
+    """draft run 1回分の計測値（時刻はテスト開始からの秒）"""
+
+    step: int
+    started_s: float
+    ended_s: float
+    status: str | None
+    ttfe_s: float | None = None  # 最初の SSE イベントまで
+    events: int = 0
+    error: str | None = None
+
+    @property
+    def latency_s(self) -> float:
+        return self.ended_s - self.started_s
+
+
+@dataclass
+class _StepClock:
+    started_s: float = 0.0
+    ended_s: float = 0.0
+    cpu_s: float = 0.0
+    dropped: int = 0
+    lags_ms: list[float] = field(default_factory=list)
+
+
+def parse_levels(spec: str, steps: int | None = None, *, integer: bool = True) -> list[float]:
+    """
+    "8" -> [8]、"1,2,4,16" -> そのまま、"1:64" -> 1 から 64 まで等比に steps 段
+    （steps 省略時は 2 倍ずつ: 1, 2, 4, ..., 64）。integer なら整数に丸めて重複を除く。
+    """
+    spec = spec.strip()
+    if ":" in spec:
+        lo_s, _, hi_s = spec.partition(":")
+        lo, hi = float(lo_s), float(hi_s)
+        if lo <= 0 or hi < lo:
+            raise DifyConsoleError(f"ランプの指定が不正です（START:END, 0 < START <= END）: {spec}")
+        n = steps or int(math.floor(math.log2(hi / lo))) + 1
+        n = max(1, n)
+        levels = [lo * (hi / lo) ** (i / (n - 1)) if n > 1 else lo for i in range(n)]
+        levels[-1] = hi
+    else:
+        levels = [float(v) for v in spec.split(",") if v.strip()]
+    if not levels or any(v <= 0 for v in levels):
+        raise DifyConsoleError(f"負荷の指定が不正です（正の数）: {spec}")
+    if not integer:
+        return [round(v, 3) for v in levels]
+    out: list[float] = []
+    for v in levels:
+        v = float(max(1, round(v)))
+        if v not in out:
+            out.append(v)
+    return out
+
+
+def build_steps(
+    *,
+    concurrency: str | None = None,
+    rate: str | None = None,
+    steps: int | None = None,
+    step_s: float | None = None,
+    duration_s: float | None = None,
+) -> list[LoadStep]:
+    """
+    --concurrency（クローズドループ）か --rate（一定の到着率、オープンループ）からランプの段を作る。
+    各段の長さは step_s、または duration_s を段数で割ったもの。
+    """
+    if (concurrency is None) == (rate is None):
+        raise DifyConsoleError("--concurrency と --rate のどちらか一方を指定してください")
+    levels = parse_levels(concurrency or rate or "", steps, integer=concurrency is not None)
+    if step_s is None:
+        step_s = duration_s / len(levels) if duration_s else DEFAULT_STEP_S
+    if step_s <= 0:
+        raise DifyConsoleError("段の長さは正の秒数である必要があります")
+    return [
+        LoadStep(
+            index=i,
+            duration_s=step_s,
+            concurrency=int(v) if concurrency is not None else None,
+            rate_per_s=v if rate is not None else None,
+        )
+        for i, v in enumerate(levels)
+    ]
+
+
+async def _one_run(
+    client: AsyncDifyConsoleClient,
+    app_id: str,
+    inputs: dict[str, Any],
+    *,
+    step: int,
+    t0: float,
+    max_wait_s: float | None,
+) -> Sample:
+    """
+    draft run を1回実行して計測する。クライアントが律速にならないよう、イベントは SSEDecoder で
+    分割して数えるだけにし、JSON として解析するのは task_id 用の最初のイベントとステータス判定用の
+    最後のイベントだけにする。
+
+    max_wait_s は開始からの壁時計の上限で、イベントが届かなくても適用される。超えた run は
+    timeout として数え、サーバー側のワークフローを停止する（止めないと負荷が残り、次の段の計測が歪む）。
+    """
+    started = time.perf_counter()
+    ttfe: float | None = None
+    events = 0
+    last: bytes | None = None
+    task_id: str | None = None
+    # 期限までは読み取りタイムアウトで切らない（期限は wait_for が守る）
+    timeout_s = max(client.config.timeout_s, max_wait_s + 1.0) if max_wait_s is not None else None
+
+    async def read() -> None:
+        nonlocal ttfe, events, last, task_id
+        resp = await client.run_draft_workflow_stream(app_id=app_id, inputs=inputs, timeout_s=timeout_s)
+        decoder = SSEDecoder()
+        try:
+            async for chunk in iter_response_chunks(resp):
+                payloads = decoder.feed(chunk)
+                if payloads:
+                    if ttfe is None:
+                        ttfe = time.perf_counter() - started
+                        first = decode_sse_json(payloads[0])
+                        task_id = first.get("task_id") if first else None
+                    events += len(payloads)
+                    last = payloads[-1]
+                if decoder.done:
+                    return
+            rest = decoder.flush()
+            if rest:
+                events += len(rest)
+                last = rest[-1]
+        finally:
+            resp.release()
+
+    try:
+        await asyncio.wait_for(read(), max_wait_s)
+    except asyncio.TimeoutError as e:
+        # aiohttp の読み取りタイムアウトも asyncio.TimeoutError なので、wait_for の期限切れと区別する
+        ended = time.perf_counter()
+        if max_wait_s is None or (aiohttp is not None and isinstance(e, aiohttp.ServerTimeoutError)):
+            return Sample(step, started - t0, ended - t0, "error", ttfe, events, str(e) or type(e).__name__)
+        await client.stop_after_timeout(app_id=app_id, task_id=task_id)
+        return Sample(step, started - t0, ended - t0, "timeout", ttfe, events)
+    except _RUN_ERRORS as e:
+        return Sample(step, started - t0, time.perf_counter() - t0, "error", ttfe, events, str(e) or type(e).__name__)
+
+    ended = time.perf_counter()
+    last_event = decode_sse_json(last) if last is not None else None
+    status = run_status({"last_event": last_event}) if last_event else "no_events"
+    error = None
+    if status != "succeeded" and last_event:
+        data = last_event.get("data")
+        error = (data.get("error") if isinstance(data, dict) else None) or last_event.get("message")
+    return Sample(step, started - t0, ended - t0, status, ttfe, events, error)
+
+
+class LoadRunner:
+    """
+    1プロセス・1イベントループで draft run を流し続ける。コネクションは AsyncDifyConsoleClient の
+    TCPConnector を共有するので、同時実行数を増やしてもスレッドやソケットの作り直しは発生しない。
+
+    - concurrency の段: 同時に走っている run が常に concurrency 本になるよう、終わった run の次をすぐ開始する
+    - rate の段: 前の run の終わりを待たず 1/rate 秒ごとに開始する（max_inflight を超える分は dropped として数える）
+
+    run は開始した段に属する。最後の段が終わったら新しい run は開始せず、実行中のものの終了を待つ。
+    """
+
+    def __init__(
+        self,
+        client: AsyncDifyConsoleClient,
+        app_id: str,
+        inputs: list[dict[str, Any]],
+        steps: list[LoadStep],
+        *,
+        max_wait_s: float | None = None,
+        max_inflight: int = DEFAULT_MAX_INFLIGHT,
+        on_step: Callable[[LoadStep, dict[str, Any]], None] | None = None,
+    ):
+        if not inputs:
+            raise DifyConsoleError("inputs がありません")
+        self.client = client
+        self.app_id = app_id
+        self.inputs = inputs
+        self.steps = steps
+        self.max_wait_s = max_wait_s
+        self.max_inflight = max(1, max_inflight)
+        self.on_step = on_step  # 段が終わるたびに (LoadStep, step の集計) で呼ばれる（進捗表示用）
+        self.samples: list[Sample] = []
+        self.clocks = [_StepClock() for _ in steps]
+        self._step = 0
+        self._target = 0
+        self._stop = False
+        self._inflight: set[asyncio.Task[None]] = set()
+        self._seq = 0
+        self._t0 = 0.0
+
+    def _next_inputs(self) -> dict[str, Any]:
+        inputs = self.inputs[self._seq % len(self.inputs)]
+        self._seq += 1
+        return inputs
+
+    async def _run_once(self) -> None:
+        sample = await _one_run(
+            self.client, self.app_id, self._next_inputs(), step=self._step, t0=self._t0, max_wait_s=self.max_wait_s
+        )
+        self.samples.append(sample)
+
+    async def _worker(self, slot: int) -> None:
+        while not self._stop and slot < self._target:
+            await self._run_once()
+
+    def _spawn(self, coro: Any) -> asyncio.Task[None]:
+        task = asyncio.ensure_future(coro)
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+        return task
+
+    async def _monitor_lag(self) -> None:
+        while not self._stop:
+            t = time.perf_counter()
+            await asyncio.sleep(_LAG_INTERVAL_S)
+            lag = time.perf_counter() - t - _LAG_INTERVAL_S
+            self.clocks[self._step].lags_ms.append(max(0.0, lag) * 1000)
+
+    async def run(self) -> list[Sample]:
+        self._t0 = time.perf_counter()
+        monitor = asyncio.ensure_future(self._monitor_lag())
+        workers: dict[int, asyncio.Task[None]] = {}
+        try:
+            for step in self.steps:
+                self._step = step.index
+                clock = self.clocks[step.index]
+                clock.started_s = time.perf_counter() - self._t0
+                cpu0 = time.process_time()
+                end = time.perf_counter() + step.duration_s
+                if step.concurrency is not None:
+                    self._target = step.concurrency
+                    for slot in range(step.concurrency):
+                        if slot not in workers or workers[slot].done():
+                            workers[slot] = self._spawn(self._worker(slot))
+                    await asyncio.sleep(max(0.0, end - time.perf_counter()))
+                else:
+                    self._target = 0  # 前の段のワーカーは今の run を終えたら止まる
+                    await self._arrivals(step, end)
+                clock.ended_s = time.perf_counter() - self._t0
+                clock.cpu_s = time.process_time() - cpu0
+                if self.on_step is not None:
+                    self.on_step(step, self.step_stats(step))
+        finally:
+            self._stop = True
+            self._target = 0
+            if self._inflight:
+                await asyncio.gather(*self._inflight, return_exceptions=True)
+            monitor.cancel()
+        return self.samples
+
+    async def _arrivals(self, step: LoadStep, end: float) -> None:
+        interval = 1.0 / (step.rate_per_s or 1.0)
+        at = time.perf_counter()
+        while at < end:
+            if len(self._inflight) >= self.max_inflight:
+                self.clocks[step.index].dropped += 1
+            else:
+                self._spawn(self._run_once())
+            at += interval
+            delay = at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def step_stats(self, step: LoadStep) -> dict[str, Any]:
+        return step_stats(step, self.samples, self.clocks[step.index])
+
+
+def step_stats(step: LoadStep, samples: list[Sample], clock: _StepClock) -> dict[str, Any]:
+    """
+    段ごとの集計。レイテンシ・TTFE・エラー率はその段で開始した run、スループット（runs/s・events/s）は
+    その段の時間内に終わった run で計算する（終わるまでに時間がかかる run は次の段の完了数に入る）。
+    """
+    started = [s for s in samples if s.step == step.index]
+    window = max(clock.ended_s - clock.started_s, 1e-9) if clock.ended_s else step.duration_s
+    finished = [s for s in samples if clock.started_s <= s.ended_s < (clock.ended_s or math.inf)]
+    ok = [s for s in started if s.status == "succeeded"]
+    errors = [s for s in started if s.status != "succeeded"]
+    statuses: dict[str, int] = {}
+    for s in started:
+        key = s.status or "unknown"
+        statuses[key] = statuses.get(key, 0) + 1
+    lags = sorted(clock.lags_ms)
+    return {
+        "step": step.index,
+        "concurrency": step.concurrency,
+        "rate_per_s": step.rate_per_s,
+        "duration_s": round(window, 3),
+        "started": len(started),
+        "succeeded": len(ok),
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(started), 4) if started else None,
+        "statuses": statuses,
+        "dropped": clock.dropped,
+        "throughput_per_s": round(sum(1 for s in finished if s.status == "succeeded") / window, 3),
+        "events_per_s": round(sum(s.events for s in finished) / window, 1),
+        "ttfe_s": latency_summary(s.ttfe_s for s in ok if s.ttfe_s is not None),
+        "latency_s": latency_summary(s.latency_s for s in ok),
+        "client_loop_lag_ms_p99": round(percentile(lags, 99), 1) if lags else None,  # type: ignore[arg-type]
+        "client_cpu": round(clock.cpu_s / window, 3),
+    }
+
+
+def find_knee(
+    steps: list[dict[str, Any]],
+    *,
+    min_gain: float = 0.1,
+    latency_factor: float = 2.0,
+    max_error_rate: float = 0.05,
+) -> dict[str, Any]:
+    """
+    飽和点（knee）を探す。負荷を上げた段で次のどれかが起きたら、その1つ前の段を knee とする:
+    - スループットがそれまでの最大から min_gain（既定 10%）以上伸びない
+    - p95 レイテンシが最初の段の latency_factor 倍（既定 2 倍）を超える
+    - エラー率が max_error_rate（既定 5%）を超える
+    最後まで起きなければ saturated=False（もっと負荷を上げる余地がある）。
+    """
+    usable = [s for s in steps if s["started"]]
+    if not usable:
+        return {"saturated": False, "knee": None, "reason": "no runs"}
+    base_p95 = usable[0]["latency_s"]["p95"]
+    best = usable[0]
+    prev = usable[0]
+    if (usable[0]["error_rate"] or 0) > max_error_rate:
+        return {"saturated": True, "knee": None, "reason": f"errors {usable[0]['error_rate']:.0%} at the first step"}
+    for s in usable[1:]:
+        reasons = []
+        if (s["error_rate"] or 0) > max_error_rate:
+            reasons.append(f"errors {s['error_rate']:.0%}")
+        p95 = s["latency_s"]["p95"]
+        if base_p95 and p95 is not None and p95 > base_p95 * latency_factor:
+            reasons.append(f"p95 latency {p95 / base_p95:.1f}x the first step")
+        if s["throughput_per_s"] < best["throughput_per_s"] * (1 + min_gain):
+            gain = s["throughput_per_s"] / best["throughput_per_s"] - 1 if best["throughput_per_s"] else 0.0
+            reasons.append(f"throughput {gain:+.1%} vs best")
+        if reasons:
+            return {"saturated": True, "knee": _knee_point(prev), "at": _knee_point(s), "reason": ", ".join(reasons)}
+        if s["throughput_per_s"] > best["throughput_per_s"]:
+            best = s
+        prev = s
+    return {"saturated": False, "knee": _knee_point(prev), "reason": "no saturation up to the last step"}
+
+
+def _knee_point(s: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "step": s["step"],
+        "concurrency": s["concurrency"],
+        "rate_per_s": s["rate_per_s"],
+        "throughput_per_s": s["throughput_per_s"],
+        "latency_p95_s": s["latency_s"]["p95"],
+    }
+
+
+def run_loadtest(
+    app_id: str,
+    inputs: list[dict[str, Any]],
+    steps: list[LoadStep],
+    *,
+    email: str,
+    password: str,
+    max_wait_s: float | None = None,
+    max_inflight: int = DEFAULT_MAX_INFLIGHT,
+    on_step: Callable[[LoadStep, dict[str, Any]], None] | None = None,
+) -> tuple[list[Sample], dict[str, Any]]:
+    """ログインしてランプを最後まで流し、(run ごとの計測値, レポート) を返す"""
+    peak = max(s.concurrency or 0 for s in steps) or max_inflight
+
+    async def main() -> tuple[list[Sample], LoadRunner, float]:
+        async with AsyncDifyConsoleClient.from_env(max_connections=peak) as client:
+            await client.ensure_login(email=email, password_plain=password)
+            runner = LoadRunner(
+                client, app_id, inputs, steps, max_wait_s=max_wait_s, max_inflight=max_inflight, on_step=on_step
+            )
+            t0 = time.perf_counter()
+            samples = await runner.run()
+            return samples, runner, time.perf_counter() - t0
+
+    samples, runner, wall_s = asyncio.run(main())
+    stats = [runner.step_stats(s) for s in steps]
+    lags = [s["client_loop_lag_ms_p99"] for s in stats if s["client_loop_lag_ms_p99"] is not None]
+    report = {
+        "app_id": app_id,
+        "mode": "concurrency" if steps and steps[0].concurrency is not None else "rate",
+        "wall_s": round(wall_s, 3),
+        "runs": len(samples),
+        "succeeded": sum(1 for s in samples if s.status == "succeeded"),
+        "steps": stats,
+        "knee": find_knee(stats),
+        # イベントループが詰まっていると TTFE・レイテンシにクライアント側の待ちが混ざる
+        "client_bottleneck": bool(lags) and max(lags) > CLIENT_LAG_WARN_MS,
+    }
+    return samples, report
+
+
+def write_samples(path: str, samples: list[Sample]) -> None:
+    """run ごとの計測値を JSONL で書き出す"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for s in samples:
+            row = asdict(s)
+            row["latency_s"] = round(s.latency_s, 4)
+            for k in ("started_s", "ended_s", "ttfe_s"):
+                if row[k] is not None:
+                    row[k] = round(row[k], 4)
+            f.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")))
+            f.write("\n")
+
+
+def _fmt(v: float | None, spec: str = ".2f") -> str:
+    return "-" if v is None else format(v, spec)
+
+
+def format_step_row(s: dict[str, Any]) -> list[str]:
+    return [
+        str(s["step"]),
+        str(s["concurrency"]) if s["concurrency"] is not None else f"{s['rate_per_s']:g}/s",
+        str(s["started"]),
+        _fmt(s["error_rate"] * 100 if s["error_rate"] is not None else None, ".1f"),
+        f"{s['throughput_per_s']:.2f}",
+        f"{s['events_per_s']:.0f}",
+        _fmt(s["ttfe_s"]["p50"]),
+        _fmt(s["ttfe_s"]["p95"]),
+        _fmt(s["latency_s"]["p50"]),
+        _fmt(s["latency_s"]["p95"]),
+        _fmt(s["latency_s"]["p99"]),
+        _fmt(s["client_loop_lag_ms_p99"], ".0f"),
+    ]
+
+
+_HEADERS = ["step", "load", "runs", "err%", "runs/s", "ev/s", "ttfe50", "ttfe95", "lat50", "lat95", "lat99", "lag99ms"]
+
+
+def format_loadtest_table(report: dict[str, Any]) -> str:
+    table = [format_step_row(s) for s in report["steps"]]
+    lines = [format_table(_HEADERS, table, align="right")]
+    lines.append("")
+    knee = report["knee"]
+    point = knee.get("knee")
+    if point is not None:
+        load = (
+            f"concurrency {point['concurrency']}"
+            if point["concurrency"] is not None
+            else f"{point['rate_per_s']:g} runs/s"
+        )
+        lines.append(
+            f"knee: {load} ({point['throughput_per_s']:.2f} runs/s, p95 {_fmt(point['latency_p95_s'])}s)"
+            + (f"; next step: {knee['reason']}" if knee["saturated"] else f"; {knee['reason']}")
+        )
+    else:
+        lines.append(f"knee: - ({knee['reason']})")
+    lines.append(f"{report['succeeded']}/{report['runs']} runs succeeded in {report['wall_s']:.1f}s")
+    if report["client_bottleneck"]:
+        lines.append(
+            f"warning: client event loop lag exceeded {CLIENT_LAG_WARN_MS:.0f}ms; "
+            "latencies include client-side delay (run from a larger machine or lower the load)"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from dify_creator.dsl import DslDocument
+from dify_creator.environments import Environment
+from dify_creator.errors import DifyConsoleError
+from dify_creator.stats import format_table
+from dify_creator.sync import import_unless_unchanged
+
+
+@dataclass
+class PromoteTarget:
+    env: Environment
+    app_id: str | None  # None なら新規作成
+
+
+@dataclass
+class PromoteResult:
+    target: str
+    base_url: str
+    ok: bool
+    app_id: str | None = None
+    status: str | None = None
+    created: bool = False
+    skipped: bool = False  # diff_remote で差分がなく import を省略した
+    login_s: float = 0.0
+    import_s: float = 0.0
+    elapsed_s: float = 0.0
+    error: str | None = None
+
+
+def promote_one(target: PromoteTarget, doc: DslDocument, *, diff_remote: bool = False) -> PromoteResult:
+    """1環境分のログイン -> import (-> confirm)。例外は結果の error に入れて返す"""
+    env = target.env
+    res = PromoteResult(target=env.name, base_url=env.base_url, ok=False, app_id=target.app_id)
+    t0 = time.perf_counter()
+    try:
+        client = env.logged_in_client()
+        t1 = time.perf_counter()
+        res.login_s = t1 - t0
+        import_result, app_id, skipped = import_unless_unchanged(
+            client, doc=doc, app_id=target.app_id, diff_remote=diff_remote
+        )
+        res.import_s = time.perf_counter() - t1
+        res.app_id = app_id
+        res.status = import_result.get("status")
+        res.skipped = skipped
+        res.created = target.app_id is None
+        res.ok = res.status != "failed"
+        if not res.ok:
+            res.error = str(import_result.get("error") or import_result)
+    except (DifyConsoleError, ValueError, OSError) as e:
+        res.error = str(e)
+        res.status = "error"
+    res.elapsed_s = time.perf_counter() - t0
+    return res
+
+
+def promote(
+    doc: DslDocument,
+    targets: list[PromoteTarget],
+    *,
+    diff_remote: bool = False,
+    workers: int | None = None,
+) -> list[PromoteResult]:
+    """
+    同じ DSL を全ターゲットへ並列に import する（結果は targets の順）。
+    ターゲットごとに別のクライアント（セッション・コネクションプール）を使うので、
+    全体の所要時間はいちばん遅いターゲットの時間にほぼ等しい。一部が失敗しても残りは続ける。
+    """
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, workers or len(targets))) as ex:
+        return list(ex.map(lambda t: promote_one(t, doc, diff_remote=diff_remote), targets))
+
+
+def promote_summary(
+    results: list[PromoteResult], *, source: dict[str, Any], export_s: float, wall_s: float
+) -> dict[str, Any]:
+    return {
+        "source": source,
+        "total": len(results),
+        "succeeded": sum(1 for r in results if r.ok),
+        "failed": sum(1 for r in results if not r.ok),
+        "export_s": round(export_s, 3),
+        "wall_s": round(wall_s, 3),
+        "slowest_target_s": round(max((r.elapsed_s for r in results), default=0.0), 3),
+        "sum_target_s": round(sum(r.elapsed_s for r in results), 3),
+        "targets": [
+            {
+                **asdict(r),
+                "login_s": round(r.login_s, 3),
+                "import_s": round(r.import_s, 3),
+                "elapsed_s": round(r.elapsed_s, 3),
+            }
+            for r in results
+        ],
+    }
+
+
+def format_promote_table(summary: dict[str, Any]) -> str:
+    rows = summary["targets"]
+    headers = ["target", "app_id", "status", "login_s", "import_s", "elapsed_s"]
+    table = [
+        [
+            r["target"],
+            r["app_id"] or "-",
+            ("created " if r["created"] and r["ok"] else "") + (r["status"] or "-"),
+            f"{r['login_s']:.2f}",
+            f"{r['import_s']:.2f}",
+            f"{r['elapsed_s']:.2f}",
+        ]
+        for r in rows
+    ]
+    lines = [format_table(headers, table)]
+    lines.append("")
+    lines.append(
+        f"{summary['succeeded']}/{summary['total']} succeeded, export {summary['export_s']:.2f}s, "
+        f"wall {summary['wall_s']:.2f}s (slowest target {summary['slowest_target_s']:.2f}s, "
+        f"sum {summary['sum_target_s']:.2f}s)"
+    )
+    for r in rows:
+        if r["error"]:
+            lines.append(f"error: {r['target']}: {r['error']}")
+    return "\n".join(lines)
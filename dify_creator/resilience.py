@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+
+# サーバー側の一時的な過負荷/障害を示すステータス
+RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
+# リクエストが処理されていないことが明らかなステータス（非冪等なリクエストでも再送してよい）
+NOT_PROCESSED_STATUSES = frozenset({429, 503})
+
+
+def _env_float(name: str, default: float) -> float:
+    v = os.getenv(name, "").strip()
+    return float(v) if v else default
+
+
+def _env_int(name: str, default: int) -> int:
+    v = os.getenv(name, "").strip()
+    return int(v) if v else default
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    指数バックオフ (full jitter) による再試行ポリシー。Retry-After ヘッダーがあればそれに従う。
+    max_retries=0 で再試行しない。
+    """
+
+    max_retries: int = 3
+    backoff_base_s: float = 0.5
+    backoff_max_s: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        return cls(
+            max_retries=_env_int("DIFY_MAX_RETRIES", cls.max_retries),
+            backoff_base_s=_env_float("DIFY_BACKOFF_BASE_S", cls.backoff_base_s),
+            backoff_max_s=_env_float("DIFY_BACKOFF_MAX_S", cls.backoff_max_s),
+        )
+
+    def delay_s(self, attempt: int, retry_after: str | None = None) -> float:
+        """attempt 回目 (0 始まり) の再試行までの待ち時間"""
+        if retry_after:
+            parsed = parse_retry_after(retry_after)
+            if parsed is not None:
+                return min(parsed, self.backoff_max_s)
+        return random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2**attempt)))
+
+
+def parse_retry_after(value: str) -> float | None:
+    """Retry-After (秒数 または HTTP-date) を秒に変換する"""
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    連続 failure_threshold 回リクエストが失敗（再試行後も）したら開き、reset_timeout_s の間は
+    リクエストを送らずに即座に失敗させる。経過後は1件だけ試し（half-open）、成功すれば閉じる。
+    failure_threshold=0 で無効。
+    """
+
+    @classmethod
+    def from_env(cls) -> "CircuitBreaker":
+        return cls(
+            failure_threshold=_env_int("DIFY_CB_FAILURES", 5),
+            reset_timeout_s=_env_float("DIFY_CB_RESET_S", 30.0),
+        )
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout_s:
+                return "half-open"
+            return "open"
+
+    @property
+    def consecutive_failures(self) -> int:
+        return self._failures
+
+    def before_request(self) -> float | None:
+        """送ってよければ None、開いている場合は閉じるまでの残り秒数を返す"""
+        if not self.failure_threshold:
+            return None
+        with self._lock:
+            if self._opened_at is None:
+                return None
+            remaining = self.reset_timeout_s - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._trial_in_flight:
+                return max(remaining, 0.0)
+            self._trial_in_flight = True
+            return None
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """half-open の試行リクエストが成功・失敗のどちらとも言えずに終わったとき、次の試行を許可する"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> bool:
+        """失敗を記録し、これで開いた場合は True"""
+        if not self.failure_threshold:
+            return False
+        with self._lock:
+            self._failures += 1
+            was_open = self._opened_at is not None
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+            return not was_open and self._opened_at is not None
+
+
+class RequestMetrics:
+    """リクエスト数・再試行回数（理由別）などのスレッドセーフなカウンタ"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.circuit_opened = 0
+        self.circuit_rejected = 0
+        self.retry_wait_s = 0.0
+        self.retries_by_reason: dict[str, int] = {}
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def count_retry(self, reason: str, wait_s: float) -> None:
+        with self._lock:
+            self.retries += 1
+            self.retry_wait_s += wait_s
+            self.retries_by_reason[reason] = self.retries_by_reason.get(reason, 0) + 1
+
+    def count_failure(self, opened: bool) -> None:
+        with self._lock:
+            self.failures += 1
+            if opened:
+                self.circuit_opened += 1
+
+    def count_rejected(self) -> None:
+        with self._lock:
+            self.circuit_rejected += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "retries_by_reason": dict(self.retries_by_reason),
+                "retry_wait_s": round(self.retry_wait_s, 3),
+                "failures": self.failures,
+                "circuit_opened": self.circuit_opened,
+                "circuit_rejected": self.circuit_rejected,
+            }
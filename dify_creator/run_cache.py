@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import time
+from typing import Any
+
+DEFAULT_CACHE_DIR = os.path.join(".dify-creator", "run_cache")
+DEFAULT_TTL_S = 7 * 86400
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+_OFF = {"0", "false", "off", "no", "n"}
+_ON = {"1", "true", "on", "yes", "y"}
+
+
+class RunCache:
+    """
+    draft run の結果キャッシュ（opt-in）。
+    キーは base_url + app_id + 正規化 DSL hash + inputs hash。同じ DSL を同じ inputs で実行した
+    成功結果を再利用し、LLM の呼び出しを省く。
+
+    - 1キー = 1ファイル (<dir>/<sha256(key)>.json.gz)。mtime は保存時刻 (cached_at)、atime は最終利用時刻
+    - 保存から ttl_s を過ぎたエントリはヒットしない（次の put か evict で消える。使われ続けても延びない）
+    - 合計サイズが max_bytes を超えたら最終利用時刻の古い順に消す (LRU)
+    """
+
+    def __init__(self, root: str | None = None, *, ttl_s: float = DEFAULT_TTL_S, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root or DEFAULT_CACHE_DIR
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(base_url: str, app_id: str, dsl_hash: str, inputs_hash: str) -> str:
+        return f"{base_url.rstrip('/')}|{app_id}|{dsl_hash}|{inputs_hash}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json.gz")
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """ヒットすれば {"run_result", "cached_at"} を返す（期限切れ・壊れたファイルは None）"""
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get("key") != key:
+            return None
+        if time.time() - (entry.get("cached_at") or 0) > self.ttl_s:
+            return None
+        try:
+            # LRU 用に atime だけ更新する（mtime は期限の判定に使う保存時刻のまま）
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, run_result: dict[str, Any]) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        cached_at = round(time.time(), 3)
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump({"key": key, "cached_at": cached_at, "run_result": run_result}, f, ensure_ascii=False)
+        os.utime(tmp, (cached_at, cached_at))
+        os.replace(tmp, path)
+        self.evict()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self) -> int:
+        """期限切れ（mtime = cached_at 基準）と max_bytes 超過分（atime = 最終利用時刻の古い順）を消し、消したファイル数を返す"""
+        try:
+            names = [n for n in os.listdir(self.root) if n.endswith(".json.gz")]
+        except FileNotFoundError:
+            return 0
+        files: list[tuple[float, float, int, str]] = []
+        for name in names:
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue  # 他のプロセスが消した
+            files.append((st.st_atime, st.st_mtime, st.st_size, path))
+
+        cutoff = time.time() - self.ttl_s
+        # 期限切れは使われ方に関係なく消し、残りは合計が max_bytes 以下になるまで最終利用時刻の古い順に消す
+        victims = [path for _, mtime, _, path in files if mtime < cutoff]
+        live = sorted(f for f in files if f[1] >= cutoff)
+        total = sum(size for _, _, size, _ in live)
+        for _, _, size, path in live:
+            if total <= self.max_bytes:
+                break
+            victims.append(path)
+            total -= size
+        removed = 0
+        for path in victims:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            removed += 1
+        return removed
+
+
+def run_cache_from_env(root: str | None = None, *, enabled: bool | None = None) -> RunCache | None:
+    """
+    DIFY_RUN_CACHE:
+    - 未設定 / 0/false/off/no: 無効（enabled=True なら既定のディレクトリで有効）
+    - 1/true/on/yes: 既定のディレクトリ (.dify-creator/run_cache) で有効
+    - それ以外: キャッシュディレクトリ
+    DIFY_RUN_CACHE_TTL_S（既定 7日）/ DIFY_RUN_CACHE_MAX_MB（既定 200）
+    enabled は CLI の --run-cache / --no-run-cache（環境変数より優先）。
+    """
+    v = os.getenv("DIFY_RUN_CACHE", "").strip()
+    if enabled is False:
+        return None
+    if enabled is None and (not v or v.lower() in _OFF):
+        return None
+    if v.lower() in _ON | _OFF:
+        v = ""
+    ttl = os.getenv("DIFY_RUN_CACHE_TTL_S", "").strip()
+    max_mb = os.getenv("DIFY_RUN_CACHE_MAX_MB", "").strip()
+    return RunCache(
+        root or v or None,
+        ttl_s=float(ttl) if ttl else DEFAULT_TTL_S,
+        max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES,
+    )
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from typing import IO, Any, Callable
+
+from dify_creator.console_client import DifyConsoleClient, decode_sse_json
+
+
+class RunAggregator:
+    """
+    draft run のイベントを1件ずつ受け取り、全イベントを保持せずに集計する。
+
+    - 最後のイベント / イベント種別ごとの件数
+    - workflow_started の task_id / workflow_run_id
+    - workflow_finished の status / outputs / error / elapsed_time / total_tokens
+    - ノードごとの最新ステータス（iteration 内で同じノードが何度も実行される場合は回数も数える）
+    - text_chunk / message のテキストを連結した最終文字列
+    """
+
+    def __init__(self) -> None:
+        self.event_count = 0
+        self.event_counts: dict[str, int] = {}
+        self.last_event: dict[str, Any] | None = None
+        self.task_id: str | None = None
+        self.workflow_run_id: str | None = None
+        self.status: str | None = None
+        self.outputs: Any = None
+        self.error: str | None = None
+        self.elapsed_time: float | None = None
+        self.total_tokens: int | None = None
+        self.nodes: dict[str, dict[str, Any]] = {}
+        self._text: list[str] = []
+
+    def update(self, ev: dict[str, Any]) -> None:
+        self.event_count += 1
+        name = ev.get("event") or "unknown"
+        self.event_counts[name] = self.event_counts.get(name, 0) + 1
+        self.last_event = ev
+        data = ev.get("data") if isinstance(ev.get("data"), dict) else {}
+
+        if self.task_id is None and ev.get("task_id"):
+            self.task_id = ev["task_id"]
+        if self.workflow_run_id is None and ev.get("workflow_run_id"):
+            self.workflow_run_id = ev["workflow_run_id"]
+
+        if name == "node_started":
+            node = self._node(data)
+            node["status"] = "running"
+            node["runs"] = node.get("runs", 0) + 1
+        elif name == "node_finished":
+            node = self._node(data)
+            node["status"] = data.get("status")
+            node["elapsed_time"] = data.get("elapsed_time")
+            if data.get("error"):
+                node["error"] = data.get("error")
+        elif name == "text_chunk":
+            self._text.append(str(data.get("text") or ""))
+        elif name in {"message", "agent_message"}:
+            self._text.append(str(ev.get("answer") or ""))
+        elif name == "workflow_finished":
+            self.status = data.get("status")
+            self.outputs = data.get("outputs")
+            self.error = data.get("error")
+            self.elapsed_time = data.get("elapsed_time")
+            self.total_tokens = data.get("total_tokens")
+        elif name == "error":
+            self.status = "error"
+            self.error = ev.get("message") or ev.get("code")
+
+    def _node(self, data: dict[str, Any]) -> dict[str, Any]:
+        node_id = str(data.get("node_id") or "")
+        node = self.nodes.get(node_id)
+        if node is None:
+            node = {"title": data.get("title"), "node_type": data.get("node_type")}
+            self.nodes[node_id] = node
+        return node
+
+    @property
+    def text(self) -> str:
+        return "".join(self._text)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "event_count": self.event_count,
+            "event_counts": self.event_counts,
+            "task_id": self.task_id,
+            "workflow_run_id": self.workflow_run_id,
+            "status": self.status,
+            "outputs": self.outputs,
+            "error": self.error,
+            "elapsed_time": self.elapsed_time,
+            "total_tokens": self.total_tokens,
+            "text": self.text,
+            "nodes": self.nodes,
+            "last_event": self.last_event,
+        }
+
+
+def stream_run_events(
+    client: DifyConsoleClient,
+    *,
+    app_id: str,
+    inputs: dict[str, Any],
+    out: IO[bytes] | None,
+    event_types: set[str] | None = None,
+    files: list[dict[str, Any]] | None = None,
+    external_trace_id: str | None = None,
+    max_wait_s: float | None = None,
+    stop_on_timeout: bool = True,
+    on_event: Callable[[dict[str, Any]], None] | None = None,
+) -> dict[str, Any]:
+    """
+    draft run のイベントを受信したそばから NDJSON (1イベント1行) で out に書き出し、
+    集計 (RunAggregator.summary) だけを返す。
+    SSE のペイロードは再シリアライズせずにそのまま書く。event_types を指定するとその種別のみ書く。
+    max_wait_s を超えた場合は status="timeout" とし、stop_on_timeout ならサーバー側も停止する。
+    on_event を渡すとデコードしたイベントごとに呼ぶ（進捗表示用）。
+    """
+    stream = client.open_draft_run(
+        app_id=app_id, inputs=inputs, files=files, external_trace_id=external_trace_id, max_wait_s=max_wait_s
+    )
+    agg = RunAggregator()
+    for payload in stream:
+        ev = decode_sse_json(payload)
+        if ev is None:
+            continue
+        agg.update(ev)
+        if on_event is not None:
+            on_event(ev)
+        if out is not None and (event_types is None or ev.get("event") in event_types):
+            out.write(payload)
+            out.write(b"\n")
+            out.flush()
+
+    summary = agg.summary()
+    if stream.timed_out:
+        summary["status"] = "timeout"
+        summary["stopped"] = stop_on_timeout and client.stop_after_timeout(app_id=app_id, task_id=agg.task_id)
+    return summary
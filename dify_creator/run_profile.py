@@ -0,0 +1,369 @@
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Iterable
+
+from dify_creator.errors import DifyConsoleError
+
+
+# 前後関係の判定で許容する時刻の誤差（秒）。保存済みイベントの created_at は秒単位なので 1 秒
+_EPS_S = 1e-3
+_SERVER_CLOCK_EPS_S = 1.0
+
+
+@dataclass
+class NodeSpan:
+    """ノード1回分の実行（iteration 内のノードは反復ごとに別の span になる）"""
+
+    exec_id: str
+    node_id: str
+    title: str
+    node_type: str
+    start_s: float
+    index: int | None = None  # 実行順（サーバーが振る step 番号）
+    end_s: float | None = None
+    elapsed_s: float | None = None
+    status: str | None = None
+    total_tokens: int | None = None
+    total_price: float | None = None
+    iteration_id: str | None = None
+    iteration_index: int | None = None
+    loop_id: str | None = None
+    loop_index: int | None = None
+    predecessor_node_id: str | None = None
+    error: str | None = None
+
+    @property
+    def duration_s(self) -> float:
+        """サーバーが報告した elapsed_time を優先し、なければ受信時刻の差"""
+        if self.elapsed_s is not None:
+            return self.elapsed_s
+        if self.end_s is not None:
+            return max(self.end_s - self.start_s, 0.0)
+        return 0.0
+
+    @property
+    def finish_s(self) -> float:
+        return self.start_s + self.duration_s
+
+    @property
+    def top_level(self) -> bool:
+        return self.iteration_id is None and self.loop_id is None
+
+
+class RunProfiler:
+    """
+    draft run のイベント（node_started / node_finished / workflow_finished）からノードごとの span を組み立てる。
+
+    stream_run_events の on_event にそのまま渡せる（呼ばれた時刻を受信時刻として使う）。
+    保存済みのイベントを update(ev) で流した場合は、サーバーの created_at（秒単位）と elapsed_time から時刻を求める。
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self._clock = clock
+        self._t0: float | None = None
+        self._server_t0: float | None = None
+        self._eps_s = _EPS_S
+        self.spans: list[NodeSpan] = []
+        self._open: dict[str, NodeSpan] = {}
+        self.status: str | None = None
+        self.wall_s: float | None = None
+        self.total_tokens: int | None = None
+
+    def __call__(self, ev: dict[str, Any]) -> None:
+        self.update(ev, received_at=self._clock())
+
+    def update(self, ev: dict[str, Any], received_at: float | None = None) -> None:
+        data = ev.get("data") if isinstance(ev.get("data"), dict) else {}
+        name = ev.get("event")
+        now = self._now(data, received_at)
+
+        if name == "node_started":
+            span = NodeSpan(
+                exec_id=str(data.get("id") or f"{data.get('node_id')}#{len(self.spans)}"),
+                node_id=str(data.get("node_id") or ""),
+                title=str(data.get("title") or data.get("node_id") or ""),
+                node_type=str(data.get("node_type") or ""),
+                start_s=now,
+                index=_first_int(data.get("index")),
+                iteration_id=data.get("iteration_id") or None,
+                loop_id=data.get("loop_id") or None,
+                predecessor_node_id=data.get("predecessor_node_id") or None,
+            )
+            self._open[span.exec_id] = span
+            self.spans.append(span)
+        elif name == "node_finished":
+            exec_id = str(data.get("id") or "")
+            span = self._open.pop(exec_id, None)
+            if span is None:
+                # node_started を取りこぼした場合（--events で絞り込んだ保存ファイルなど）は終了時刻から逆算する
+                elapsed = data.get("elapsed_time") if isinstance(data.get("elapsed_time"), (int, float)) else 0.0
+                span = NodeSpan(
+                    exec_id=exec_id or f"{data.get('node_id')}#{len(self.spans)}",
+                    node_id=str(data.get("node_id") or ""),
+                    title=str(data.get("title") or data.get("node_id") or ""),
+                    node_type=str(data.get("node_type") or ""),
+                    start_s=max(now - elapsed, 0.0) if received_at is not None else now,
+                    index=_first_int(data.get("index")),
+                    predecessor_node_id=data.get("predecessor_node_id") or None,
+                )
+                self.spans.append(span)
+            meta = data.get("execution_metadata") if isinstance(data.get("execution_metadata"), dict) else {}
+            span.end_s = now if received_at is not None else None
+            if isinstance(data.get("elapsed_time"), (int, float)):
+                span.elapsed_s = float(data["elapsed_time"])
+            span.status = data.get("status")
+            span.error = data.get("error") or None
+            span.total_tokens = meta.get("total_tokens")
+            span.total_price = _float_or_none(meta.get("total_price"))
+            span.iteration_id = span.iteration_id or meta.get("iteration_id") or data.get("iteration_id") or None
+            span.iteration_index = _first_int(meta.get("iteration_index"), data.get("iteration_index"))
+            span.loop_id = span.loop_id or meta.get("loop_id") or data.get("loop_id") or None
+            span.loop_index = _first_int(meta.get("loop_index"), data.get("loop_index"))
+        elif name == "workflow_finished":
+            self.status = data.get("status")
+            self.total_tokens = data.get("total_tokens")
+            if received_at is not None:
+                self.wall_s = now
+            elif isinstance(data.get("elapsed_time"), (int, float)):
+                self.wall_s = float(data["elapsed_time"])
+
+    def _now(self, data: dict[str, Any], received_at: float | None) -> float:
+        """run 開始からの経過秒"""
+        if received_at is not None:
+            if self._t0 is None:
+                self._t0 = received_at
+            return received_at - self._t0
+        self._eps_s = _SERVER_CLOCK_EPS_S
+        created = data.get("created_at")
+        if not isinstance(created, (int, float)):
+            return 0.0
+        if self._server_t0 is None:
+            self._server_t0 = float(created)
+        return float(created) - self._server_t0
+
+    # --- 集計 ---
+
+    def _ordered_spans(self) -> list[NodeSpan]:
+        return sorted(self.spans, key=lambda s: (s.start_s, s.index or 0))
+
+    def critical_path(self) -> list[NodeSpan]:
+        """
+        最後に終わったトップレベルのノードから、直前のノード（predecessor_node_id、
+        なければ開始前に終わっていた中で最も遅く終わったノード）を遡った列。
+        iteration/loop 内のノードはコンテナノードの時間に含まれるので対象外。
+        """
+        top = [s for s in self.spans if s.top_level]
+        if not top:
+            return []
+        by_node: dict[str, list[NodeSpan]] = {}
+        for s in top:
+            by_node.setdefault(s.node_id, []).append(s)
+
+        def order(s: NodeSpan) -> tuple[float, int]:
+            # 時刻が同じ（保存済みイベントの秒単位の created_at など）なら実行順で比べる
+            return s.finish_s, s.index if s.index is not None else -1
+
+        path = [max(top, key=order)]
+        seen = {path[0].exec_id}
+        while True:
+            cur = path[-1]
+            if cur.node_type == "start" or cur.node_type.startswith("trigger-"):
+                break
+            if cur.predecessor_node_id:
+                # 直前のノードが分かっていれば、その中で cur より前に始まった最後の実行
+                candidates = by_node.get(cur.predecessor_node_id, [])
+                before = [s for s in candidates if s.exec_id not in seen and s.start_s <= cur.start_s]
+            else:
+                before = [
+                    s
+                    for s in top
+                    if s.exec_id not in seen
+                    and s.finish_s <= cur.start_s + self._eps_s
+                    and (s.index is None or cur.index is None or s.index < cur.index)
+                ]
+            if not before:
+                break
+            prev = max(before, key=order)
+            seen.add(prev.exec_id)
+            path.append(prev)
+        path.reverse()
+        return path
+
+    def by_node(self) -> list[dict[str, Any]]:
+        """ノードごとの合計（iteration 内で何度も実行されるノードはまとめる）。合計時間の降順"""
+        agg: dict[str, dict[str, Any]] = {}
+        for s in self.spans:
+            row = agg.get(s.node_id)
+            if row is None:
+                row = {"node_id": s.node_id, "title": s.title, "node_type": s.node_type, "runs": 0, "total_s": 0.0}
+                row["total_tokens"] = 0
+                agg[s.node_id] = row
+            row["runs"] += 1
+            row["total_s"] += s.duration_s
+            row["total_tokens"] += s.total_tokens or 0
+        rows = sorted(agg.values(), key=lambda r: r["total_s"], reverse=True)
+        for r in rows:
+            r["total_s"] = round(r["total_s"], 4)
+        return rows
+
+    def summary(self) -> dict[str, Any]:
+        path = self.critical_path()
+        wall = self.wall_s if self.wall_s is not None else max((s.finish_s for s in self.spans), default=0.0)
+        path_s = sum(s.duration_s for s in path)
+        return {
+            "status": self.status,
+            "wall_s": round(wall, 4),
+            "total_tokens": self.total_tokens,
+            "node_runs": len(self.spans),
+            "critical_path": {
+                "total_s": round(path_s, 4),
+                "share_of_wall": round(path_s / wall, 3) if wall > 0 else None,
+                "nodes": [
+                    {
+                        "exec_id": s.exec_id,
+                        "node_id": s.node_id,
+                        "title": s.title,
+                        "node_type": s.node_type,
+                        "elapsed_s": round(s.duration_s, 4),
+                    }
+                    for s in path
+                ],
+            },
+            "by_node": self.by_node(),
+            "spans": [{**asdict(s), "duration_s": round(s.duration_s, 4)} for s in self._ordered_spans()],
+        }
+
+    # --- トレース出力 ---
+
+    def chrome_trace(self) -> dict[str, Any]:
+        """
+        Chrome Trace Event 形式（chrome://tracing / Perfetto / speedscope で開ける）。
+        並列に走ったノードは別のレーン (tid) に割り当てる。
+        """
+        events: list[dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "dify draft run"}},
+        ]
+        wall = self.wall_s if self.wall_s is not None else max((s.finish_s for s in self.spans), default=0.0)
+        events.append(
+            {"name": "workflow", "cat": "workflow", "ph": "X", "ts": 0, "dur": round(wall * 1e6), "pid": 1, "tid": 0}
+        )
+        lanes: list[float] = []
+        for s in self._ordered_spans():
+            for tid, free_at in enumerate(lanes):
+                if free_at <= s.start_s + _EPS_S:
+                    break
+            else:
+                tid = len(lanes)
+                lanes.append(0.0)
+            lanes[tid] = s.finish_s
+            args = {k: v for k, v in asdict(s).items() if v is not None and k not in {"start_s", "end_s"}}
+            events.append(
+                {
+                    "name": s.title if s.iteration_index is None else f"{s.title} [{s.iteration_index}]",
+                    "cat": s.node_type,
+                    "ph": "X",
+                    "ts": round(s.start_s * 1e6),
+                    "dur": round(s.duration_s * 1e6),
+                    "pid": 1,
+                    "tid": tid + 1,
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def folded_stacks(self) -> str:
+        """flamegraph.pl / speedscope 用の collapsed stack（値はミリ秒）"""
+        titles = {s.node_id: s.title for s in self.spans}
+        lines: dict[str, float] = {}
+        child_ms: dict[str, float] = {}
+        for s in self.spans:
+            frames = ["workflow"]
+            container = s.iteration_id or s.loop_id
+            if container:
+                frames.append(_frame(titles.get(container, container)))
+                child_ms[container] = child_ms.get(container, 0.0) + s.duration_s * 1000
+            frames.append(_frame(s.title))
+            key = ";".join(frames)
+            lines[key] = lines.get(key, 0.0) + s.duration_s * 1000
+        # コンテナ自身の値は子の時間を除いた分（自己時間）にする
+        for s in self.spans:
+            if s.node_id in child_ms and s.top_level:
+                key = f"workflow;{_frame(s.title)}"
+                lines[key] = max(lines.get(key, 0.0) - child_ms.pop(s.node_id), 0.0)
+        return "".join(f"{k} {round(v)}\n" for k, v in sorted(lines.items()))
+
+
+def _frame(name: str) -> str:
+    return name.replace(";", ",").replace(" ", "_") or "?"
+
+
+def _first_int(*values: Any) -> int | None:
+    for v in values:
+        if isinstance(v, int) and not isinstance(v, bool):
+            return v
+    return None
+
+
+def _float_or_none(v: Any) -> float | None:
+    try:
+        return float(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def load_events(path: str) -> Iterable[dict[str, Any]]:
+    """保存済みのイベント（run --stream の NDJSON、または run --out の JSON の events）"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    try:
+        obj = json.loads(text)
+    except json.JSONDecodeError:
+        obj = None
+    if isinstance(obj, dict):
+        events = obj.get("events")
+        return events if isinstance(events, list) else [obj]
+    out = []
+    for lineno, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            out.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            raise DifyConsoleError(f"{path}:{lineno}: JSON パースエラー: {e}")
+    return out
+
+
+def format_profile_table(summary: dict[str, Any], *, limit: int = 50) -> str:
+    """ノード実行の表（開始順）とノード別合計、クリティカルパス"""
+    critical = {n["exec_id"] for n in summary["critical_path"]["nodes"]}
+    spans = summary["spans"]
+    lines = [f"{'':1} {'start':>8} {'elapsed':>8} {'tokens':>7} {'status':<10} {'iter':>4}  node"]
+    for s in spans[:limit]:
+        mark = "*" if s["exec_id"] in critical else ""
+        idx = s["iteration_index"] if s["iteration_index"] is not None else s["loop_index"]
+        lines.append(
+            f"{mark:1} {s['start_s']:>7.2f}s {s['duration_s']:>7.2f}s {s['total_tokens'] or 0:>7} "
+            f"{str(s['status'] or '-'):<10} {'' if idx is None else idx:>4}  {s['title']} ({s['node_type']})"
+        )
+    if len(spans) > limit:
+        lines.append(f"  ... {len(spans) - limit} more")
+
+    lines.append("")
+    lines.append("by node (total):")
+    for r in summary["by_node"][:10]:
+        lines.append(f"  {r['total_s']:>8.2f}s  x{r['runs']:<4} {r['total_tokens']:>7} tok  {r['title']} ({r['node_type']})")
+
+    cp = summary["critical_path"]
+    share = f" ({cp['share_of_wall']:.0%} of wall)" if cp["share_of_wall"] is not None else ""
+    lines.append("")
+    lines.append(f"critical path: {cp['total_s']:.2f}s{share}")
+    lines.append("  " + " -> ".join(f"{n['title']} {n['elapsed_s']:.2f}s" for n in cp["nodes"]))
+    lines.append(
+        f"status={summary['status']} wall={summary['wall_s']:.2f}s tokens={summary['total_tokens']} "
+        f"node_runs={summary['node_runs']}"
+    )
+    return "\n".join(lines)
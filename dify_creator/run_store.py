@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import contextlib
+import gzip
+import io
+import json
+import os
+import secrets
+import threading
+import time
+from typing import IO, Any, Iterator
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore[assignment]
+
+try:  # POSIX のみ。Windows ではプロセス間のロックなしで動作する
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+from dify_creator.stats import format_table
+
+DEFAULT_STORE_DIR = os.path.join(".dify-creator", "runs")
+INDEX_FILE = "index.jsonl"
+BLOB_DIR = "dsl"
+
+# 保存しないイベント（接続維持用）
+_DROP_EVENTS = frozenset({"ping"})
+
+
+def store_dir_from_env() -> str:
+    return os.getenv("DIFY_RUN_STORE", "").strip() or DEFAULT_STORE_DIR
+
+
+def _env_number(name: str) -> float | None:
+    v = os.getenv(name, "").strip()
+    return float(v) if v else None
+
+
+def compact_events(events: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    保存用にイベント列を小さくする:
+    - text_chunk は出力変数 (from_variable_selector) ごとに1つにまとめ、最初のチャンクの位置に置く
+      （data.text は連結した最終文字列、data.chunks は元のチャンク数）
+    - ping を除く
+    """
+    out: list[dict[str, Any]] = []
+    merged: dict[str, tuple[dict[str, Any], list[str]]] = {}
+    for ev in events:
+        name = ev.get("event")
+        if name in _DROP_EVENTS:
+            continue
+        data = ev.get("data")
+        if name != "text_chunk" or not isinstance(data, dict):
+            out.append(ev)
+            continue
+        key = json.dumps(data.get("from_variable_selector"))
+        hit = merged.get(key)
+        if hit is None:
+            first = {**ev, "data": dict(data)}
+            merged[key] = (first, [])
+            out.append(first)
+            hit = merged[key]
+        hit[1].append(str(data.get("text") or ""))
+    for first, texts in merged.values():
+        first["data"]["text"] = "".join(texts)
+        first["data"]["chunks"] = len(texts)
+    return out
+
+
+def run_summary(run_result: dict[str, Any]) -> dict[str, Any]:
+    """run_draft_workflow_collect の結果から index 用の elapsed / tokens を取り出す"""
+    last = run_result.get("last_event") or {}
+    data = last.get("data") if last.get("event") == "workflow_finished" else None
+    data = data if isinstance(data, dict) else {}
+    return {"server_elapsed_s": data.get("elapsed_time"), "total_tokens": data.get("total_tokens")}
+
+
+class RunStore:
+    """
+    draft run の履歴。1回の実行を1ファイル (圧縮 NDJSON) に保存し、検索用の小さな index を持つ。
+
+        <root>/index.jsonl                    1行 = 1 run（app_id, dsl_hash, 時刻, status, 時間, tokens …）
+        <root>/YYYY-MM/<run_id>.ndjson.zst    1行目がヘッダー（index と同じ内容 + import 結果）、以降がイベント
+        <root>/dsl/<dsl_hash>.yml.zst         実行時の DSL（同じ DSL は1回だけ保存）
+
+    zstandard がインストールされていなければ gzip を使う（読み込みは拡張子で判別）。
+    keep（app ごとに残す件数）/ max_age_days を指定すると record のたびに古い run を消す。
+    """
+
+    def __init__(self, root: str | None = None, *, keep: int | None = None, max_age_days: float | None = None):
+        self.root = root or store_dir_from_env()
+        self.keep = keep
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, root: str | None = None) -> "RunStore":
+        """DIFY_RUN_STORE（保存先）/ DIFY_RUN_KEEP / DIFY_RUN_MAX_AGE_DAYS を読む"""
+        keep = _env_number("DIFY_RUN_KEEP")
+        return cls(
+            root or store_dir_from_env(),
+            keep=int(keep) if keep is not None else None,
+            max_age_days=_env_number("DIFY_RUN_MAX_AGE_DAYS"),
+        )
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.root, INDEX_FILE)
+
+    @property
+    def suffix(self) -> str:
+        return ".zst" if zstandard is not None else ".gz"
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        """
+        index.jsonl と DSL の追加・削除の排他ロック（スレッド間は threading.Lock、プロセス間は flock）。
+        prune は index を読んで書き直すので、別プロセス（sync --history や watch）の追記が
+        その間に入ると消えてしまう。
+        """
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            fd = os.open(self.index_path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    # --- 書き込み ---
+
+    def record(
+        self,
+        *,
+        app_id: str,
+        run_result: dict[str, Any],
+        status: str | None,
+        elapsed_s: float | None = None,
+        dsl_hash: str | None = None,
+        dsl_text: str | None = None,
+        inputs_hash: str | None = None,
+        import_result: dict[str, Any] | None = None,
+    ) -> dict[str, Any]:
+        """1回分の run を保存し、index のエントリを返す"""
+        now = time.time()
+        run_id = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)) + "-" + secrets.token_hex(4)
+        rel = os.path.join(time.strftime("%Y-%m", time.gmtime(now)), f"{run_id}.ndjson{self.suffix}")
+        events = compact_events(run_result.get("events") or [])
+        entry: dict[str, Any] = {
+            "run_id": run_id,
+            "app_id": app_id,
+            "created_at": round(now, 3),
+            "status": status,
+            "elapsed_s": round(elapsed_s, 3) if elapsed_s is not None else None,
+            **run_summary(run_result),
+            "events": len(events),
+            "dsl_hash": dsl_hash,
+            "inputs_hash": inputs_hash,
+            "file": rel,
+        }
+        header = {**entry, "import_result": import_result}
+        if run_result.get("status") == "timeout":
+            header["timeout"] = {k: run_result.get(k) for k in ("task_id", "stopped")}
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._open_write(path) as f:
+            f.write(_line(header))
+            for ev in events:
+                f.write(_line(ev))
+        entry["bytes"] = os.path.getsize(path)
+
+        with self._locked():
+            # DSL もロック中に置く（prune が参照のなくなった DSL を消すのと入れ違いにならないように）
+            if dsl_hash and dsl_text is not None:
+                self._put_dsl(dsl_hash, dsl_text)
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        return entry
+
+    def _put_dsl(self, dsl_hash: str, text: str) -> None:
+        path = os.path.join(self.root, BLOB_DIR, f"{dsl_hash}.yml{self.suffix}")
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with self._open_write(tmp) as f:
+            f.write(text.encode("utf-8"))
+        os.replace(tmp, path)
+
+    def _open_write(self, path: str) -> IO[bytes]:
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=10).stream_writer(open(path, "wb"), closefd=True)
+        return gzip.open(path, "wb", compresslevel=9)
+
+    # --- 読み込み ---
+
+    def entries(self) -> list[dict[str, Any]]:
+        """index の全エントリ（古い順）"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        out: list[dict[str, Any]] = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # 書きかけの行
+            if isinstance(entry, dict):
+                out.append(entry)
+        return out
+
+    def query(
+        self,
+        *,
+        app_id: str | None = None,
+        status: str | None = None,
+        dsl_hash: str | None = None,
+        since: float | None = None,
+        limit: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """index だけを読んで絞り込む（新しい順）"""
+        out = [
+            e
+            for e in self.entries()
+            if (app_id is None or e.get("app_id") == app_id)
+            and (status is None or e.get("status") == status)
+            and (dsl_hash is None or e.get("dsl_hash") == dsl_hash)
+            and (since is None or (e.get("created_at") or 0) >= since)
+        ]
+        out.reverse()
+        return out[:limit] if limit is not None else out
+
+    def get(self, run_id: str) -> dict[str, Any] | None:
+        for e in self.entries():
+            if e.get("run_id") == run_id:
+                return e
+        return None
+
+    def iter_lines(self, run_id: str) -> Iterator[dict[str, Any]]:
+        """保存した run のヘッダーとイベントを順に返す"""
+        entry = self.get(run_id)
+        if entry is None:
+            raise KeyError(run_id)
+        with self._open_read(os.path.join(self.root, entry["file"])) as f:
+            for line in io.TextIOWrapper(f, encoding="utf-8"):
+                if line.strip():
+                    yield json.loads(line)
+
+    def load_dsl(self, dsl_hash: str) -> str | None:
+        for suffix in (".zst", ".gz"):
+            path = os.path.join(self.root, BLOB_DIR, f"{dsl_hash}.yml{suffix}")
+            if os.path.exists(path):
+                with self._open_read(path) as f:
+                    return f.read().decode("utf-8")
+        return None
+
+    def _open_read(self, path: str) -> IO[bytes]:
+        if path.endswith(".zst"):
+            if zstandard is None:
+                raise RuntimeError(f"{path} の読み込みには zstandard が必要です（pip install zstandard）")
+            return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        return gzip.open(path, "rb")
+
+    # --- 保持期間 ---
+
+    def prune(self, *, keep: int | None = None, max_age_days: float | None = None) -> list[dict[str, Any]]:
+        """
+        app ごとに新しい keep 件だけ残し、max_age_days より古い run を消す。消したエントリを返す。
+        どの run からも参照されなくなった DSL も消す。
+        """
+        if keep is None and max_age_days is None:
+            return []
+        with self._locked():
+            entries = self.entries()
+            cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+            seen: dict[str, int] = {}
+            kept: list[dict[str, Any]] = []
+            removed: list[dict[str, Any]] = []
+            for e in reversed(entries):
+                n = seen.get(e.get("app_id") or "", 0)
+                too_many = keep is not None and n >= keep
+                too_old = cutoff is not None and (e.get("created_at") or 0) < cutoff
+                if too_many or too_old:
+                    removed.append(e)
+                else:
+                    seen[e.get("app_id") or ""] = n + 1
+                    kept.append(e)
+            if not removed:
+                return []
+            kept.reverse()
+            tmp = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for e in kept:
+                    f.write(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n")
+            os.replace(tmp, self.index_path)
+
+            for e in removed:
+                try:
+                    os.remove(os.path.join(self.root, e["file"]))
+                except (FileNotFoundError, KeyError):
+                    pass
+            live = {e.get("dsl_hash") for e in kept}
+            for e in removed:
+                h = e.get("dsl_hash")
+                if h and h not in live:
+                    for suffix in (".zst", ".gz"):
+                        try:
+                            os.remove(os.path.join(self.root, BLOB_DIR, f"{h}.yml{suffix}"))
+                        except FileNotFoundError:
+                            pass
+                    live.add(h)  # 同じ hash を二度消そうとしない
+        return removed
+
+    def apply_retention(self) -> list[dict[str, Any]]:
+        """コンストラクタで指定した keep / max_age_days で prune する"""
+        return self.prune(keep=self.keep, max_age_days=self.max_age_days)
+
+
+def _line(obj: Any) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+
+
+def format_runs_table(entries: list[dict[str, Any]]) -> str:
+    headers = ["run_id", "app_id", "status", "elapsed_s", "tokens", "events", "bytes", "dsl_hash"]
+    table = [
+        [
+            e.get("run_id") or "-",
+            e.get("app_id") or "-",
+            str(e.get("status") or "-"),
+            f"{e['elapsed_s']:.2f}" if isinstance(e.get("elapsed_s"), (int, float)) else "-",
+            str(e.get("total_tokens") if e.get("total_tokens") is not None else "-"),
+            str(e.get("events", "-")),
+            str(e.get("bytes", "-")),
+            (e.get("dsl_hash") or "-")[:12],
+        ]
+        for e in entries
+    ]
+    return format_table(headers, table)
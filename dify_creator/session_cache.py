@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import time
+from typing import Any, Iterator
+
+try:  # POSIX のみ。Windows ではロックなしで動作する
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore[assignment]
+
+
+# Dify がログイン時に設定する Cookie（https では "__Host-" 接頭辞付きの場合もある）
+SESSION_COOKIE_NAMES = ("access_token", "refresh_token", "csrf_token")
+
+
+def default_cache_path() -> str:
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "dify-creator", "sessions.json")
+
+
+def is_session_cookie(name: str) -> bool:
+    return name.removeprefix("__Host-") in SESSION_COOKIE_NAMES
+
+
+class SessionCache:
+    """
+    ログイン済み Cookie (access_token / refresh_token / csrf_token) をディスクに保存するキャッシュ。
+
+    - キーは base_url + email
+    - 複数プロセスから同時に使われる前提で、ロックファイル (flock) で排他する。
+      ログインはキーごとのロック、ファイルの読み書きはファイル全体のロックで行う
+    - ファイルは 0600 で作成する（トークンを含むため）
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or default_cache_path()
+
+    @staticmethod
+    def key(base_url: str, email: str) -> str:
+        return f"{base_url.rstrip('/')}|{email.strip().lower()}"
+
+    @contextlib.contextmanager
+    def locked(self, key: str | None = None) -> Iterator[None]:
+        """
+        key を指定するとそのキーだけの排他ロック、省略するとキャッシュファイル全体の排他ロック。
+        ログイン処理全体をキーのロックの中で行うことで、同じアカウントで同時起動したジョブのうち
+        1つだけがログインし、残りはその結果を再利用する。別の環境・アカウントへのログインは待たない。
+        flock は同じプロセス内でも別の fd 同士で排他するので、同じロックを入れ子で取らないこと。
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        suffix = f".{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.lock" if key else ".lock"
+        fd = os.open(self.path + suffix, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _read_all(self) -> dict[str, Any]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def _write_all(self, data: dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def load(self, key: str) -> list[dict[str, Any]] | None:
+        entry = self._read_all().get(key)
+        if not isinstance(entry, dict):
+            return None
+        cookies = entry.get("cookies")
+        if not isinstance(cookies, list) or not cookies:
+            return None
+        now = time.time()
+        # refresh_token まで期限切れなら使い道がない
+        for c in cookies:
+            if c.get("name", "").removeprefix("__Host-") == "refresh_token":
+                expires = c.get("expires")
+                if expires is not None and expires < now:
+                    return None
+        return cookies
+
+    def save(self, key: str, cookies: list[dict[str, Any]]) -> None:
+        # 別のキーの保存と同時に読み書きしても消し合わないよう、ファイル全体のロックを取る
+        with self.locked():
+            data = self._read_all()
+            data[key] = {"cookies": cookies, "saved_at": int(time.time())}
+            self._write_all(data)
+
+    def delete(self, key: str) -> None:
+        with self.locked():
+            data = self._read_all()
+            if data.pop(key, None) is not None:
+                self._write_all(data)
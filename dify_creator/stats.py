@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Any, Iterable
+
+
+def percentile(sorted_values: list[float], p: float) -> float | None:
+    """線形補間のパーセンタイル (p は 0-100)。sorted_values は昇順であること"""
+    if not sorted_values:
+        return None
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    k = (len(sorted_values) - 1) * (p / 100.0)
+    lo = math.floor(k)
+    hi = math.ceil(k)
+    if lo == hi:
+        return sorted_values[lo]
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def latency_summary(values: Iterable[float]) -> dict[str, Any]:
+    """レイテンシ (秒) の件数・平均・p50/p95/p99・最大"""
+    v = sorted(values)
+    if not v:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "count": len(v),
+        "mean": round(sum(v) / len(v), 4),
+        "p50": round(percentile(v, 50), 4),  # type: ignore[arg-type]
+        "p95": round(percentile(v, 95), 4),  # type: ignore[arg-type]
+        "p99": round(percentile(v, 99), 4),  # type: ignore[arg-type]
+        "max": round(v[-1], 4),
+    }
+
+
+def format_table(headers: list[str], rows: list[list[str]], *, align: str = "left") -> str:
+    """列幅を揃えたテキストの表（見出し・区切り線・各行）。align="right" なら右寄せ（数値だけの表向け）"""
+    widths = [max(len(h), *(len(row[i]) for row in rows)) if rows else len(h) for i, h in enumerate(headers)]
+    just = str.rjust if align == "right" else str.ljust
+    lines = ["  ".join(just(h, w) for h, w in zip(headers, widths))]
+    lines.append("  ".join("-" * w for w in widths))
+    for row in rows:
+        lines.append("  ".join(just(c, w) for c, w in zip(row, widths)))
+    return "\n".join(lines)
+
+
+class RateLimiter:
+    """
+    スレッドセーフな単純なレートリミッタ（開始間隔を 1/rate 秒以上空ける）。
+    rate が None / 0 以下なら制限しない。
+    """
+
+    def __init__(self, rate_per_s: float | None):
+        self.interval = 1.0 / rate_per_s if rate_per_s and rate_per_s > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            at = max(self._next, now)
+            self._next = at + self.interval
+        delay = at - now
+        if delay > 0:
+            time.sleep(delay)
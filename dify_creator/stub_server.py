@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import argparse
+import json
+import secrets
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+_PREFIX = "/console/api"
+
+
+@dataclass
+class StubConfig:
+    events: int = 100  # draft run 1回の SSE イベント数（workflow_started / finished を含む）
+    event_bytes: int = 256  # node_finished イベントの outputs に詰めるおおよそのバイト数
+    event_delay_s: float = 0.0  # イベント間の待ち時間
+    latency_s: float = 0.0  # すべてのリクエストに加える応答遅延
+    confirm_required: bool = False  # True なら新規 import を pending にして confirm を要求する
+    run_workers: int = 0  # draft run を同時に処理する数（0 = 無制限）。超えた分は空くまで待たされる（loadtest の確認用）
+
+
+class StubState:
+    """サーバー全体で共有するアプリ・セッション・実行中タスク"""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.apps: dict[str, dict[str, Any]] = {}
+        self.imports: dict[str, dict[str, Any]] = {}
+        self.tokens: set[str] = set()
+        self.stopped: set[str] = set()
+        self.counts: dict[str, int] = {}
+        self._events_cache: tuple[tuple[int, int], list[bytes]] | None = None
+        self.run_slots = threading.BoundedSemaphore(config.run_workers) if config.run_workers > 0 else None
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def run_events(self, task_id: str, run_id: str) -> list[bytes]:
+        """
+        SSE のチャンク列。サーバー側が計測のボトルネックにならないよう、
+        node イベントは設定ごとに1回だけ組み立てて使い回す。
+        """
+        cfg = self.config
+        key = (cfg.events, cfg.event_bytes)
+        with self.lock:
+            cached = self._events_cache
+        if cached is None or cached[0] != key:
+            cached = (key, _render_node_events(max(cfg.events - 2, 0), cfg.event_bytes))
+            with self.lock:
+                self._events_cache = cached
+        started = _sse(
+            {
+                "event": "workflow_started",
+                "task_id": task_id,
+                "workflow_run_id": run_id,
+                "data": {"id": run_id, "created_at": int(time.time())},
+            }
+        )
+        finished = _sse(
+            {
+                "event": "workflow_finished",
+                "task_id": task_id,
+                "workflow_run_id": run_id,
+                "data": {
+                    "id": run_id,
+                    "status": "succeeded",
+                    "outputs": {"result": "ok"},
+                    "elapsed_time": cfg.event_delay_s * cfg.events,
+                    "total_tokens": 10 * (cfg.events // 2),
+                },
+            }
+        )
+        return [started, *cached[1], finished]
+
+
+def _sse(ev: dict[str, Any]) -> bytes:
+    return b"data: " + json.dumps(ev, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n\n"
+
+
+def _render_node_events(n: int, event_bytes: int) -> list[bytes]:
+    filler = "x" * max(event_bytes - 200, 0)
+    out: list[bytes] = []
+    for i in range(n):
+        node_id = f"node_{i // 2}"
+        exec_id = f"exec_{i // 2}"
+        if i % 2 == 0:
+            ev = {
+                "event": "node_started",
+                "task_id": "",
+                "data": {
+                    "id": exec_id,
+                    "node_id": node_id,
+                    "node_type": "llm",
+                    "title": node_id,
+                    "index": i // 2 + 1,
+                },
+            }
+        else:
+            ev = {
+                "event": "node_finished",
+                "task_id": "",
+                "data": {
+                    "id": exec_id,
+                    "node_id": node_id,
+                    "node_type": "llm",
+                    "title": node_id,
+                    "index": i // 2 + 1,
+                    "status": "succeeded",
+                    "elapsed_time": 0.01,
+                    "outputs": {"text": filler},
+                    "execution_metadata": {"total_tokens": 10},
+                },
+            }
+        out.append(_sse(ev))
+    return out
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # ヘッダーと本文を別々に書くので、Nagle と遅延 ACK で 40ms 待たされないようにする
+    disable_nagle_algorithm = True
+    server: "StubServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # ベンチマーク中にアクセスログで stderr を埋めない
+        pass
+
+    # --- 入出力 ---
+
+    def _body(self) -> dict[str, Any]:
+        n = int(self.headers.get("Content-Length") or 0)
+        if not n:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(n))
+        except ValueError:
+            return {}
+        return body if isinstance(body, dict) else {}
+
+    def _json(self, status: int, obj: Any, cookies: dict[str, str] | None = None) -> None:
+        data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (cookies or {}).items():
+            self.send_header("Set-Cookie", f"{name}={value}; Path=/")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _cookies(self) -> dict[str, str]:
+        out: dict[str, str] = {}
+        for part in (self.headers.get("Cookie") or "").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name:
+                out[name] = value
+        return out
+
+    def _authorized(self, method: str) -> bool:
+        cookies = self._cookies()
+        if cookies.get("access_token") not in self.server.state.tokens:
+            return False
+        if method != "GET" and self.headers.get("X-CSRF-Token") != cookies.get("csrf_token"):
+            return False
+        return True
+
+    def _new_session(self) -> dict[str, str]:
+        token = secrets.token_hex(16)
+        with self.server.state.lock:
+            self.server.state.tokens.add(token)
+        return {"access_token": token, "refresh_token": secrets.token_hex(16), "csrf_token": secrets.token_hex(16)}
+
+    # --- ルーティング ---
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    def _dispatch(self, method: str) -> None:
+        url = urlparse(self.path)
+        if not url.path.startswith(_PREFIX):
+            self._json(404, {"message": "not found"})
+            return
+        body = self._body() if method == "POST" else {}
+        parts = [p for p in url.path[len(_PREFIX) :].split("/") if p]
+        state = self.server.state
+        state.count(f"{method} /{parts[0] if parts else ''}")
+        if state.config.latency_s:
+            time.sleep(state.config.latency_s)
+
+        if method == "POST" and parts in (["login"], ["refresh-token"]):
+            self._json(200, {"result": "success"}, cookies=self._new_session())
+            return
+        if not self._authorized(method):
+            self._json(401, {"code": "unauthorized", "message": "Unauthorized."})
+            return
+
+        if method == "POST" and parts == ["apps", "imports"]:
+            self._import(body)
+        elif method == "POST" and len(parts) == 4 and parts[:2] == ["apps", "imports"] and parts[3] == "confirm":
+            self._confirm(parts[2])
+        elif method == "GET" and parts == ["apps"]:
+            self._list_apps(parse_qs(url.query))
+        elif method == "GET" and len(parts) == 3 and parts[0] == "apps" and parts[2] == "export":
+            app = state.apps.get(parts[1])
+            if app is None:
+                self._json(404, {"message": "App not found"})
+            else:
+                self._json(200, {"data": app["yaml"]})
+        elif method == "POST" and parts[:1] == ["apps"] and parts[2:] == ["workflows", "draft", "run"]:
+            self._draft_run()
+        elif method == "POST" and len(parts) == 6 and parts[2:4] == ["workflow-runs", "tasks"] and parts[5] == "stop":
+            with state.lock:
+                state.stopped.add(parts[4])
+            self._json(200, {"result": "success"})
+        else:
+            self._json(404, {"message": "not found"})
+
+    def _import(self, body: dict[str, Any]) -> None:
+        state = self.server.state
+        import_id = str(uuid.uuid4())
+        app_id = body.get("app_id") or str(uuid.uuid4())
+        record = {"app_id": app_id, "yaml": body.get("yaml_content") or "", "name": body.get("name") or app_id}
+        pending = state.config.confirm_required and not body.get("app_id")
+        with state.lock:
+            if pending:
+                state.imports[import_id] = record
+            else:
+                state.apps[app_id] = record
+        status = "pending" if pending else "completed"
+        self._json(202 if pending else 200, {"id": import_id, "status": status, "app_id": app_id})
+
+    def _confirm(self, import_id: str) -> None:
+        state = self.server.state
+        with state.lock:
+            record = state.imports.pop(import_id, None)
+            if record is not None:
+                state.apps[record["app_id"]] = record
+        if record is None:
+            self._json(404, {"message": "Import not found"})
+            return
+        self._json(200, {"id": import_id, "status": "completed", "app_id": record["app_id"]})
+
+    def _list_apps(self, query: dict[str, list[str]]) -> None:
+        page = int((query.get("page") or ["1"])[0])
+        limit = int((query.get("limit") or ["100"])[0])
+        with self.server.state.lock:
+            apps = list(self.server.state.apps.values())
+        chunk = apps[(page - 1) * limit : page * limit]
+        self._json(
+            200,
+            {
+                "data": [{"id": a["app_id"], "name": a["name"], "mode": "workflow"} for a in chunk],
+                "has_more": page * limit < len(apps),
+                "page": page,
+                "limit": limit,
+                "total": len(apps),
+            },
+        )
+
+    def _draft_run(self) -> None:
+        state = self.server.state
+        task_id = str(uuid.uuid4())
+        chunks = state.run_events(task_id, str(uuid.uuid4()))
+        delay = state.config.event_delay_s
+        if state.run_slots is None:
+            self._stream_run(chunks, task_id, delay)
+            return
+        with state.run_slots:
+            self._stream_run(chunks, task_id, delay)
+
+    def _stream_run(self, chunks: list[bytes], task_id: str, delay: float) -> None:
+        state = self.server.state
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i, chunk in enumerate(chunks):
+                if delay and i:
+                    time.sleep(delay)
+                    if task_id in state.stopped:
+                        break
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # クライアントが途中で切断した（max_wait_s など）
+            self.close_connection = True
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    ベンチマーク・動作確認用のローカル Dify Console API スタブ（標準ライブラリのみ）。
+
+    DifyConsoleClient が使うエンドポイントだけを実装する:
+    - POST /console/api/login, /console/api/refresh-token（Cookie: access_token / refresh_token / csrf_token）
+    - POST /console/api/apps/imports, /console/api/apps/imports/{id}/confirm
+    - GET  /console/api/apps, /console/api/apps/{id}/export
+    - POST /console/api/apps/{id}/workflows/draft/run（SSE。イベント数・サイズ・間隔を StubConfig で指定）
+    - POST /console/api/apps/{id}/workflow-runs/tasks/{task_id}/stop
+
+        python -m dify_creator.stub_server --port 5001 --events 1000 --event-bytes 512
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: StubConfig | None = None):
+        super().__init__((host, port), StubHandler)
+        self.state = StubState(config or StubConfig())
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        """別スレッドで起動する（with 文でも使える）"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(prog="python -m dify_creator.stub_server", description="Local Dify console API stub")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=5001)
+    p.add_argument("--events", type=int, default=StubConfig.events, help="SSE events per draft run")
+    p.add_argument("--event-bytes", type=int, default=StubConfig.event_bytes, help="Approximate bytes per node event")
+    p.add_argument("--event-delay-s", type=float, default=0.0, help="Delay between SSE events")
+    p.add_argument("--latency-s", type=float, default=0.0, help="Delay added to every request")
+    p.add_argument("--confirm-required", action="store_true", help="Return pending for new imports")
+    p.add_argument("--run-workers", type=int, default=0, help="Max draft runs processed at once (0 = unlimited)")
+    args = p.parse_args(argv)
+    config = StubConfig(
+        events=args.events,
+        event_bytes=args.event_bytes,
+        event_delay_s=args.event_delay_s,
+        latency_s=args.latency_s,
+        confirm_required=args.confirm_required,
+        run_workers=args.run_workers,
+    )
+    server = StubServer(args.host, args.port, config)
+    print(f"stub Dify console: {server.base_url} (DIFY_BASE_URL={server.base_url})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
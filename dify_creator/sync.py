@@ -0,0 +1,432 @@
+from __future__ import annotations
+
+import glob
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any
+
+from dify_creator import yaml_io
+from dify_creator.console_client import DifyConsoleClient, DifyConsoleError
+from dify_creator.dsl import DslDocument, dsl_hash, inputs_hash, load_dsl_file, parse_dsl
+from dify_creator.dsl_optimize import optimize_document
+from dify_creator.dsl_diff import diff_dsl
+from dify_creator.file_io import read_json_file, write_json_file
+from dify_creator.run_store import RunStore
+from dify_creator.stats import format_table
+from dify_creator.sync_state import SyncState
+
+
+@dataclass
+class SyncEntry:
+    """sync-all の1アプリ分の指定（DSL パス → app_id → inputs JSON）"""
+
+    dsl: str
+    app_id: str | None = None
+    inputs_json: str | None = None
+    name: str | None = None
+
+    @property
+    def label(self) -> str:
+        return os.path.splitext(os.path.basename(self.dsl))[0]
+
+
+@dataclass
+class SyncResult:
+    entry: SyncEntry
+    ok: bool
+    app_id: str | None = None
+    elapsed_s: float = 0.0
+    import_s: float = 0.0
+    run_s: float = 0.0
+    status: str | None = None
+    error: str | None = None
+    import_skipped: bool = False
+    run_skipped: bool = False
+    import_result: dict[str, Any] = field(default_factory=dict)
+    run_result: dict[str, Any] = field(default_factory=dict)
+    dsl_hash: str | None = None
+    inputs_hash: str | None = None
+
+
+def read_inputs(path: str) -> dict[str, Any]:
+    inputs = read_json_file(path)
+    if not isinstance(inputs, dict):
+        raise DifyConsoleError(f"inputs JSON は JSON object である必要があります: {path}")
+    return inputs
+
+
+def run_status(run_result: dict[str, Any]) -> str | None:
+    """run_draft_workflow_collect の結果から workflow のステータスを取り出す"""
+    if run_result.get("status") == "timeout":
+        return "timeout"
+    last = run_result.get("last_event") or {}
+    if last.get("event") == "workflow_finished":
+        return (last.get("data") or {}).get("status")
+    return last.get("event")
+
+
+def import_and_confirm(
+    client: DifyConsoleClient,
+    *,
+    yaml_content: str,
+    app_id: str | None = None,
+    **import_kwargs: Any,
+) -> tuple[dict[str, Any], str]:
+    """import (create/overwrite) -> (pending なら confirm)。(import結果, app_id) を返す"""
+    import_result = client.import_app(yaml_content=yaml_content, app_id=app_id, **import_kwargs)
+    if import_result.get("status") == "pending":
+        import_result = client.confirm_import(import_result["id"])
+
+    resolved = import_result.get("app_id") or app_id
+    if not resolved:
+        raise DifyConsoleError(f"import結果から app_id を取得できません: {import_result}")
+    return import_result, resolved
+
+
+def remote_unchanged(client: DifyConsoleClient, app_id: str, doc: DslDocument) -> bool:
+    """デプロイ済みの DSL を export し、ローカルの DSL と構造的な差分がなければ True"""
+    return diff_dsl(parse_dsl(client.export_app(app_id=app_id)), doc.data).empty
+
+
+def import_unless_unchanged(
+    client: DifyConsoleClient,
+    *,
+    doc: DslDocument,
+    app_id: str | None = None,
+    diff_remote: bool = False,
+    **import_kwargs: Any,
+) -> tuple[dict[str, Any], str, bool]:
+    """
+    diff_remote=True で app_id があれば、先にデプロイ済みの DSL と比較して差分がなければ import しない。
+    (import結果, app_id, 省略したか) を返す。省略時の import結果は {"status": "unchanged", "app_id": ...}。
+    """
+    if diff_remote and app_id and remote_unchanged(client, app_id, doc):
+        return {"status": "unchanged", "app_id": app_id}, app_id, True
+    # パース済みなので import_app での YAML 検証は省略する
+    import_result, resolved = import_and_confirm(
+        client, yaml_content=doc.text, app_id=app_id, validate_yaml=False, **import_kwargs
+    )
+    return import_result, resolved, False
+
+
+def incremental_import(
+    client: DifyConsoleClient,
+    state: SyncState,
+    *,
+    doc: DslDocument,
+    app_id: str | None = None,
+    verify_remote: bool = False,
+    diff_remote: bool = False,
+    **import_kwargs: Any,
+) -> tuple[dict[str, Any], str, bool]:
+    """
+    DSL の正規化 hash が前回 import 時と同じなら upload を省略する。
+    (import結果, app_id, 省略したか) を返す。
+
+    verify_remote=True の場合は export_app の結果の hash も前回 import 直後と比較し、
+    Studio 側で編集されていたら import し直す。app_id 未指定（新規作成）は常に import する。
+    diff_remote=True の場合は、状態ファイルに記録がなくてもデプロイ済みの DSL と差分がなければ省略する。
+    """
+    h = doc.hash
+    if app_id:
+        entry = state.get(SyncState.key(client.config.base_url, app_id))
+        if entry.get("dsl_hash") == h and entry.get("import_result") is not None:
+            if not verify_remote or entry.get("remote_hash") == _remote_hash(client, app_id):
+                return entry["import_result"], app_id, True
+
+    import_result, resolved, skipped = import_unless_unchanged(
+        client, doc=doc, app_id=app_id, diff_remote=diff_remote, **import_kwargs
+    )
+    state.record_import(
+        SyncState.key(client.config.base_url, resolved),
+        dsl_path=doc.path,
+        dsl_hash=h,
+        import_result=import_result,
+        remote_hash=_remote_hash(client, resolved) if verify_remote else None,
+    )
+    return import_result, resolved, skipped
+
+
+def _remote_hash(client: DifyConsoleClient, app_id: str) -> str:
+    return dsl_hash(parse_dsl(client.export_app(app_id=app_id)))
+
+
+def run_is_fresh(state: SyncState, base_url: str, app_id: str, inputs: dict[str, Any]) -> bool:
+    """同じ DSL・同じ inputs で前回の draft run が成功していれば True"""
+    entry = state.get(SyncState.key(base_url, app_id))
+    return entry.get("inputs_hash") == inputs_hash(inputs) and entry.get("run_status") == "succeeded"
+
+
+def load_manifest(path: str) -> list[SyncEntry]:
+    """
+    マニフェスト (YAML/JSON) を読み込む。パスはマニフェストからの相対パスとして解決する。
+
+        defaults:
+          inputs_json: examples/inputs.json
+        apps:
+          - dsl: apps/foo.yml
+            app_id: 0b6c...
+            inputs_json: apps/foo.inputs.json
+
+    トップレベルが list の場合は apps のみとみなす。
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml_io.safe_load(f.read())
+    if isinstance(data, list):
+        data = {"apps": data}
+    if not isinstance(data, dict) or not isinstance(data.get("apps"), list):
+        raise DifyConsoleError(f"マニフェストの形式が不正です（apps: [...] が必要）: {path}")
+
+    base = os.path.dirname(os.path.abspath(path))
+    defaults = data.get("defaults") or {}
+
+    def resolve(p: str | None) -> str | None:
+        return None if p is None else os.path.normpath(os.path.join(base, p))
+
+    entries: list[SyncEntry] = []
+    for i, item in enumerate(data["apps"]):
+        if not isinstance(item, dict) or not item.get("dsl"):
+            raise DifyConsoleError(f"マニフェストの apps[{i}] に dsl がありません: {path}")
+        entries.append(
+            SyncEntry(
+                dsl=resolve(item["dsl"]),  # type: ignore[arg-type]
+                app_id=item.get("app_id"),
+                inputs_json=resolve(item.get("inputs_json", defaults.get("inputs_json"))),
+                name=item.get("name"),
+            )
+        )
+    return entries
+
+
+def discover_entries(directory: str, default_inputs_json: str | None = None) -> list[SyncEntry]:
+    """
+    ディレクトリ内の *.yml / *.yaml を列挙する。
+    同じディレクトリに <name>.inputs.json があればそれを inputs として使う。
+    app_id は指定できないため、新規アプリとして import される。
+    """
+    paths = sorted(
+        set(glob.glob(os.path.join(directory, "*.yml")) + glob.glob(os.path.join(directory, "*.yaml")))
+    )
+    entries: list[SyncEntry] = []
+    for p in paths:
+        sidecar = os.path.splitext(p)[0] + ".inputs.json"
+        entries.append(
+            SyncEntry(dsl=p, inputs_json=sidecar if os.path.exists(sidecar) else default_inputs_json)
+        )
+    return entries
+
+
+def sync_one(
+    client: DifyConsoleClient,
+    entry: SyncEntry,
+    *,
+    max_wait_s: float | None = None,
+    state: SyncState | None = None,
+    always_run: bool = False,
+    verify_remote: bool = False,
+    diff_remote: bool = False,
+    optimize: bool = False,
+) -> SyncResult:
+    """
+    1アプリ分の import -> confirm -> draft run。
+    state を渡すとインクリメンタル sync になり、DSL が変わっていなければ import を、
+    さらに inputs も同じで前回成功していれば draft run も省略する。
+    diff_remote=True ならデプロイ済みの DSL と差分がない場合も import を省略する。
+    optimize=True なら最適化した DSL を送る（dsl_optimize 参照。正規化 hash は変わらない）。
+    """
+    t0 = time.perf_counter()
+    result = SyncResult(entry=entry, ok=False, app_id=entry.app_id)
+    try:
+        doc = load_dsl_file(entry.dsl)
+        if optimize:
+            doc = optimize_document(doc)
+        inputs = read_inputs(entry.inputs_json) if entry.inputs_json else None
+        result.dsl_hash = doc.hash
+        result.inputs_hash = inputs_hash(inputs) if inputs is not None else None
+
+        if state is not None:
+            result.import_result, result.app_id, result.import_skipped = incremental_import(
+                client,
+                state,
+                doc=doc,
+                app_id=entry.app_id,
+                verify_remote=verify_remote,
+                diff_remote=diff_remote,
+                name=entry.name,
+            )
+        else:
+            result.import_result, result.app_id, result.import_skipped = import_unless_unchanged(
+                client, doc=doc, app_id=entry.app_id, diff_remote=diff_remote, name=entry.name
+            )
+        t1 = time.perf_counter()
+        result.import_s = t1 - t0
+
+        if inputs is None:
+            result.status = "imported"
+            result.ok = True
+        elif (
+            state is not None
+            and result.import_skipped
+            and not always_run
+            and run_is_fresh(state, client.config.base_url, result.app_id, inputs)
+        ):
+            result.run_skipped = True
+            result.status = "unchanged"
+            result.ok = True
+        else:
+            result.run_result = client.run_draft_workflow_collect(
+                app_id=result.app_id, inputs=inputs, max_wait_s=max_wait_s
+            )
+            result.run_s = time.perf_counter() - t1
+            result.status = run_status(result.run_result)
+            result.ok = result.status in {None, "succeeded"}
+            if state is not None:
+                state.record_run(
+                    SyncState.key(client.config.base_url, result.app_id),
+                    inputs_hash=result.inputs_hash,  # type: ignore[arg-type]
+                    status=result.status,
+                )
+    except (DifyConsoleError, ValueError, OSError) as e:
+        result.error = str(e)
+        result.status = "error"
+    result.elapsed_s = time.perf_counter() - t0
+    return result
+
+
+def _artifact_dir(out_dir: str, entry: SyncEntry, used: set[str]) -> str:
+    name = re.sub(r"[^\w.-]+", "_", entry.label) or "app"
+    candidate, n = name, 2
+    while candidate in used:
+        candidate = f"{name}-{n}"
+        n += 1
+    used.add(candidate)
+    return os.path.join(out_dir, candidate)
+
+
+def sync_all(
+    client: DifyConsoleClient,
+    entries: list[SyncEntry],
+    *,
+    workers: int = 4,
+    max_wait_s: float | None = None,
+    out_dir: str = "artifacts",
+    state: SyncState | None = None,
+    always_run: bool = False,
+    verify_remote: bool = False,
+    diff_remote: bool = False,
+    history: RunStore | None = None,
+    optimize: bool = False,
+) -> dict[str, Any]:
+    """
+    1つのログイン済みセッションを共有し、import -> confirm -> draft run を並列実行する。
+    アプリごとの結果を out_dir/<DSL名>/ に、全体のサマリを out_dir/summary.json に書き出す。
+    state を渡すと変更のないアプリの import / draft run を省略する（sync_one 参照）。
+    history を渡すと実行した draft run を履歴にも保存する。
+    """
+    workers = max(1, workers)
+    client.set_pool_size(workers)
+
+    t0 = time.perf_counter()
+    results: list[SyncResult] = []
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = [
+            ex.submit(
+                sync_one,
+                client,
+                e,
+                max_wait_s=max_wait_s,
+                state=state,
+                always_run=always_run,
+                verify_remote=verify_remote,
+                diff_remote=diff_remote,
+                optimize=optimize,
+            )
+            for e in entries
+        ]
+        for fut in as_completed(futures):
+            results.append(fut.result())
+    wall_s = time.perf_counter() - t0
+    if state is not None:
+        state.save()
+
+    # 出力順は入力順に揃える
+    order = {id(e): i for i, e in enumerate(entries)}
+    results.sort(key=lambda r: order[id(r.entry)])
+
+    used: set[str] = set()
+    rows: list[dict[str, Any]] = []
+    for r in results:
+        d = _artifact_dir(out_dir, r.entry, used)
+        if r.import_result and not r.import_skipped:
+            write_json_file(os.path.join(d, "import_result.json"), r.import_result)
+        if r.run_result:
+            write_json_file(os.path.join(d, "run_result.json"), r.run_result)
+        run_id = None
+        if history is not None and r.run_result and r.app_id:
+            run_id = history.record(
+                app_id=r.app_id,
+                run_result=r.run_result,
+                status=r.status,
+                elapsed_s=r.run_s,
+                dsl_hash=r.dsl_hash,
+                dsl_text=load_dsl_file(r.entry.dsl).text,
+                inputs_hash=r.inputs_hash,
+                import_result=r.import_result,
+            )["run_id"]
+        rows.append(
+            {
+                "dsl": r.entry.dsl,
+                "app_id": r.app_id,
+                "ok": r.ok,
+                "status": r.status,
+                "elapsed_s": round(r.elapsed_s, 3),
+                "import_s": round(r.import_s, 3),
+                "run_s": round(r.run_s, 3),
+                "import_skipped": r.import_skipped,
+                "run_skipped": r.run_skipped,
+                "artifacts": d,
+                "run_id": run_id,
+                "error": r.error,
+            }
+        )
+    if history is not None:
+        history.apply_retention()
+
+    summary = {
+        "total": len(results),
+        "succeeded": sum(1 for r in results if r.ok),
+        "failed": sum(1 for r in results if not r.ok),
+        "unchanged": sum(1 for r in results if r.import_skipped),
+        "workers": workers,
+        "wall_s": round(wall_s, 3),
+        "apps_per_s": round(len(results) / wall_s, 3) if wall_s > 0 else None,
+        "sum_app_s": round(sum(r.elapsed_s for r in results), 3),
+        "http": client.metrics.snapshot(),
+        "apps": rows,
+    }
+    write_json_file(os.path.join(out_dir, "summary.json"), summary)
+    return summary
+
+
+def format_summary_table(summary: dict[str, Any]) -> str:
+    rows = summary["apps"]
+    headers = ["dsl", "app_id", "status", "elapsed_s", "import_s", "run_s"]
+    table = [
+        [os.path.basename(r["dsl"]), r["app_id"] or "-", r["status"] or "-", f"{r['elapsed_s']:.2f}",
+         f"{r['import_s']:.2f}", f"{r['run_s']:.2f}"]
+        for r in rows
+    ]
+    lines = [format_table(headers, table)]
+    lines.append("")
+    lines.append(
+        f"{summary['succeeded']}/{summary['total']} succeeded, wall {summary['wall_s']:.2f}s "
+        f"(sum of per-app {summary['sum_app_s']:.2f}s), {summary['apps_per_s'] or 0:.2f} apps/s, "
+        f"workers={summary['workers']}"
+    )
+    for r in rows:
+        if r["error"]:
+            lines.append(f"error: {os.path.basename(r['dsl'])}: {r['error']}")
+    return "\n".join(lines)
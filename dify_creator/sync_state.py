@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Any
+
+DEFAULT_STATE_PATH = os.path.join(".dify-creator", "sync_state.json")
+
+
+def state_path_from_env() -> str:
+    return os.getenv("DIFY_SYNC_STATE", "").strip() or DEFAULT_STATE_PATH
+
+
+class SyncState:
+    """
+    インクリメンタル sync 用のローカル状態ファイル。
+
+    キーは base_url + app_id。各エントリには最後に import した DSL の正規化 hash、
+    import 結果、最後に成功した draft run の inputs hash などを記録する。
+
+        {
+          "https://dify.example.com|<app_id>": {
+            "dsl_path": "app.dsl.yml",
+            "dsl_hash": "...",          # 最後に import した DSL
+            "remote_hash": "...",       # import 直後に export した DSL（--verify-remote 時）
+            "import_result": {...},
+            "imported_at": 1700000000,
+            "inputs_hash": "...",       # 最後に成功した draft run
+            "run_status": "succeeded",
+            "ran_at": 1700000000
+          }
+        }
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or state_path_from_env()
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = {}
+        self._data: dict[str, dict[str, Any]] = data if isinstance(data, dict) else {}
+
+    @staticmethod
+    def key(base_url: str, app_id: str) -> str:
+        return f"{base_url.rstrip('/')}|{app_id}"
+
+    def get(self, key: str) -> dict[str, Any]:
+        with self._lock:
+            return dict(self._data.get(key) or {})
+
+    def record_import(
+        self,
+        key: str,
+        *,
+        dsl_path: str,
+        dsl_hash: str,
+        import_result: dict[str, Any],
+        remote_hash: str | None = None,
+    ) -> None:
+        with self._lock:
+            entry = self._data.setdefault(key, {})
+            if entry.get("dsl_hash") != dsl_hash:
+                # DSL が変わったので過去の run 結果は無効
+                for k in ("inputs_hash", "run_status", "ran_at"):
+                    entry.pop(k, None)
+            entry.update(
+                {
+                    "dsl_path": dsl_path,
+                    "dsl_hash": dsl_hash,
+                    "import_result": import_result,
+                    "imported_at": int(time.time()),
+                }
+            )
+            if remote_hash is not None:
+                entry["remote_hash"] = remote_hash
+            self._dirty = True
+
+    def record_run(self, key: str, *, inputs_hash: str, status: str | None) -> None:
+        with self._lock:
+            entry = self._data.setdefault(key, {})
+            entry.update({"inputs_hash": inputs_hash, "run_status": status, "ran_at": int(time.time())})
+            self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+            self._dirty = False
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from dify_creator.validator import FileReport, Issue
+
+
+OUTPUT_FORMATS = ("text", "json", "sarif", "junit")
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+TOOL_NAME = "dify-creator"
+
+
+def format_reports(reports: list[FileReport], fmt: str) -> str:
+    if fmt == "json":
+        return format_json(reports)
+    if fmt == "sarif":
+        return format_sarif(reports)
+    if fmt == "junit":
+        return format_junit(reports)
+    return format_text(reports)
+
+
+def _position(issue: Issue) -> str:
+    return f"{issue.line}行目: " if issue.line else ""
+
+
+def format_text(reports: list[FileReport]) -> str:
+    """従来の validate と同じ絵文字付きの表示（複数ファイルなら最後に集計行）"""
+    lines: list[str] = []
+    for report in reports:
+        lines.append(f"DSL Validation: {report.path}")
+        lines.append("")
+        errors = report.errors
+        warnings = report.warnings
+        if errors:
+            lines.append(f"❌ エラー ({len(errors)}):")
+            lines.extend(f"  - {_position(e)}{e.message}" for e in errors)
+            lines.append("")
+        if warnings:
+            lines.append(f"⚠️  警告 ({len(warnings)}):")
+            lines.extend(f"  - {_position(w)}{w.message}" for w in warnings)
+            lines.append("")
+        if not errors:
+            lines.append("✅ 検証成功：DSLは基本的に有効です")
+            lines.append("")
+    if len(reports) > 1:
+        failed = sum(1 for r in reports if not r.ok)
+        lines.append(f"{len(reports) - failed}/{len(reports)} files passed")
+    return "\n".join(lines).rstrip("\n") + "\n"
+
+
+def _issue_dict(issue: Issue) -> dict[str, Any]:
+    return {
+        "severity": issue.severity,
+        "code": issue.code,
+        "message": issue.message,
+        "line": issue.line,
+        "column": issue.column,
+        "node_id": issue.node_id,
+        "path": list(issue.path),
+    }
+
+
+def format_json(reports: list[FileReport]) -> str:
+    out = {
+        "files": len(reports),
+        "failed": sum(1 for r in reports if not r.ok),
+        "errors": sum(len(r.errors) for r in reports),
+        "warnings": sum(len(r.warnings) for r in reports),
+        "results": [
+            {"path": r.path, "ok": r.ok, "issues": [_issue_dict(i) for i in r.issues]} for r in reports
+        ],
+    }
+    return json.dumps(out, ensure_ascii=False, indent=2) + "\n"
+
+
+def format_sarif(reports: list[FileReport]) -> str:
+    """SARIF 2.1.0（GitHub code scanning などで表示できる）"""
+    rule_ids = sorted({i.code for r in reports for i in r.issues})
+    rule_index = {rule_id: n for n, rule_id in enumerate(rule_ids)}
+    results = []
+    for report in reports:
+        for issue in report.issues:
+            location: dict[str, Any] = {"artifactLocation": {"uri": report.path.replace("\\", "/")}}
+            if issue.line:
+                location["region"] = {"startLine": issue.line, "startColumn": issue.column or 1}
+            results.append(
+                {
+                    "ruleId": issue.code,
+                    "ruleIndex": rule_index[issue.code],
+                    "level": "error" if issue.severity == "error" else "warning",
+                    "message": {"text": issue.message},
+                    "locations": [{"physicalLocation": location}],
+                }
+            )
+    out = {
+        "$schema": SARIF_SCHEMA,
+        "version": "2.1.0",
+        "runs": [
+            {
+                "tool": {"driver": {"name": TOOL_NAME, "rules": [{"id": rule_id} for rule_id in rule_ids]}},
+                "results": results,
+            }
+        ],
+    }
+    return json.dumps(out, ensure_ascii=False, indent=2) + "\n"
+
+
+def format_junit(reports: list[FileReport]) -> str:
+    """JUnit XML（1ファイル = 1 testcase、エラーがあれば failure）"""
+    # junit 出力のときだけ使うので、起動時には読み込まない
+    import xml.etree.ElementTree as ET
+
+    suite = ET.Element(
+        "testsuite",
+        name=f"{TOOL_NAME} validate",
+        tests=str(len(reports)),
+        failures=str(sum(1 for r in reports if not r.ok)),
+        errors="0",
+    )
+    for report in reports:
+        case = ET.SubElement(suite, "testcase", classname="dsl", name=report.path)
+        errors = report.errors
+        if errors:
+            failure = ET.SubElement(case, "failure", message=errors[0].message, type=errors[0].code)
+            failure.text = "\n".join(f"{report.path}:{e.line or 0}: {e.message}" for e in errors)
+        if report.warnings:
+            out = ET.SubElement(case, "system-out")
+            out.text = "\n".join(f"{report.path}:{w.line or 0}: warning: {w.message}" for w in report.warnings)
+    root = ET.Element("testsuites")
+    root.append(suite)
+    ET.indent(root)
+    return '<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(root, encoding="unicode") + "\n"
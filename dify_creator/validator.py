@@ -0,0 +1,650 @@
+from __future__ import annotations
+
+import glob
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Any, Iterator
+
+import yaml
+
+from dify_creator import yaml_io
+
+
+VALID_MODES = frozenset({"workflow", "advanced-chat", "chat", "agent-chat", "completion"})
+GRAPH_MODES = frozenset({"workflow", "advanced-chat"})
+
+# 子ノードを持つコンテナ。内部のループはコンテナ自身が回すので、グラフ上は DAG である必要がある
+CONTAINER_TYPES = frozenset({"iteration", "loop"})
+CONTAINER_START_TYPES = frozenset({"iteration-start", "loop-start"})
+
+# ノードを参照しない特殊な変数の名前空間
+SYSTEM_NAMESPACE = "sys"
+ENV_NAMESPACE = "env"
+CONVERSATION_NAMESPACE = "conversation"
+
+# 出力が固定のノード種別（ここにない種別 = tool / agent / loop などは出力を検査しない）
+STATIC_OUTPUTS: dict[str, frozenset[str]] = {
+    "llm": frozenset({"text", "reasoning_content", "usage", "structured_output", "files"}),
+    "knowledge-retrieval": frozenset({"result"}),
+    "template-transform": frozenset({"output"}),
+    "question-classifier": frozenset({"class_name", "class_id", "usage"}),
+    "http-request": frozenset({"body", "status_code", "headers", "files"}),
+    "document-extractor": frozenset({"text"}),
+    "list-operator": frozenset({"result", "first_record", "last_record"}),
+    "iteration": frozenset({"output", "item", "index"}),
+    "variable-aggregator": frozenset({"output"}),
+    "parameter-extractor": frozenset({"__is_success", "__reason", "__usage"}),
+    "start": frozenset(),
+    "code": frozenset(),
+}
+
+# 同じ閉路を何度も報告しないよう、報告する閉路の数には上限を設ける
+MAX_REPORTED_CYCLES = 10
+
+_TEMPLATE_REF_RE = re.compile(r"\{\{#([^#{}\s]+)#\}\}")
+
+DSL_EXTENSIONS = (".yml", ".yaml")
+
+
+@dataclass(frozen=True)
+class Issue:
+    """
+    検証で見つかった問題。path は DSL 内の位置（キー/インデックスの列）で、
+    ファイル上の行番号への対応付けに使う。
+    """
+
+    severity: str  # "error" | "warning"
+    code: str
+    message: str
+    path: tuple[str | int, ...] = ()
+    node_id: str | None = None
+    line: int | None = None  # 1 始まり
+    column: int | None = None  # 1 始まり
+
+
+@dataclass
+class FileReport:
+    path: str
+    issues: list[Issue]
+
+    @property
+    def errors(self) -> list[Issue]:
+        return [i for i in self.issues if i.severity == "error"]
+
+    @property
+    def warnings(self) -> list[Issue]:
+        return [i for i in self.issues if i.severity == "warning"]
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+@dataclass
+class _Node:
+    id: str
+    index: int
+    type: str
+    title: str
+    data: dict[str, Any]
+    container: str | None = None
+    outputs: frozenset[str] | None = None
+    successors: list[str] = field(default_factory=list)
+
+    @property
+    def label(self) -> str:
+        return f"'{self.title}' ({self.id})" if self.title else f"({self.id})"
+
+
+class GraphIndex:
+    """workflow.graph の nodes/edges を id で引けるようにした索引（構築は O(ノード数 + エッジ数)）"""
+
+    def __init__(self, graph: dict[str, Any]):
+        self.nodes: dict[str, _Node] = {}
+        self.container_start: dict[str, str] = {}
+        self.issues: list[Issue] = []
+
+        raw_nodes = graph.get("nodes")
+        raw_edges = graph.get("edges")
+        if raw_nodes is not None and not isinstance(raw_nodes, list):
+            self._error("graph.nodes", "'workflow.graph.nodes' は配列である必要があります", ("workflow", "graph", "nodes"))
+            raw_nodes = None
+        if raw_edges is not None and not isinstance(raw_edges, list):
+            self._error("graph.edges", "'workflow.graph.edges' は配列である必要があります", ("workflow", "graph", "edges"))
+            raw_edges = None
+        self.raw_edges: list[Any] = raw_edges or []
+
+        for i, raw in enumerate(raw_nodes or []):
+            self._add_node(i, raw)
+        for node in self.nodes.values():
+            self._link_container(node)
+
+    def _error(self, code: str, message: str, path: tuple[str | int, ...], node_id: str | None = None) -> None:
+        self.issues.append(Issue("error", code, message, path, node_id))
+
+    def _add_node(self, i: int, raw: Any) -> None:
+        path = ("workflow", "graph", "nodes", i)
+        if not isinstance(raw, dict):
+            self._error("node.invalid", f"nodes[{i}] は object である必要があります", path)
+            return
+        node_id = raw.get("id")
+        if not isinstance(node_id, (str, int)) or node_id == "":
+            self._error("node.missing-id", f"nodes[{i}] に 'id' がありません", path)
+            return
+        node_id = str(node_id)
+        data = raw.get("data") if isinstance(raw.get("data"), dict) else {}
+        # 注釈（メモ）ノードはワークフローの一部ではない
+        if raw.get("type") == "custom-note" or not data.get("type"):
+            return
+        if node_id in self.nodes:
+            self._error("node.duplicate-id", f"ノード id '{node_id}' が重複しています", path, node_id)
+            return
+        container = raw.get("parentId") or data.get("iteration_id") or data.get("loop_id")
+        self.nodes[node_id] = _Node(
+            id=node_id,
+            index=i,
+            type=str(data.get("type")),
+            title=str(data.get("title") or ""),
+            data=data,
+            container=str(container) if container else None,
+            outputs=_node_outputs(str(data.get("type")), data),
+        )
+
+    def _link_container(self, node: _Node) -> None:
+        if node.container is None:
+            return
+        parent = self.nodes.get(node.container)
+        if parent is None or parent.type not in CONTAINER_TYPES:
+            self._error(
+                "node.unknown-container",
+                f"ノード {node.label} の親 '{node.container}' が iteration/loop ノードとして存在しません",
+                self.node_path(node),
+                node.id,
+            )
+            node.container = None
+            return
+        if node.type in CONTAINER_START_TYPES:
+            self.container_start.setdefault(parent.id, node.id)
+
+    def node_path(self, node: _Node) -> tuple[str | int, ...]:
+        return ("workflow", "graph", "nodes", node.index)
+
+    def roots(self) -> list[_Node]:
+        """実行の起点になるノード（start / trigger-*）"""
+        return [
+            n for n in self.nodes.values() if n.container is None and (n.type == "start" or n.type.startswith("trigger-"))
+        ]
+
+
+def _node_outputs(node_type: str, data: dict[str, Any]) -> frozenset[str] | None:
+    """参照可能な出力変数名。不明（動的）な場合は None"""
+    base = STATIC_OUTPUTS.get(node_type)
+    if base is None:
+        return None
+    names = set(base)
+    if node_type == "start":
+        names.update(v.get("variable") for v in data.get("variables") or [] if isinstance(v, dict))
+    elif node_type == "code" and isinstance(data.get("outputs"), dict):
+        names.update(data["outputs"].keys())
+    elif node_type == "parameter-extractor":
+        names.update(p.get("name") for p in data.get("parameters") or [] if isinstance(p, dict))
+    elif node_type == "variable-aggregator":
+        settings = data.get("advanced_settings") if isinstance(data.get("advanced_settings"), dict) else {}
+        names.update(g.get("group_name") for g in settings.get("groups") or [] if isinstance(g, dict))
+    names.discard(None)
+    return frozenset(str(n) for n in names)
+
+
+def validate_dsl(data: dict[str, Any]) -> list[Issue]:
+    """DSL の構造（トップレベルのフィールドとワークフローのグラフ）を検証する"""
+    issues = _check_top_level(data)
+    app = data.get("app") if isinstance(data.get("app"), dict) else {}
+    mode = app.get("mode")
+
+    if mode in GRAPH_MODES:
+        workflow = data.get("workflow")
+        if not isinstance(workflow, dict):
+            issues.append(Issue("error", "workflow.missing", f"{mode} モードの場合、'workflow' セクションは必須です", ()))
+            return issues
+        graph = workflow.get("graph")
+        if not isinstance(graph, dict):
+            issues.append(
+                Issue("error", "graph.missing", "'workflow.graph' は object である必要があります", ("workflow",))
+            )
+            return issues
+        issues.extend(validate_graph(graph, mode=mode, workflow=workflow))
+    elif mode in VALID_MODES:
+        if not isinstance(data.get("model_config"), dict):
+            issues.append(
+                Issue("error", "model_config.missing", f"{mode} モードの場合、'model_config' セクションは必須です", ())
+            )
+    return issues
+
+
+def _check_top_level(data: dict[str, Any]) -> list[Issue]:
+    issues: list[Issue] = []
+    for key in ("version", "kind", "app"):
+        if key not in data:
+            issues.append(Issue("error", "field.missing", f"必須フィールド '{key}' が見つかりません", ()))
+
+    version = data.get("version")
+    if version is not None and not isinstance(version, str):
+        issues.append(
+            Issue(
+                "error",
+                "field.type",
+                f"'version' は文字列である必要があります（現在: {type(version).__name__}）",
+                ("version",),
+            )
+        )
+    kind = data.get("kind")
+    if kind is not None and kind != "app":
+        issues.append(Issue("error", "field.value", f"'kind' は 'app' である必要があります（現在: {kind}）", ("kind",)))
+
+    app = data.get("app")
+    if app is not None and not isinstance(app, dict):
+        issues.append(Issue("error", "field.type", "'app' は object（dictionary）である必要があります", ("app",)))
+    elif isinstance(app, dict):
+        if "name" not in app:
+            issues.append(Issue("error", "field.missing", "'app.name' は必須です", ("app",)))
+        if "mode" not in app:
+            issues.append(Issue("error", "field.missing", "'app.mode' は必須です", ("app",)))
+        elif app.get("mode") not in VALID_MODES:
+            issues.append(
+                Issue(
+                    "error",
+                    "field.value",
+                    f"'app.mode' は {', '.join(sorted(VALID_MODES))} のいずれかである必要があります（現在: {app.get('mode')}）",
+                    ("app", "mode"),
+                )
+            )
+    return issues
+
+
+def validate_graph(graph: dict[str, Any], *, mode: str, workflow: dict[str, Any] | None = None) -> list[Issue]:
+    """
+    ワークフローのグラフを検証する。すべて O(ノード数 + エッジ数 + ノード設定のサイズ)。
+
+    - ノード id の重複 / 存在しない親コンテナ
+    - 存在しないノードを指すエッジ、iteration/loop の内外をまたぐエッジ
+    - 分岐ノード（if-else / 質問分類器）の存在しない分岐から出るエッジ
+    - start ノードの有無と、start から到達できないノード
+    - iteration/loop 以外での閉路
+    - {{#node_id.var#}} や変数セレクタが存在しないノード/出力/会話変数/環境変数を指していないか
+    """
+    index = GraphIndex(graph)
+    issues = index.issues
+    _check_edges(index, issues)
+    _check_entry_and_exit(index, issues, mode)
+    _check_reachability(index, issues)
+    _check_cycles(index, issues)
+    _check_references(index, issues, workflow or {})
+    return issues
+
+
+def _check_edges(index: GraphIndex, issues: list[Issue]) -> None:
+    nodes = index.nodes
+    for i, edge in enumerate(index.raw_edges):
+        path = ("workflow", "graph", "edges", i)
+        if not isinstance(edge, dict):
+            issues.append(Issue("error", "edge.invalid", f"edges[{i}] は object である必要があります", path))
+            continue
+        source = str(edge.get("source", ""))
+        target = str(edge.get("target", ""))
+        src = nodes.get(source)
+        tgt = nodes.get(target)
+        if src is None or tgt is None:
+            missing = ", ".join(repr(x) for x, n in ((source, src), (target, tgt)) if n is None)
+            issues.append(
+                Issue("error", "edge.dangling", f"エッジ '{edge.get('id', i)}' が存在しないノード {missing} を指しています", path)
+            )
+            continue
+        if src.container != tgt.container:
+            issues.append(
+                Issue(
+                    "error",
+                    "edge.cross-container",
+                    f"エッジ '{edge.get('id', i)}' が iteration/loop の内外をまたいでいます（{src.label} -> {tgt.label}）",
+                    path,
+                )
+            )
+            continue
+        handles = _source_handles(src)
+        handle = edge.get("sourceHandle") or "source"
+        if handles is not None and handle not in handles:
+            issues.append(
+                Issue(
+                    "warning",
+                    "edge.unknown-handle",
+                    f"エッジ '{edge.get('id', i)}' の分岐 '{handle}' はノード {src.label} に存在しません",
+                    path,
+                    src.id,
+                )
+            )
+        src.successors.append(tgt.id)
+
+
+def _source_handles(node: _Node) -> set[str] | None:
+    """分岐ノードの出口ハンドル。分岐しないノードは None（検査しない）"""
+    data = node.data
+    if node.type == "if-else":
+        cases = data.get("cases")
+        if isinstance(cases, list) and cases:
+            handles = {str(c.get("case_id") or c.get("id")) for c in cases if isinstance(c, dict)}
+            handles.add("false")
+        else:
+            handles = {"true", "false"}
+    elif node.type == "question-classifier":
+        handles = {str(c.get("id")) for c in data.get("classes") or [] if isinstance(c, dict)}
+    else:
+        return None
+    if data.get("error_strategy") == "fail-branch":
+        handles.add("fail-branch")
+    return handles
+
+
+def _check_entry_and_exit(index: GraphIndex, issues: list[Issue], mode: str) -> None:
+    roots = index.roots()
+    starts = [n for n in roots if n.type == "start"]
+    if not roots:
+        issues.append(Issue("error", "graph.no-start", "start ノードが見つかりません", ("workflow", "graph", "nodes")))
+    elif len(starts) > 1:
+        for n in starts[1:]:
+            issues.append(
+                Issue("error", "graph.multiple-start", f"start ノードが複数あります: {n.label}", index.node_path(n), n.id)
+            )
+
+    terminal = "end" if mode == "workflow" else "answer"
+    if index.nodes and not any(n.type == terminal for n in index.nodes.values()):
+        issues.append(
+            Issue("warning", "graph.no-terminal", f"{terminal} ノードが見つかりません", ("workflow", "graph", "nodes"))
+        )
+
+    for container_id, node in index.nodes.items():
+        if node.type in CONTAINER_TYPES and container_id not in index.container_start:
+            issues.append(
+                Issue(
+                    "error",
+                    "container.no-start",
+                    f"{node.type} ノード {node.label} に開始ノード（{node.type}-start）がありません",
+                    index.node_path(node),
+                    node.id,
+                )
+            )
+
+
+def _check_reachability(index: GraphIndex, issues: list[Issue]) -> None:
+    roots = index.roots()
+    if not roots:
+        return
+    seen = {n.id for n in roots}
+    queue = deque(seen)
+    while queue:
+        node = index.nodes[queue.popleft()]
+        nexts = list(node.successors)
+        # コンテナに到達したら内部の開始ノードにも到達する
+        inner = index.container_start.get(node.id)
+        if inner is not None:
+            nexts.append(inner)
+        for nxt in nexts:
+            if nxt not in seen:
+                seen.add(nxt)
+                queue.append(nxt)
+
+    for node in index.nodes.values():
+        if node.id not in seen:
+            issues.append(
+                Issue(
+                    "warning",
+                    "node.unreachable",
+                    f"ノード {node.label} は start から到達できません",
+                    index.node_path(node),
+                    node.id,
+                )
+            )
+
+
+def _check_cycles(index: GraphIndex, issues: list[Issue]) -> None:
+    """反復 DFS で後退辺を探す（白=未訪問, 灰=スタック上, 黒=完了）"""
+    WHITE, GRAY, BLACK = 0, 1, 2
+    color = dict.fromkeys(index.nodes, WHITE)
+    reported = 0
+    for root in index.nodes:
+        if color[root] != WHITE:
+            continue
+        color[root] = GRAY
+        path = [root]
+        position = {root: 0}
+        stack = [iter(index.nodes[root].successors)]
+        while stack:
+            nxt = next(stack[-1], None)
+            if nxt is None:
+                stack.pop()
+                done = path.pop()
+                del position[done]
+                color[done] = BLACK
+                continue
+            if color[nxt] == WHITE:
+                color[nxt] = GRAY
+                position[nxt] = len(path)
+                path.append(nxt)
+                stack.append(iter(index.nodes[nxt].successors))
+            elif color[nxt] == GRAY:
+                reported += 1
+                if reported > MAX_REPORTED_CYCLES:
+                    continue
+                cycle = path[position[nxt] :] + [nxt]
+                node = index.nodes[nxt]
+                labels = " -> ".join(index.nodes[n].label for n in cycle)
+                issues.append(
+                    Issue(
+                        "error",
+                        "graph.cycle",
+                        f"閉路があります（繰り返しは iteration/loop ノードで表現してください）: {labels}",
+                        index.node_path(node),
+                        node.id,
+                    )
+                )
+    if reported > MAX_REPORTED_CYCLES:
+        issues.append(
+            Issue(
+                "error",
+                "graph.cycle",
+                f"ほかにも {reported - MAX_REPORTED_CYCLES} 件の閉路があります",
+                ("workflow", "graph", "edges"),
+            )
+        )
+
+
+def _check_references(index: GraphIndex, issues: list[Issue], workflow: dict[str, Any]) -> None:
+    env_names = _variable_names(workflow.get("environment_variables"))
+    conversation_names = _variable_names(workflow.get("conversation_variables"))
+    for node in index.nodes.values():
+        base = index.node_path(node) + ("data",)
+        for rel_path, selector, text_ref in _iter_references(node.data, ()):
+            message = _resolve_reference(index, selector, env_names, conversation_names)
+            if message is None:
+                continue
+            shown = f"{{{{#{'.'.join(selector)}#}}}}" if text_ref else repr(list(selector))
+            issues.append(
+                Issue(
+                    "error",
+                    "variable.unresolved",
+                    f"ノード {node.label} の変数参照 {shown}: {message}",
+                    base + rel_path,
+                    node.id,
+                )
+            )
+
+
+def _variable_names(variables: Any) -> set[str]:
+    if not isinstance(variables, list):
+        return set()
+    return {str(v.get("name")) for v in variables if isinstance(v, dict) and v.get("name")}
+
+
+def _iter_references(obj: Any, path: tuple[str | int, ...]) -> Iterator[tuple[tuple[str | int, ...], tuple[str, ...], bool]]:
+    """
+    ノード設定内の変数参照を (相対パス, セレクタ, テンプレート中の参照か) で列挙する。
+    - *_selector キー（value_selector / variable_selector など）の ["node_id", "var", ...]
+    - 変数集約ノードの variables: [["node_id", "var"], ...]
+    - 変数代入ノードで input_type=variable の value
+    - 文字列中の {{#node_id.var#}}
+    """
+    if isinstance(obj, str):
+        if "{{#" in obj:
+            for m in _TEMPLATE_REF_RE.finditer(obj):
+                parts = tuple(m.group(1).split("."))
+                if len(parts) >= 2:
+                    yield path, parts, True
+        return
+    if isinstance(obj, list):
+        for i, item in enumerate(obj):
+            yield from _iter_references(item, path + (i,))
+        return
+    if not isinstance(obj, dict):
+        return
+    for key, value in obj.items():
+        sub = path + (key,)
+        if isinstance(key, str) and key.endswith("selector"):
+            if _is_selector(value):
+                yield sub, tuple(value), False
+            continue
+        if key == "variables" and isinstance(value, list) and value and all(_is_selector(v) for v in value):
+            for i, v in enumerate(value):
+                yield sub + (i,), tuple(v), False
+            continue
+        if key == "value" and obj.get("input_type") == "variable":
+            if _is_selector(value):
+                yield sub, tuple(value), False
+            continue
+        yield from _iter_references(value, sub)
+
+
+def _is_selector(value: Any) -> bool:
+    return isinstance(value, list) and len(value) >= 2 and all(isinstance(v, str) for v in value)
+
+
+def _resolve_reference(
+    index: GraphIndex, selector: tuple[str, ...], env_names: set[str], conversation_names: set[str]
+) -> str | None:
+    """参照先が存在すれば None、存在しなければ理由を返す"""
+    head, var = selector[0], selector[1]
+    if head == SYSTEM_NAMESPACE:
+        return None
+    if head == ENV_NAMESPACE:
+        return None if var in env_names else f"環境変数 '{var}' が定義されていません"
+    if head == CONVERSATION_NAMESPACE:
+        return None if var in conversation_names else f"会話変数 '{var}' が定義されていません"
+    target = index.nodes.get(head)
+    if target is None:
+        return f"ノード '{head}' が存在しません"
+    if target.outputs is None or var in target.outputs:
+        return None
+    # 旧形式では start ノード経由でシステム変数を参照する（["<start_id>", "sys.query"]）
+    if target.type == "start" and var.startswith(SYSTEM_NAMESPACE + "."):
+        return None
+    return f"ノード {target.label} に出力 '{var}' がありません"
+
+
+def load_dsl_with_nodes(yaml_text: str) -> tuple[Any, yaml.Node | None]:
+    """YAML を1回だけパースし、(データ, 位置情報付きのノード木) を返す"""
+    loader = yaml_io.SafeLoader(yaml_text)
+    try:
+        root = loader.get_single_node()
+        data = loader.construct_document(root) if root is not None else None
+    finally:
+        loader.dispose()
+    return data, root
+
+
+def locate(root: yaml.Node | None, path: tuple[str | int, ...]) -> tuple[int, int] | None:
+    """DSL 内のパスに対応する (行, 列)。途中までしか辿れなければ辿れたところの位置を返す"""
+    if root is None:
+        return None
+    node = root
+    for key in path:
+        child = None
+        if isinstance(node, yaml.MappingNode):
+            for k, v in node.value:
+                if isinstance(k, yaml.ScalarNode) and k.value == str(key):
+                    child = v
+                    break
+        elif isinstance(node, yaml.SequenceNode) and isinstance(key, int) and 0 <= key < len(node.value):
+            child = node.value[key]
+        if child is None:
+            break
+        node = child
+    return node.start_mark.line + 1, node.start_mark.column + 1
+
+
+def validate_file(path: str) -> FileReport:
+    """1ファイルを検証し、各問題にファイル上の位置を付けて返す（プロセスプールから呼ばれる）"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return FileReport(path, [Issue("error", "file.unreadable", f"ファイルを読み込めません: {e}")])
+    try:
+        data, root = load_dsl_with_nodes(text)
+    except yaml.YAMLError as e:
+        mark = getattr(e, "problem_mark", None)
+        line, column = (mark.line + 1, mark.column + 1) if mark is not None else (None, None)
+        # 位置は line/column で返すので、メッセージは問題の説明だけにする
+        detail = " ".join(x for x in (getattr(e, "context", None), getattr(e, "problem", None)) if x) or str(e)
+        return FileReport(path, [Issue("error", "yaml.parse", f"YAML パースエラー: {detail}", line=line, column=column)])
+    if not isinstance(data, dict):
+        return FileReport(
+            path, [Issue("error", "dsl.invalid", "DSL は YAML object (dictionary) である必要があります", line=1, column=1)]
+        )
+
+    issues = []
+    for issue in validate_dsl(data):
+        pos = locate(root, issue.path)
+        issues.append(replace(issue, line=pos[0], column=pos[1]) if pos else issue)
+    return FileReport(path, issues)
+
+
+def expand_paths(patterns: list[str]) -> list[str]:
+    """ファイル / ディレクトリ（配下の *.yml, *.yaml を再帰的に）/ glob を重複なしのファイル一覧に展開する"""
+    seen: set[str] = set()
+    out: list[str] = []
+
+    def add(p: str) -> None:
+        key = os.path.normpath(p)
+        if key not in seen:
+            seen.add(key)
+            out.append(p)
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for dirpath, dirnames, filenames in os.walk(pattern):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+                for name in sorted(filenames):
+                    if name.lower().endswith(DSL_EXTENSIONS):
+                        add(os.path.join(dirpath, name))
+        elif glob.has_magic(pattern):
+            for p in sorted(glob.glob(pattern, recursive=True)):
+                if os.path.isfile(p):
+                    add(p)
+        else:
+            # 存在しないパスはそのまま渡し、validate_file で unreadable として報告する
+            add(pattern)
+    return out
+
+
+def validate_files(paths: list[str], *, workers: int | None = None) -> list[FileReport]:
+    """
+    複数ファイルをプロセスプールで並列に検証する（結果は paths の順）。
+    workers=1 またはファイルが1つなら同じプロセスで実行する。
+    """
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(paths))
+    if workers <= 1:
+        return [validate_file(p) for p in paths]
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(validate_file, paths, chunksize=chunksize))
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import time
+from typing import IO, Any
+
+import requests
+
+from dify_creator.console_client import DifyConsoleClient, DifyConsoleError
+from dify_creator.dsl import inputs_hash, load_dsl_file
+from dify_creator.run_events import stream_run_events
+from dify_creator.sync import SyncEntry, import_and_confirm, read_inputs
+from dify_creator.validator import validate_dsl
+
+
+# inotify(7) のイベント。エディタは上書き保存 (CLOSE_WRITE) のほか、一時ファイルからの rename (MOVED_TO) や
+# 作り直し (CREATE) で保存するので、ファイルではなく親ディレクトリを監視する
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """(mtime, サイズ) を定期的に比較する。inotify が使えない環境（macOS や一部の Docker ボリューム）向け"""
+
+    def __init__(self, paths: list[str], interval_s: float = 0.5):
+        self.paths = sorted({os.path.realpath(p) for p in paths})
+        self.interval_s = interval_s
+        self._stats = {p: self._stat(p) for p in self.paths}
+
+    @staticmethod
+    def _stat(path: str) -> tuple[int, int] | None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def wait(self, timeout_s: float | None) -> set[str]:
+        """変更されたファイルを返す。timeout_s までに変更がなければ空集合（None なら変更まで待つ）"""
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        while True:
+            changed = set()
+            for p in self.paths:
+                st = self._stat(p)
+                if st != self._stats[p]:
+                    self._stats[p] = st
+                    changed.add(p)
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            remaining = self.interval_s if deadline is None else min(self.interval_s, deadline - time.monotonic())
+            time.sleep(max(remaining, 0.0))
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Linux の inotify を ctypes で直接使う（追加の依存なし）"""
+
+    def __init__(self, paths: list[str]):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libc_name:
+            raise OSError("inotify は Linux でのみ使えます")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.paths = {os.path.realpath(p) for p in paths}
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 に失敗しました")
+        self._dirs: dict[int, str] = {}
+        try:
+            for d in sorted({os.path.dirname(p) for p in self.paths}):
+                wd = self._libc.inotify_add_watch(self._fd, os.fsencode(d), _WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f"inotify_add_watch に失敗しました: {d}")
+                self._dirs[wd] = d
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def wait(self, timeout_s: float | None) -> set[str]:
+        """変更されたファイルを返す。timeout_s までに変更がなければ空集合（None なら変更まで待つ）"""
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            ready, _, _ = select.select([self._fd], [], [], remaining)
+            if not ready:
+                return set()
+            changed = self._read_events()
+            if changed:
+                return changed
+
+    def _read_events(self) -> set[str]:
+        try:
+            buf = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed: set[str] = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buf):
+            wd, _mask, _cookie, length = _EVENT_HEADER.unpack_from(buf, offset)
+            offset += _EVENT_HEADER.size
+            name = buf[offset : offset + length].rstrip(b"\0")
+            offset += length
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if path in self.paths:
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+def open_watcher(paths: list[str], *, poll: bool = False, interval_s: float = 0.5) -> InotifyWatcher | PollingWatcher:
+    """inotify が使えればそれを、使えなければ（または poll=True なら）ポーリングで監視する"""
+    if not poll:
+        try:
+            return InotifyWatcher(paths)
+        except OSError:
+            pass
+    return PollingWatcher(paths, interval_s=interval_s)
+
+
+def wait_for_changes(watcher: InotifyWatcher | PollingWatcher, debounce_s: float) -> set[str]:
+    """最初の変更を待ち、その後 debounce_s の間変更が途切れるまでまとめる（保存1回で何度も走らないように）"""
+    changed = watcher.wait(None)
+    while True:
+        more = watcher.wait(debounce_s)
+        if not more:
+            return changed
+        changed |= more
+
+
+class _EventPrinter:
+    """draft run のイベントをノード単位の進捗行として表示する"""
+
+    def __init__(self, out: IO[str]):
+        self.out = out
+
+    def __call__(self, ev: dict[str, Any]) -> None:
+        data = ev.get("data") if isinstance(ev.get("data"), dict) else {}
+        name = ev.get("event")
+        if name == "node_started":
+            self.out.write(f"  … {data.get('title') or data.get('node_id')} ({data.get('node_type')})\n")
+        elif name == "node_finished":
+            mark = "✓" if data.get("status") == "succeeded" else "✗"
+            elapsed = data.get("elapsed_time")
+            line = f"  {mark} {data.get('title') or data.get('node_id')}"
+            if isinstance(elapsed, (int, float)):
+                line += f" {elapsed:.2f}s"
+            if data.get("error"):
+                line += f": {data.get('error')}"
+            self.out.write(line + "\n")
+        else:
+            return
+        self.out.flush()
+
+
+class Watcher:
+    """
+    DSL（と inputs JSON）の保存を監視し、変更されたアプリだけ validate -> import -> confirm -> draft run する。
+    ログイン済みのクライアントとコネクションプールを使い回すので、1回あたりの待ち時間はほぼサーバー側の処理だけになる。
+    """
+
+    def __init__(
+        self,
+        client: DifyConsoleClient,
+        entries: list[SyncEntry],
+        *,
+        max_wait_s: float | None = None,
+        out: IO[str] = sys.stdout,
+    ):
+        self.client = client
+        self.entries = entries
+        self.max_wait_s = max_wait_s
+        self.out = out
+        # 新規作成されたアプリは、以降の保存ではそのアプリを上書きする
+        self.app_ids: dict[str, str | None] = {e.dsl: e.app_id for e in entries}
+        # 最後に処理した (DSL hash, inputs hash)。内容が変わらない保存では何もしない
+        self.last: dict[str, tuple[str, str | None]] = {}
+
+    def watched_paths(self) -> list[str]:
+        paths = []
+        for e in self.entries:
+            paths.append(e.dsl)
+            if e.inputs_json:
+                paths.append(e.inputs_json)
+        return paths
+
+    def entries_for(self, changed: set[str]) -> list[SyncEntry]:
+        return [
+            e
+            for e in self.entries
+            if os.path.realpath(e.dsl) in changed
+            or (e.inputs_json is not None and os.path.realpath(e.inputs_json) in changed)
+        ]
+
+    def process(self, entry: SyncEntry) -> bool:
+        """1アプリ分を処理し、成功（または変更なし）なら True"""
+        w = self.out
+        t0 = time.perf_counter()
+        w.write(f"\n▶ {entry.label} ({time.strftime('%H:%M:%S')})\n")
+        try:
+            doc = load_dsl_file(entry.dsl)
+            inputs = read_inputs(entry.inputs_json) if entry.inputs_json else None
+        except (DifyConsoleError, ValueError, OSError) as e:
+            w.write(f"❌ {e}\n")
+            return False
+
+        key = (doc.hash, inputs_hash(inputs) if inputs is not None else None)
+        if self.last.get(entry.dsl) == key:
+            w.write("  変更なし\n")
+            return True
+
+        errors = [i for i in validate_dsl(doc.data) if i.severity == "error"]
+        if errors:
+            # サーバーに送る前にローカルで分かる誤りは止める
+            w.write(f"❌ 検証エラー ({len(errors)}):\n")
+            for issue in errors:
+                w.write(f"  - {issue.message}\n")
+            return False
+
+        try:
+            _, app_id = import_and_confirm(
+                self.client,
+                yaml_content=doc.text,
+                app_id=self.app_ids.get(entry.dsl),
+                name=entry.name,
+                validate_yaml=False,
+            )
+            self.app_ids[entry.dsl] = app_id
+            t1 = time.perf_counter()
+            w.write(f"  import {t1 - t0:.2f}s (app_id={app_id})\n")
+            w.flush()
+
+            if inputs is None:
+                self.last[entry.dsl] = key
+                return True
+            summary = stream_run_events(
+                self.client,
+                app_id=app_id,
+                inputs=inputs,
+                out=None,
+                max_wait_s=self.max_wait_s,
+                on_event=_EventPrinter(w),
+            )
+        except (DifyConsoleError, requests.RequestException) as e:
+            w.write(f"❌ {e}\n")
+            return False
+
+        status = summary.get("status")
+        ok = status in {None, "succeeded"}
+        w.write(f"{'✅' if ok else '❌'} {status} {time.perf_counter() - t1:.2f}s")
+        if summary.get("total_tokens") is not None:
+            w.write(f" tokens={summary['total_tokens']}")
+        w.write("\n")
+        if summary.get("error"):
+            w.write(f"  error: {summary['error']}\n")
+        if summary.get("outputs") is not None:
+            w.write(json.dumps(summary["outputs"], ensure_ascii=False, indent=2) + "\n")
+        if ok:
+            self.last[entry.dsl] = key
+        return ok
+
+    def run(self, *, poll: bool = False, debounce_s: float = 0.3, initial: bool = False) -> None:
+        watcher = open_watcher(self.watched_paths(), poll=poll)
+        kind = "polling" if isinstance(watcher, PollingWatcher) else "inotify"
+        self.out.write(f"👀 {len(self.entries)} 件の DSL を監視しています（{kind}、Ctrl+C で終了）\n")
+        self.out.flush()
+        try:
+            if initial:
+                for entry in self.entries:
+                    self.process(entry)
+            while True:
+                changed = wait_for_changes(watcher, debounce_s)
+                for entry in self.entries_for(changed):
+                    self.process(entry)
+                self.out.flush()
+                # 常駐するので終了時だけでなく反映のたびに計測を書き出す
+                self.client.flush_instrumentation()
+        finally:
+            watcher.close()
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from typing import Any
+
+import yaml
+
+
+# libyaml (C 拡張) 付きでビルドされた PyYAML なら C 実装を使う（純 Python 版の数倍速い）
+HAS_LIBYAML = bool(getattr(yaml, "__with_libyaml__", False))
+SafeLoader: type = getattr(yaml, "CSafeLoader", yaml.SafeLoader) if HAS_LIBYAML else yaml.SafeLoader
+SafeDumper: type = getattr(yaml, "CSafeDumper", yaml.SafeDumper) if HAS_LIBYAML else yaml.SafeDumper
+
+
+def safe_load(text: str) -> Any:
+    return yaml.load(text, Loader=SafeLoader)
+
+
+def safe_dump(data: Any) -> str:
+    """export と同じ形式（キー順を保ち、日本語をエスケープしない）で YAML にする"""
+    return yaml.dump(data, Dumper=SafeDumper, allow_unicode=True, sort_keys=False)
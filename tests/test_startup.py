@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import check_startup  # noqa: E402
+
+# CLI 起動時の import の回帰テスト（python -X importtime で起動する benchmarks/check_startup.py を使う）
+CASES = {case[0]: case for case in check_startup.CASES}
+HTTP_MODULES = ("requests", "urllib3", "aiohttp")
+
+
+@pytest.mark.parametrize("name", ["help", "validate"])
+def test_does_not_import_http_clients(name: str) -> None:
+    _, argv, _, _ = CASES[name]
+    modules = check_startup.import_times(argv)
+    assert sorted(m for m in modules if m.split(".")[0] in HTTP_MODULES) == []
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_startup_within_budget(name: str) -> None:
+    _, failures = check_startup.check_case(*CASES[name], repeat=3)
+    assert failures == []